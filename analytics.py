@@ -0,0 +1,327 @@
+"""统计聚合引擎
+
+/api/statistics 的各个部分（基础统计、按出行方式/通勤类型/星期/天气分组、
+分段时间）都来自按 (用户, 出行方式, 通勤类型, 星期, 天气) 分组的可合并聚合值
+（count/sum/min/max）。这些分组保存在汇总表 commute_user_summary 中，写入记录时
+增量维护；AnalyticsSnapshot 在Python中按分组数（而非记录数）上卷出各部分，
+效果相当于 GROUPING SETS（星期 × 天气透视表同样由分组上卷）。30天趋势随日期滑动，直接按日期索引范围查询。
+时长分位数和分布直方图来自 commute_duration_sketch 中按 (用户, 出行方式, 通勤类型)
+保存的分位数草图（见 quantiles.py），读取时合并。
+
+AnalyticsSnapshot 是一个用户在某个写入版本下的全部汇总结果，统计接口和
+智能建议规则（suggestions.py）都从同一个快照读取，不再各自查询。
+"""
+
+import os
+
+import quantiles
+import sql_dialect
+import trends
+
+# 语句按MySQL语法编写，SQLite由sql_dialect转换
+
+# 时长分布直方图的区间宽度（分钟）
+STATS_HISTOGRAM_BIN_MINUTES = int(os.getenv("STATS_HISTOGRAM_BIN_MINUTES", 10))
+
+# 可合并的聚合列，汇总表的重建和单条记录的增量都使用同一组表达式；
+# 分段耗时读取写入时生成的 to_vehicle_minutes/on_vehicle_minutes 列，不再逐行计算时间差
+GROUP_AGGREGATES = """
+        COUNT(*) AS record_count,
+        COUNT(total_duration) AS duration_count,
+        COALESCE(SUM(total_duration), 0) AS duration_sum,
+        MIN(total_duration) AS duration_min,
+        MAX(total_duration) AS duration_max,
+        COALESCE(SUM(CASE WHEN total_duration IS NOT NULL THEN rating END), 0) AS rating_sum,
+        COUNT(CASE WHEN total_duration IS NOT NULL THEN rating END) AS rating_count,
+        COUNT(CASE WHEN to_vehicle_minutes IS NOT NULL AND on_vehicle_minutes IS NOT NULL
+            THEN 1 END) AS segment_count,
+        COALESCE(SUM(CASE WHEN on_vehicle_minutes IS NOT NULL THEN to_vehicle_minutes END), 0) AS to_vehicle_sum,
+        COALESCE(SUM(CASE WHEN to_vehicle_minutes IS NOT NULL THEN on_vehicle_minutes END), 0) AS on_vehicle_sum"""
+
+# 分段耗时生成列在MySQL中的定义（写入时计算并存储；SQLite的定义见sqlite_schema）
+# 与SQLite相同，为秒数之差除以60的精确分钟数（60e0为DOUBLE字面量，按浮点数除法计算）
+MYSQL_SEGMENT_COLUMNS = {
+    "to_vehicle_minutes": "DOUBLE AS (TIMESTAMPDIFF(SECOND, start_time, on_vehicle_time) / 60e0) STORED "
+                          "COMMENT '出门到上车耗时（分钟）' AFTER arrive_time",
+    "on_vehicle_minutes": "DOUBLE AS (TIMESTAMPDIFF(SECOND, on_vehicle_time, arrive_time) / 60e0) STORED "
+                          "COMMENT '上车到到达耗时（分钟）' AFTER to_vehicle_minutes",
+}
+MYSQL_SEGMENT_COLUMN_TYPE = "double"
+
+# 汇总表的分组键；天气为NULL时记为空字符串，以便作为主键的一部分
+SUMMARY_KEYS = ("user_eng_name", "transport_type", "commute_type", "weekday", "weather")
+SUMMARY_VALUES = ("record_count", "duration_count", "duration_sum", "duration_min", "duration_max",
+                  "rating_sum", "rating_count", "segment_count", "to_vehicle_sum", "on_vehicle_sum")
+
+_SUMMARY_SOURCE_SQL = """
+    SELECT
+        user_eng_name,
+        transport_type,
+        commute_type,
+        weekday,
+        COALESCE(weather, '') AS weather,{aggregates}
+    FROM commute_records
+    WHERE {where}
+    GROUP BY user_eng_name, transport_type, commute_type, weekday, COALESCE(weather, '')
+"""
+
+# 从原始记录计算分组聚合（重建汇总表、一致性检查）
+SUMMARY_SOURCE_ALL_SQL = _SUMMARY_SOURCE_SQL.format(aggregates=GROUP_AGGREGATES, where="1 = 1")
+SUMMARY_SOURCE_USER_SQL = _SUMMARY_SOURCE_SQL.format(aggregates=GROUP_AGGREGATES, where="user_eng_name = %s")
+# 单条记录对汇总表的贡献（增量维护）
+SUMMARY_SOURCE_RECORD_SQL = _SUMMARY_SOURCE_SQL.format(aggregates=GROUP_AGGREGATES, where="id = %s")
+# 一段连续ID的记录对汇总表的贡献（批量写入）
+SUMMARY_SOURCE_RANGE_SQL = _SUMMARY_SOURCE_SQL.format(aggregates=GROUP_AGGREGATES, where="id BETWEEN %s AND %s")
+
+SUMMARY_READ_SQL = f"""
+    SELECT {', '.join(SUMMARY_KEYS[1:] + SUMMARY_VALUES)}
+    FROM commute_user_summary
+    WHERE user_eng_name = %s
+"""
+
+# 时长分布草图（见quantiles）：按 (用户, 出行方式, 通勤类型) 分组的各桶记录数
+SKETCH_KEYS = ("user_eng_name", "transport_type", "commute_type")
+_SKETCH_SOURCE_SQL = """
+    SELECT user_eng_name, transport_type, commute_type, total_duration, COUNT(*) AS value_count
+    FROM commute_records
+    WHERE total_duration IS NOT NULL AND {where}
+    GROUP BY user_eng_name, transport_type, commute_type, total_duration
+"""
+SKETCH_SOURCE_ALL_SQL = _SKETCH_SOURCE_SQL.format(where="1 = 1")
+SKETCH_SOURCE_USER_SQL = _SKETCH_SOURCE_SQL.format(where="user_eng_name = %s")
+# 单条记录在草图中的分组和时长（增量维护）
+SKETCH_VALUE_SQL = """
+    SELECT user_eng_name, transport_type, commute_type, total_duration
+    FROM commute_records WHERE id = %s
+"""
+# 按桶累加计数（SQLite由sql_dialect转换为 ON CONFLICT DO UPDATE）
+SKETCH_UPSERT_SQL = """
+    INSERT INTO commute_duration_sketch (user_eng_name, transport_type, commute_type, bucket, bucket_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE bucket_count = bucket_count + VALUES(bucket_count)
+"""
+SKETCH_READ_SQL = """
+    SELECT transport_type, commute_type, bucket, bucket_count
+    FROM commute_duration_sketch
+    WHERE user_eng_name = %s
+"""
+
+TREND_SQL = """
+    SELECT
+        date AS trend_date,
+        COUNT(*) AS duration_count,
+        SUM(total_duration) AS duration_sum
+    FROM commute_records
+    WHERE user_eng_name = %s AND total_duration IS NOT NULL
+        AND date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+    GROUP BY date
+    ORDER BY date
+"""
+
+
+class _Bucket:
+    """一组可合并的聚合值"""
+
+    __slots__ = ("count", "total", "minimum", "maximum", "rating_sum", "rating_count")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.rating_sum = 0.0
+        self.rating_count = 0
+
+    def merge(self, count, total, minimum, maximum, rating_sum, rating_count):
+        if not count:
+            return
+        self.count += count
+        self.total += total
+        if self.minimum is None or minimum < self.minimum:
+            self.minimum = minimum
+        if self.maximum is None or maximum > self.maximum:
+            self.maximum = maximum
+        self.rating_sum += rating_sum
+        self.rating_count += rating_count
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+_WEEKDAY_INDEX = {name: index for index, name in enumerate(sql_dialect.WEEKDAY_NAMES)}
+
+
+def _number(value):
+    # MySQL的SUM返回Decimal，统一转为float
+    return float(value) if value is not None else 0.0
+
+
+def _date_key(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        # SQLite中日期按天数存储
+        return sql_dialect.days_to_date(value)
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)
+
+
+class AnalyticsSnapshot:
+    """一个用户的分析快照：把细粒度分组上卷为各个维度"""
+
+    def __init__(self):
+        self.record_count = 0
+        self.basic = _Bucket()
+        self.by_transport = {}
+        self.by_commute_type = {}
+        self.by_weekday = {}
+        self.by_weather = {}
+        # 星期 × 天气 透视表的分组：(星期序号, 天气, 有总时长的记录数, 总时长之和)
+        self.weekday_weather = []
+        self.trend = {}
+        self.segment_count = 0
+        self.to_vehicle_sum = 0.0
+        self.on_vehicle_sum = 0.0
+        # (出行方式, 通勤类型) -> 时长草图
+        self.sketches = {}
+
+    def add_group(self, transport_type, commute_type, weekday, weather,
+                  duration_count, duration_sum, duration_min, duration_max,
+                  rating_sum, rating_count,
+                  segment_count=0, to_vehicle_sum=0, on_vehicle_sum=0, record_count=0):
+        """合并一个分组的聚合值"""
+        self.record_count += record_count or 0
+        self.segment_count += segment_count or 0
+        self.to_vehicle_sum += _number(to_vehicle_sum)
+        self.on_vehicle_sum += _number(on_vehicle_sum)
+        if not duration_count:
+            return
+
+        values = (duration_count, _number(duration_sum), duration_min, duration_max,
+                  _number(rating_sum), rating_count or 0)
+        self.basic.merge(*values)
+        for groups, key in ((self.by_transport, transport_type),
+                            (self.by_commute_type, commute_type),
+                            (self.by_weekday, weekday),
+                            (self.by_weather, weather or None)):
+            if key is None:
+                continue
+            bucket = groups.get(key)
+            if bucket is None:
+                bucket = groups[key] = _Bucket()
+            bucket.merge(*values)
+        if weather and weekday in _WEEKDAY_INDEX:
+            self.weekday_weather.append((_WEEKDAY_INDEX[weekday], weather, duration_count, values[1]))
+
+    def add_rows(self, rows):
+        """合并汇总表（或 SUMMARY_SOURCE_*_SQL）的分组行"""
+        for row in rows:
+            self.add_group(
+                row['transport_type'], row['commute_type'], sql_dialect.weekday_name(row['weekday']), row['weather'],
+                row['duration_count'], row['duration_sum'],
+                row['duration_min'], row['duration_max'], row['rating_sum'], row['rating_count'],
+                row['segment_count'], row['to_vehicle_sum'], row['on_vehicle_sum'], row['record_count'],
+            )
+        return self
+
+    def add_trend_rows(self, rows):
+        """合并 TREND_SQL 的按日期分组行"""
+        for row in rows:
+            key = _date_key(row['trend_date'])
+            bucket = self.trend.get(key)
+            if bucket is None:
+                bucket = self.trend[key] = _Bucket()
+            bucket.count += row['duration_count']
+            bucket.total += _number(row['duration_sum'])
+        return self
+
+    def add_sketch_rows(self, rows):
+        """合并 SKETCH_READ_SQL 的各桶计数"""
+        for row in rows:
+            key = (row['transport_type'], row['commute_type'])
+            sketch = self.sketches.get(key)
+            if sketch is None:
+                sketch = self.sketches[key] = quantiles.DurationSketch()
+            sketch.add_bucket(row['bucket'], row['bucket_count'])
+        return self
+
+    def merged_sketch(self, transport_type=None, commute_type=None):
+        """按出行方式和/或通勤类型合并草图（None表示不限）"""
+        merged = quantiles.DurationSketch()
+        for (transport, commute), sketch in self.sketches.items():
+            if transport_type not in (None, transport) or commute_type not in (None, commute):
+                continue
+            merged.merge(sketch)
+        return merged
+
+    def percentiles(self):
+        """/api/statistics 的分位数部分"""
+        transports = sorted({key[0] for key in self.sketches})
+        commutes = sorted({key[1] for key in self.sketches})
+        return {
+            "relative_error": quantiles.RELATIVE_ACCURACY,
+            "overall": self.merged_sketch().percentiles(),
+            "by_transport": [{"transport_type": t, **self.merged_sketch(transport_type=t).percentiles()}
+                             for t in transports],
+            "by_commute_type": [{"commute_type": c, **self.merged_sketch(commute_type=c).percentiles()}
+                                for c in commutes],
+            "by_group": [{"transport_type": t, "commute_type": c, **self.sketches[(t, c)].percentiles()}
+                         for t, c in sorted(self.sketches)],
+        }
+
+    def pivot(self):
+        """星期 × 天气 的记录数和平均时长（见 trends.pivot_table）"""
+        return trends.pivot_table(self.weekday_weather)
+
+    @property
+    def avg_to_vehicle(self):
+        return self.to_vehicle_sum / self.segment_count if self.segment_count else None
+
+    @property
+    def avg_on_vehicle(self):
+        return self.on_vehicle_sum / self.segment_count if self.segment_count else None
+
+    def statistics(self):
+        """生成 /api/statistics 的各部分"""
+        basic = self.basic
+        return {
+            "basic": {
+                "total_count": basic.count,
+                "avg_duration": basic.avg,
+                "min_duration": basic.minimum,
+                "max_duration": basic.maximum,
+                "avg_rating": basic.avg_rating,
+            },
+            "by_transport": _group_list("transport_type", self.by_transport, with_rating=True),
+            "by_commute_type": _group_list("commute_type", self.by_commute_type),
+            "by_weekday": _group_list("weekday", self.by_weekday),
+            "by_weather": _group_list("weather", self.by_weather),
+            "trend": [
+                {"date": key, "avg_duration": self.trend[key].avg}
+                for key in sorted(self.trend)
+            ],
+            "segments": {
+                "avg_to_vehicle": self.avg_to_vehicle,
+                "avg_on_vehicle": self.avg_on_vehicle,
+            },
+            "percentiles": self.percentiles(),
+            "histogram": {
+                "bin_minutes": STATS_HISTOGRAM_BIN_MINUTES,
+                "bins": self.merged_sketch().histogram(STATS_HISTOGRAM_BIN_MINUTES),
+            },
+        }
+
+
+def _group_list(name, groups, with_rating=False):
+    items = []
+    for key in sorted(groups, key=lambda k: (k is None, k)):
+        bucket = groups[key]
+        item = {name: key, "count": bucket.count, "avg_duration": bucket.avg}
+        if with_rating:
+            item["avg_rating"] = bucket.avg_rating
+        items.append(item)
+    return items
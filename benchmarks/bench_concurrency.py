@@ -0,0 +1,154 @@
+"""并发基准：Starlette默认线程池 vs 数据库专用有界线程池
+
+在临时目录中用SQLite启动uvicorn，预先写入记录后，用指定数量的并发客户端
+持续请求一段时间（记录列表、统计、天气、新建记录混合），输出每种模式下的
+每秒请求数、延迟分位数、不访问数据库的天气接口的延迟中位数和错误数：
+
+    python benchmarks/bench_concurrency.py [--clients 50 200 1000] [--duration 10]
+
+模式 threadpool 对应 DB_EXECUTOR_WORKERS=0（同步接口的旧行为），
+模式 executor 使用默认的专用线程池。
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "threadpool": {"DB_EXECUTOR_WORKERS": "0"},
+    "executor": {},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir, port, extra_env):
+    env = dict(os.environ, DB_BACKEND="sqlite", WEATHER_PROVIDER="stub",
+               RESPONSE_CACHE_SIZE="0", LOG_LEVEL="WARNING", **extra_env)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--backlog", "4096"],
+        cwd=workdir, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/weather", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("服务启动超时")
+
+
+def record_payload(user, rng):
+    day = f"2026-09-{rng.randint(1, 28):02d}"
+    return {
+        "user_eng_name": user, "date": day, "weekday": "星期一", "weather": rng.choice(["晴", "阴"]),
+        "transport_type": rng.choice(["subway", "car"]), "commute_type": "to_work",
+        "start_time": f"{day} 08:00:00", "on_vehicle_time": f"{day} 08:10:00",
+        "arrive_time": f"{day} 09:00:00", "total_duration": rng.randint(30, 80), "rating": 4,
+    }
+
+
+async def seed(base_url, users, per_user):
+    rng = random.Random(1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        for user in users:
+            for _ in range(per_user):
+                response = await client.post("/api/records", json=record_payload(user, rng))
+                response.raise_for_status()
+
+
+async def load(base_url, clients, duration, users):
+    latencies = []
+    weather_latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def worker(index):
+            nonlocal errors
+            rng = random.Random(index)
+            while time.monotonic() < deadline:
+                user = rng.choice(users)
+                roll = rng.random()
+                started = time.perf_counter()
+                try:
+                    if roll < 0.5:
+                        response = await client.get("/api/records", params={"user_eng_name": user, "page_size": 20})
+                    elif roll < 0.75:
+                        response = await client.get("/api/statistics", params={"user_eng_name": user})
+                    elif roll < 0.95:
+                        response = await client.get("/api/weather")
+                        weather_latencies.append(time.perf_counter() - started)
+                    else:
+                        response = await client.post("/api/records", json=record_payload(user, rng))
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.monotonic() - started
+    return latencies, weather_latencies, errors, elapsed
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--records", type=int, default=200, help="每个用户预先写入的记录数")
+    args = parser.parse_args()
+
+    users = [f"bench{i}" for i in range(args.users)]
+    print(f"{'mode':>11}{'clients':>9}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}"
+          f"{'weather p50':>13}{'errors':>8}")
+    for clients in args.clients:
+        for mode, extra_env in MODES.items():
+            with tempfile.TemporaryDirectory() as workdir:
+                os.symlink(os.path.join(ROOT, "static"), os.path.join(workdir, "static"))
+                port = free_port()
+                process = start_server(workdir, port, extra_env)
+                base_url = f"http://127.0.0.1:{port}"
+                try:
+                    asyncio.run(seed(base_url, users, args.records))
+                    latencies, weather, errors, elapsed = asyncio.run(
+                        load(base_url, clients, args.duration, users))
+                finally:
+                    process.terminate()
+                    process.wait(timeout=10)
+            print(f"{mode:>11}{clients:>9}{len(latencies) / elapsed:>10.1f}"
+                  f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+                  f"{percentile(weather, 0.5) * 1000:>13.1f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""接口基准：按数据规模测量每个接口的延迟分位数和吞吐
+
+对每个数据规模，在临时目录中用 generate_data.py 生成SQLite数据，启动uvicorn，
+依次对 main.py 中的每个接口以固定并发发送请求，统计 p50/p95/p99、平均和最大延迟、
+每秒请求数和错误数。结果写入JSON文件，可用 --compare 与之前的结果对比：
+
+    python benchmarks/bench_endpoints.py [--sizes 10000 100000 1000000] [--requests 200]
+        [--concurrency 10] [--output results.json] [--compare baseline.json]
+
+读接口先测，写接口（新建、批量、导入、更新、删除）后测；更新和删除只作用于
+本轮新建的记录，数据规模在测量过程中基本不变。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(extra=None):
+    env = dict(os.environ, DB_BACKEND="sqlite", WEATHER_PROVIDER="stub", LOG_LEVEL="WARNING",
+               EXPORT_ADMIN_TOKEN="bench", **(extra or {}))
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def generate(workdir, size, seed):
+    started = time.monotonic()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "generate_data.py"), "--records", str(size), "--seed", str(seed)],
+        cwd=workdir, env=server_env(), check=True, stdout=subprocess.DEVNULL,
+    )
+    return time.monotonic() - started
+
+
+def start_server(workdir, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=server_env(),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/weather", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("服务启动超时")
+
+
+def record_payload(user, rng):
+    day = date.today().isoformat()
+    return {
+        "user_eng_name": user, "date": day, "weekday": "星期一", "weather": rng.choice(["晴", "小雨"]),
+        "temperature": "25°C", "transport_type": rng.choice(["subway", "car"]), "commute_type": "to_work",
+        "start_time": f"{day} 08:00:00", "on_vehicle_time": f"{day} 08:10:00",
+        "arrive_time": f"{day} 09:00:00", "total_duration": rng.randint(30, 80), "rating": 4,
+    }
+
+
+def import_body(user, rng, rows=100):
+    lines = ["user_eng_name,date,weekday,weather,transport_type,commute_type,start_time,total_duration"]
+    day = date.today().isoformat()
+    lines.extend(f"{user},{day},星期一,晴,{rng.choice(['subway', 'car'])},to_work,{day} 08:00:00,{rng.randint(30, 80)}"
+                 for _ in range(rows))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def build_endpoints(users, record_ids):
+    """每个接口：(名称, 生成请求参数的函数)；函数返回 (method, url, kwargs)"""
+    created = []
+
+    def records_page(rng):
+        return "GET", "/api/records", {"params": {"user_eng_name": rng.choice(users), "page_size": 20}}
+
+    def records_filtered(rng):
+        return "GET", "/api/records", {"params": {"user_eng_name": rng.choice(users), "transport_type": "car",
+                                                  "include_total": "true"}}
+
+    def record_detail(rng):
+        record_id, user = rng.choice(record_ids)
+        return "GET", f"/api/records/{record_id}", {"params": {"user_eng_name": user}}
+
+    def export_user(rng):
+        return "GET", "/api/records/export", {"params": {"user_eng_name": rng.choice(users), "format": "csv"}}
+
+    def statistics(rng):
+        return "GET", "/api/statistics", {"params": {"user_eng_name": rng.choice(users)}}
+
+    def suggestions(rng):
+        return "GET", "/api/suggestions", {"params": {"user_eng_name": rng.choice(users)}}
+
+    def predict(rng):
+        return "GET", "/api/predict", {"params": {"user_eng_name": rng.choice(users),
+                                                  "transport_type": rng.choice(["subway", "car"])}}
+
+    def departure(rng):
+        return "GET", "/api/suggestions/departure", {"params": {"user_eng_name": rng.choice(users),
+                                                                "commute_type": "to_work"}}
+
+    def create(rng):
+        return "POST", "/api/records", {"json": record_payload(rng.choice(users), rng)}
+
+    def batch(rng):
+        user = rng.choice(users)
+        return "POST", "/api/records/batch", {"json": {"records": [record_payload(user, rng) for _ in range(50)]}}
+
+    def import_csv(rng):
+        return "POST", "/api/records/import", {"params": {"format": "csv"}, "content": import_body(rng.choice(users), rng)}
+
+    def update(rng):
+        record_id, user = created[rng.randrange(len(created))]
+        return "PUT", f"/api/records/{record_id}", {"params": {"user_eng_name": user},
+                                                     "json": {"total_duration": rng.randint(30, 80)}}
+
+    def delete(rng):
+        record_id, user = created.pop()
+        return "DELETE", f"/api/records/{record_id}", {"params": {"user_eng_name": user}}
+
+    def collect(response, request):
+        if request[1] == "/api/records" and request[0] == "POST" and response.status_code == 200:
+            created.append((response.json()["id"], request[2]["json"]["user_eng_name"]))
+
+    endpoints = [
+        ("GET /", lambda rng: ("GET", "/", {})),
+        ("GET /api/records", records_page),
+        ("GET /api/records (filter+total)", records_filtered),
+        ("GET /api/records/{id}", record_detail),
+        ("GET /api/records/export", export_user),
+        ("GET /api/statistics", statistics),
+        ("GET /api/suggestions", suggestions),
+        ("GET /api/suggestions/departure", departure),
+        ("GET /api/predict", predict),
+        ("GET /api/weather", lambda rng: ("GET", "/api/weather", {})),
+        ("GET /api/metrics", lambda rng: ("GET", "/api/metrics", {})),
+        ("POST /api/records", create),
+        ("POST /api/records/batch (50)", batch),
+        ("POST /api/records/import (100 rows)", import_csv),
+        ("PUT /api/records/{id}", update),
+        ("DELETE /api/records/{id}", delete),
+    ]
+    return endpoints, collect
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def measure(client, make_request, collect, requests, concurrency, seed):
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = make_request(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latency = time.perf_counter() - started
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append(latency)
+            collect(response, (method, url, kwargs))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": round(percentile(ms, 0.50), 2) if ms else None,
+        "p95_ms": round(percentile(ms, 0.95), 2) if ms else None,
+        "p99_ms": round(percentile(ms, 0.99), 2) if ms else None,
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+        "max_ms": round(max(ms), 2) if ms else None,
+    }
+
+
+async def run_endpoints(base_url, users, record_ids, requests, concurrency, only):
+    endpoints, collect = build_endpoints(users, record_ids)
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        selected = [name for name, _ in endpoints if not only or any(word in name for word in only)]
+        if any(name.startswith(("PUT", "DELETE")) for name in selected) and "POST /api/records" not in selected:
+            # 更新和删除作用于新建的记录
+            selected.append("POST /api/records")
+        for index, (name, make_request) in enumerate(endpoints):
+            if name not in selected:
+                continue
+            # 预热（不计入结果），删除接口除外，避免提前用掉新建的记录
+            if not name.startswith("DELETE"):
+                await measure(client, make_request, collect, min(10, requests), 1, index + 1000)
+            results[name] = await measure(client, make_request, collect, requests, concurrency, index)
+            print(f"  {name:<38}{results[name]['throughput'] or 0:>9.1f}/s"
+                  f"{results[name]['p50_ms'] or 0:>9.1f}{results[name]['p95_ms'] or 0:>9.1f}"
+                  f"{results[name]['p99_ms'] or 0:>9.1f}{results[name]['errors']:>7}")
+    return results
+
+
+def sample_dataset(workdir, samples=200):
+    """从生成的库中取用户和记录ID作为请求参数"""
+    conn = sqlite3.connect(os.path.join(workdir, "data", "commute_tracker.db"))
+    try:
+        records, users = conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_eng_name) FROM commute_records").fetchone()
+        user_names = [row[0] for row in conn.execute(
+            "SELECT DISTINCT user_eng_name FROM commute_records ORDER BY RANDOM() LIMIT ?", (samples,))]
+        record_ids = conn.execute(
+            "SELECT id, user_eng_name FROM commute_records ORDER BY RANDOM() LIMIT ?", (samples,)).fetchall()
+    finally:
+        conn.close()
+    return records, users, user_names, record_ids
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """按数据规模和接口对比p50/p99和吞吐的变化"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    base_runs = {run["size"]: run["endpoints"] for run in baseline["runs"]}
+    print(f"\n与 {baseline_path}（{baseline['meta'].get('git_commit')}）对比：")
+    print(f"{'size':>9}  {'endpoint':<38}{'p50':>16}{'p99':>16}{'req/s':>16}")
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return f"{'-':>16}"
+        return f"{new:>8.1f}{(new - old) / old * 100:>+7.0f}%"
+
+    for run in results["runs"]:
+        old_endpoints = base_runs.get(run["size"])
+        if old_endpoints is None:
+            continue
+        for name, stats in run["endpoints"].items():
+            old = old_endpoints.get(name)
+            if old is None:
+                continue
+            print(f"{run['size']:>9}  {name:<38}{change(old['p50_ms'], stats['p50_ms'])}"
+                  f"{change(old['p99_ms'], stats['p99_ms'])}{change(old['throughput'], stats['throughput'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="数据规模（目标记录数）")
+    parser.add_argument("--requests", type=int, default=200, help="每个接口的请求数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发客户端数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="+", help="只测名称中包含这些关键字的接口")
+    parser.add_argument("--output", help="结果JSON文件，默认 benchmarks/results/endpoints-<时间>.json")
+    parser.add_argument("--compare", help="与之前的结果JSON对比")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": "sqlite",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "runs": [],
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.symlink(os.path.join(ROOT, "static"), os.path.join(workdir, "static"))
+            generate_seconds = generate(workdir, size, args.seed)
+            records, users, user_names, record_ids = sample_dataset(workdir)
+            print(f"\n数据规模 {size}：{records} 条记录，{users} 个用户（生成耗时 {generate_seconds:.1f} 秒）")
+            print(f"  {'endpoint':<38}{'req/s':>11}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>7}")
+            port = free_port()
+            process = start_server(workdir, port)
+            try:
+                endpoints = asyncio.run(run_endpoints(f"http://127.0.0.1:{port}", user_names, record_ids,
+                                                      args.requests, args.concurrency, args.only))
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+        results["runs"].append({
+            "size": size,
+            "records": records,
+            "users": users,
+            "generate_seconds": round(generate_seconds, 2),
+            "endpoints": endpoints,
+        })
+
+    output = args.output or os.path.join(RESULTS_DIR, f"endpoints-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""记录格式化与JSON序列化基准：原来的逐行字典转换 + jsonable_encoder vs 元组直接格式化 + orjson
+
+在临时SQLite库中为一个用户生成指定数量的记录（数据与 bench_statistics.py 相同），比较两种场景：
+
+    page    读取一页100条记录并生成 /api/records 的响应体（重复读取第一页）
+    export  按 EXPORT_FETCH_SIZE 分块读取该用户全部记录并编码为NDJSON
+
+    python benchmarks/bench_record_format.py [记录数 ...]
+
+每个场景输出总耗时、每行耗时和tracemalloc统计的峰值内存，并校验两种实现的输出解析后一致。
+耗时包含SQLite读取，读取本身在两种实现中相同。
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import record_format  # noqa: E402
+import sql_dialect  # noqa: E402
+from bench_statistics import build_database  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+PAGE_SIZE = 100
+EXPORT_FETCH_SIZE = 1000
+PAGE_SQL = """
+    SELECT * FROM commute_records WHERE user_eng_name = ?
+    ORDER BY date DESC, start_time DESC, id DESC LIMIT ?
+"""
+EXPORT_SQL = "SELECT * FROM commute_records WHERE user_eng_name = ? ORDER BY date, start_time, id"
+FIELDS = ['date', 'start_time', 'on_vehicle_time', 'arrive_time', 'created_at', 'updated_at']
+
+
+def legacy_days_to_date(days):
+    return (sql_dialect.EPOCH_DATE + timedelta(days=days)).isoformat()
+
+
+def legacy_seconds_to_datetime(seconds):
+    return (sql_dialect.EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def legacy_format(record):
+    """原来的 format_datetime_result（日期时间转换不缓存）"""
+    record = dict(record)
+    for field in FIELDS:
+        if isinstance(record.get(field), int):
+            if field == 'date':
+                record[field] = legacy_days_to_date(record[field])
+            else:
+                record[field] = legacy_seconds_to_datetime(record[field])
+        elif record.get(field):
+            if hasattr(record[field], 'strftime'):
+                if field == 'date':
+                    record[field] = record[field].strftime('%Y-%m-%d')
+                else:
+                    record[field] = record[field].strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            record[field] = None
+    if 'weekday' in record:
+        record['weekday'] = sql_dialect.weekday_name(record['weekday'])
+    return record
+
+
+def legacy_page(conn, user):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(PAGE_SQL, (user, PAGE_SIZE + 1))
+    records = [legacy_format(row) for row in cursor.fetchall()[:PAGE_SIZE]]
+    # FastAPI对返回的字典调用jsonable_encoder，再由JSONResponse序列化
+    content = jsonable_encoder({"success": True, "data": records})
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_page(conn, user):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(PAGE_SQL, (user, PAGE_SIZE + 1))
+    records = record_format.format_rows(cursor, cursor.fetchall()[:PAGE_SIZE])
+    return record_format.dumps({"success": True, "data": records})
+
+
+def legacy_export(conn, user):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(EXPORT_SQL, (user,))
+    size = 0
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        chunk = "".join(json.dumps(legacy_format(row), ensure_ascii=False, default=str) + "\n" for row in rows)
+        size += len(chunk.encode("utf-8"))
+    return size
+
+
+def fast_export(conn, user):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(EXPORT_SQL, (user,))
+    format_rows = record_format.row_formatter(cursor.description)
+    size = 0
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        size += len(record_format.dumps_lines(format_rows(rows)))
+    return size
+
+
+def export_lines(conn, user, fast):
+    """校验用：两种实现导出的全部记录（解析后）"""
+    cursor = conn.cursor()
+    cursor.row_factory = None if fast else sqlite3.Row
+    cursor.execute(EXPORT_SQL, (user,))
+    rows = cursor.fetchall()
+    if fast:
+        return [json.loads(line) for line in record_format.dumps_lines(record_format.format_rows(cursor, rows)).splitlines()]
+    return [json.loads(json.dumps(legacy_format(row), ensure_ascii=False, default=str)) for row in rows]
+
+
+def measure(func, *args, repeat=5):
+    """返回 (最短耗时ms, 峰值内存KB)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings) * 1000, peak / 1024
+
+
+def report(name, rows, legacy, fast):
+    print(f"{name:>8}{rows:>9}{legacy[0]:>12.2f}{fast[0]:>10.2f}{legacy[0] * 1000 / rows:>16.2f}{fast[0] * 1000 / rows:>9.2f}"
+          f"{legacy[1]:>17.0f}{fast[1]:>10.0f}{legacy[0] / fast[0]:>9.1f}x")
+
+
+def main(sizes):
+    print(f"{'case':>8}{'rows':>9}{'legacy ms':>12}{'fast ms':>10}{'legacy us/row':>16}{'us/row':>9}"
+          f"{'legacy peak KB':>17}{'peak KB':>10}{'speedup':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_database(os.path.join(tmp, "bench.db"), size)
+            assert json.loads(legacy_page(conn, "bench")) == json.loads(fast_page(conn, "bench"))
+            assert export_lines(conn, "bench", False) == export_lines(conn, "bench", True)
+            report("page", PAGE_SIZE, measure(legacy_page, conn, "bench", repeat=50),
+                   measure(fast_page, conn, "bench", repeat=50))
+            report("export", size, measure(legacy_export, conn, "bench", repeat=3),
+                   measure(fast_export, conn, "bench", repeat=3))
+            conn.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,83 @@
+"""SQL方言转换微基准
+
+对比旧实现（每次执行都做字符串替换和正则替换）与缓存实现的单条语句开销：
+
+    python benchmarks/bench_sql_dialect.py
+"""
+import os
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_dialect  # noqa: E402
+
+STATEMENTS = {
+    "select_by_id": "SELECT * FROM commute_records WHERE id = %s AND user_eng_name = %s",
+    "insert": """
+        INSERT INTO commute_records 
+        (user_eng_name, date, weekday, weather, temperature, transport_type, 
+         commute_type, start_time, on_vehicle_time, arrive_time, total_duration, rating, notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    "trend": """
+        SELECT 
+            date,
+            AVG(total_duration) as avg_duration
+        FROM commute_records 
+        WHERE user_eng_name = %s AND total_duration IS NOT NULL
+            AND date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        GROUP BY date
+        ORDER BY date
+    """,
+    "segments": """
+        SELECT 
+            AVG(TIMESTAMPDIFF(MINUTE, start_time, on_vehicle_time)) as avg_to_vehicle,
+            AVG(TIMESTAMPDIFF(MINUTE, on_vehicle_time, arrive_time)) as avg_on_vehicle
+        FROM commute_records 
+        WHERE user_eng_name = %s 
+            AND start_time IS NOT NULL 
+            AND on_vehicle_time IS NOT NULL 
+            AND arrive_time IS NOT NULL
+    """,
+}
+
+
+def legacy_translate(sql, conn):
+    """旧版 convert_params + convert_date_functions"""
+    if isinstance(conn, sqlite3.Connection):
+        sql = sql.replace('%s', '?').rstrip()
+    if isinstance(conn, sqlite3.Connection):
+        sqlite_sql = sql.replace('DATE_SUB(CURDATE(), INTERVAL 30 DAY)', "date('now', '-30 days')")
+        import re as _re  # 旧实现在每次调用时导入
+        pattern = r'TIMESTAMPDIFF\(MINUTE,\s*(\w+),\s*(\w+)\)'
+
+        def replace_timestampdiff(match):
+            return f"(julianday({match.group(2)}) - julianday({match.group(1)})) * 1440"
+
+        return _re.sub(pattern, replace_timestampdiff, sqlite_sql)
+    return sql
+
+
+def cached_translate(sql, conn):
+    dialect = sql_dialect.SQLITE if isinstance(conn, sqlite3.Connection) else sql_dialect.MYSQL
+    return sql_dialect.translate(sql, dialect)
+
+
+def main(number=100000):
+    conn = sqlite3.connect(":memory:")
+    # 确认两种实现的占位符转换一致（日期函数的转换已随SQLite整数日期列改变）
+    for sql in STATEMENTS.values():
+        assert legacy_translate(sql, conn).count('?') == cached_translate(sql, conn).count('?')
+
+    print(f"{'statement':<14}{'legacy (us)':>14}{'cached (us)':>14}{'speedup':>10}")
+    for name, sql in STATEMENTS.items():
+        legacy = timeit.timeit(lambda: legacy_translate(sql, conn), number=number) / number * 1e6
+        cached = timeit.timeit(lambda: cached_translate(sql, conn), number=number) / number * 1e6
+        print(f"{name:<14}{legacy:>14.3f}{cached:>14.3f}{legacy / cached:>9.1f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""统计接口基准：原来的7条查询 vs 一次分组扫描 vs 读取汇总表
+
+在临时SQLite库中为一个用户生成指定数量的记录（另有其他用户的记录作为干扰），
+分别计时，并校验各实现的结果一致：
+
+    python benchmarks/bench_statistics.py [记录数 ...]
+"""
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import sql_dialect  # noqa: E402
+import sqlite_schema  # noqa: E402
+
+SCHEMA = ";".join([
+    sqlite_schema.RECORDS_TABLE_SQL.format(table="commute_records"),
+    "CREATE INDEX idx_user_date_time ON commute_records (user_eng_name, date, start_time)",
+    "CREATE INDEX idx_user_transport_date ON commute_records (user_eng_name, transport_type, date, start_time)",
+    "CREATE INDEX idx_user_commute_date ON commute_records (user_eng_name, commute_type, date, start_time)",
+    "CREATE INDEX idx_date ON commute_records (date)",
+    sqlite_schema.SUMMARY_TABLE_SQL,
+])
+
+# 旧版 get_statistics 的7条查询
+LEGACY_QUERIES = {
+    "basic": """
+        SELECT COUNT(*) as total_count, AVG(total_duration) as avg_duration,
+            MIN(total_duration) as min_duration, MAX(total_duration) as max_duration,
+            AVG(rating) as avg_rating
+        FROM commute_records WHERE user_eng_name = %s AND total_duration IS NOT NULL
+    """,
+    "by_transport": """
+        SELECT transport_type, COUNT(*) as count, AVG(total_duration) as avg_duration
+        FROM commute_records WHERE user_eng_name = %s AND total_duration IS NOT NULL
+        GROUP BY transport_type
+    """,
+    "by_commute_type": """
+        SELECT commute_type, COUNT(*) as count, AVG(total_duration) as avg_duration
+        FROM commute_records WHERE user_eng_name = %s AND total_duration IS NOT NULL
+        GROUP BY commute_type
+    """,
+    "by_weekday": """
+        SELECT weekday, AVG(total_duration) as avg_duration, COUNT(*) as count
+        FROM commute_records WHERE user_eng_name = %s AND total_duration IS NOT NULL
+        GROUP BY weekday
+    """,
+    "by_weather": """
+        SELECT weather, AVG(total_duration) as avg_duration, COUNT(*) as count
+        FROM commute_records
+        WHERE user_eng_name = %s AND total_duration IS NOT NULL AND weather IS NOT NULL
+        GROUP BY weather
+    """,
+    "trend": """
+        SELECT date, AVG(total_duration) as avg_duration
+        FROM commute_records
+        WHERE user_eng_name = %s AND total_duration IS NOT NULL
+            AND date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        GROUP BY date ORDER BY date
+    """,
+    "segments": """
+        SELECT
+            AVG(TIMESTAMPDIFF(MINUTE, start_time, on_vehicle_time)) as avg_to_vehicle,
+            AVG(TIMESTAMPDIFF(MINUTE, on_vehicle_time, arrive_time)) as avg_on_vehicle
+        FROM commute_records
+        WHERE user_eng_name = %s AND start_time IS NOT NULL
+            AND on_vehicle_time IS NOT NULL AND arrive_time IS NOT NULL
+    """,
+}
+
+
+def generate_rows(user, count, rng):
+    today = date.today()
+    for i in range(count):
+        day = today - timedelta(days=i // 2)
+        commute_type = "to_work" if i % 2 == 0 else "from_work"
+        start = datetime(day.year, day.month, day.day, 8 if i % 2 == 0 else 18, rng.randint(0, 59))
+        on_vehicle = start + timedelta(minutes=rng.randint(3, 15))
+        total = rng.randint(30, 80)
+        arrive = start + timedelta(minutes=total)
+        # SQLite的存储格式：日期为天数，时间为秒数，星期几为编号
+        days = sql_dialect.date_to_days(day)
+        yield (
+            user, days, sql_dialect.days_to_weekday(days),
+            rng.choice(["晴", "多云", "阴", "小雨", None]), f"{rng.randint(18, 32)}°C",
+            rng.choice(["subway", "car"]), commute_type,
+            sql_dialect.datetime_to_seconds(start), sql_dialect.datetime_to_seconds(on_vehicle),
+            sql_dialect.datetime_to_seconds(arrive),
+            total if rng.random() > 0.02 else None, rng.choice([None, 1, 2, 3, 4, 5]), None,
+        )
+
+
+def build_database(path, count):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rng = random.Random(42)
+    insert = """
+        INSERT INTO commute_records (user_eng_name, date, weekday, weather, temperature,
+            transport_type, commute_type, start_time, on_vehicle_time, arrive_time,
+            total_duration, rating, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    conn.executemany(insert, generate_rows("bench", count, rng))
+    conn.executemany(insert, generate_rows("other", count // 10, rng))
+    columns = ", ".join(analytics.SUMMARY_KEYS + analytics.SUMMARY_VALUES)
+    conn.execute(f"INSERT INTO commute_user_summary ({columns}) SELECT {columns} FROM "
+                 f"({sql_dialect.translate(analytics.SUMMARY_SOURCE_ALL_SQL, sql_dialect.SQLITE)})")
+    conn.commit()
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def run_legacy(conn, user):
+    cursor = conn.cursor()
+    result = {}
+    for name, sql in LEGACY_QUERIES.items():
+        cursor.execute(sql_dialect.translate(sql, sql_dialect.SQLITE), (user,))
+        rows = [dict(row) for row in cursor.fetchall()]
+        for row in rows:
+            # 与接口返回的格式一致
+            if "weekday" in row:
+                row["weekday"] = sql_dialect.weekday_name(row["weekday"])
+            if "date" in row:
+                row["date"] = sql_dialect.days_to_date(row["date"])
+        result[name] = rows[0] if name in ("basic", "segments") else rows
+    return result
+
+
+def _with_trend(cursor, aggregator, user):
+    cursor.execute(sql_dialect.translate(analytics.TREND_SQL, sql_dialect.SQLITE), (user,))
+    return aggregator.add_trend_rows(cursor.fetchall()).statistics()
+
+
+def run_grouped(conn, user):
+    cursor = conn.cursor()
+    cursor.execute(sql_dialect.translate(analytics.SUMMARY_SOURCE_USER_SQL, sql_dialect.SQLITE), (user,))
+    return _with_trend(cursor, analytics.AnalyticsSnapshot().add_rows(cursor.fetchall()), user)
+
+
+def run_summary(conn, user):
+    cursor = conn.cursor()
+    cursor.execute(sql_dialect.translate(analytics.SUMMARY_READ_SQL, sql_dialect.SQLITE), (user,))
+    return _with_trend(cursor, analytics.AnalyticsSnapshot().add_rows(cursor.fetchall()), user)
+
+
+def assert_same(legacy, grouped):
+    def close(a, b):
+        if a is None or b is None:
+            return a is b
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+    for field in ("total_count", "avg_duration", "min_duration", "max_duration", "avg_rating"):
+        assert close(legacy["basic"][field], grouped["basic"][field]), field
+    for section, key in (("by_transport", "transport_type"), ("by_commute_type", "commute_type"),
+                         ("by_weekday", "weekday"), ("by_weather", "weather"), ("trend", "date")):
+        old = {row[key]: row for row in legacy[section]}
+        new = {row[key]: row for row in grouped[section]}
+        assert old.keys() == new.keys(), section
+        for k in old:
+            assert close(old[k]["avg_duration"], new[k]["avg_duration"]), (section, k)
+    for field in ("avg_to_vehicle", "avg_on_vehicle"):
+        assert close(legacy["segments"][field], grouped["segments"][field]), field
+
+
+def measure(func, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main(sizes):
+    print(f"{'records':>9}{'7 queries (ms)':>17}{'grouped (ms)':>15}{'summary (ms)':>15}{'speedup':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_database(os.path.join(tmp, "bench.db"), size)
+            legacy_result = run_legacy(conn, "bench")
+            assert_same(legacy_result, run_grouped(conn, "bench"))
+            assert_same(legacy_result, run_summary(conn, "bench"))
+            legacy = measure(run_legacy, conn, "bench")
+            grouped = measure(run_grouped, conn, "bench")
+            summary = measure(run_summary, conn, "bench")
+            print(f"{size:>9}{legacy:>17.1f}{grouped:>15.1f}{summary:>15.1f}{legacy / summary:>9.1f}x")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,165 @@
+"""趋势分析基准：按全部记录计算的SQL（窗口函数/分组聚合） vs 增量维护的派生表
+
+在临时SQLite库中为一个用户生成指定数量的记录（数据与 bench_statistics.py 相同），
+分别计算滑动平均、星期 × 天气透视表和线性回归，计时并校验结果一致：
+
+    python benchmarks/bench_trends.py [记录数 ...]
+
+派生表一列与接口相同：只读取滑动窗口内的记录、趋势回归统计量、各出行方式的首末日期和汇总表，
+耗时不随记录总数增长。
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import sql_dialect  # noqa: E402
+import sqlite_schema  # noqa: E402
+import trends  # noqa: E402
+from bench_statistics import build_database, measure  # noqa: E402
+
+# 日历中每一天的记录数、时长总和及滑动窗口内的累计
+ROLLING_SQL = """
+    WITH RECURSIVE calendar(day) AS (
+        SELECT ? UNION ALL SELECT day + 1 FROM calendar WHERE day < ?
+    ),
+    daily AS (
+        SELECT date, COUNT(*) AS count, SUM(total_duration) AS duration_sum
+        FROM commute_records
+        WHERE user_eng_name = ? AND total_duration IS NOT NULL AND date BETWEEN ? AND ?
+        GROUP BY date
+    )
+    SELECT day, COALESCE(count, 0) AS count, COALESCE(duration_sum, 0) AS duration_sum,
+        SUM(COALESCE(count, 0)) OVER w AS rolling_count,
+        SUM(COALESCE(duration_sum, 0)) OVER w AS rolling_sum
+    FROM calendar LEFT JOIN daily ON daily.date = calendar.day
+    WINDOW w AS (ORDER BY day ROWS BETWEEN ? PRECEDING AND CURRENT ROW)
+    ORDER BY day
+"""
+
+# 生成的数据可能早于1970年（天数、秒数为负），取余时先转为正余数
+PIVOT_SQL = """
+    SELECT ((date + 3) % 7 + 7) % 7 AS weekday, weather, COUNT(*) AS count, AVG(total_duration) AS avg_duration
+    FROM commute_records
+    WHERE user_eng_name = ? AND total_duration IS NOT NULL AND weather IS NOT NULL AND weather != ''
+    GROUP BY 1, weather
+"""
+
+# 线性回归所需的各项和（x为日期天数或出发时间的分钟数）
+FIT_COLUMNS = """
+    COUNT(*) AS n, SUM({x}) AS sx, SUM(total_duration) AS sy, SUM({x} * {x}) AS sxx,
+    SUM({x} * total_duration) AS sxy, SUM(total_duration * total_duration) AS syy
+"""
+TREND_FIT_SQL = (f"SELECT transport_type, {FIT_COLUMNS.format(x='date')} FROM commute_records "
+                 "WHERE user_eng_name = ? AND total_duration IS NOT NULL GROUP BY transport_type")
+DEPARTURE_X = "(((start_time % 86400 + 86400) % 86400) / 60.0)"
+DEPARTURE_FIT_SQL = (f"SELECT commute_type, {FIT_COLUMNS.format(x=DEPARTURE_X)} FROM commute_records "
+                     "WHERE user_eng_name = ? AND total_duration IS NOT NULL AND start_time IS NOT NULL "
+                     "GROUP BY commute_type")
+
+
+def slope_from_sums(row):
+    n = row["n"]
+    sxx = row["sxx"] - row["sx"] * row["sx"] / n
+    sxy = row["sxy"] - row["sx"] * row["sy"] / n
+    return sxy / sxx if sxx else None
+
+
+def run_sql(conn, user, today):
+    days, window = trends.STATS_ROLLING_DAYS, trends.STATS_ROLLING_WINDOW
+    first = today - days + 1
+    origin = first - (window - 1)
+    cursor = conn.cursor()
+    cursor.execute(ROLLING_SQL, (origin, today, user, origin, today, window - 1))
+    rolling = {
+        sql_dialect.days_to_date(row["day"]): row["rolling_sum"] / row["rolling_count"]
+        for row in cursor.fetchall() if row["day"] >= first and row["rolling_count"]
+    }
+    cursor.execute(PIVOT_SQL, (user,))
+    pivot = {(sql_dialect.WEEKDAY_NAMES[row["weekday"]], row["weather"]): row["avg_duration"]
+             for row in cursor.fetchall()}
+    cursor.execute(TREND_FIT_SQL, (user,))
+    groups = cursor.fetchall()
+    overall = {key: sum(row[key] for row in groups) for key in ("n", "sx", "sy", "sxx", "sxy", "syy")}
+    slopes = {"": slope_from_sums(overall)}
+    slopes.update({row["transport_type"]: slope_from_sums(row) for row in groups})
+    cursor.execute(DEPARTURE_FIT_SQL, (user,))
+    departure = {row["commute_type"]: slope_from_sums(row) * 10 for row in cursor.fetchall()}
+    return rolling, pivot, slopes, departure
+
+
+def prepare(conn):
+    """构建趋势回归统计量表（汇总表已由 build_database 构建）"""
+    conn.execute(sqlite_schema.TREND_TABLE_SQL)
+    cursor = conn.cursor()
+    cursor.execute(sql_dialect.translate(trends.SOURCE_ALL_SQL, sql_dialect.SQLITE))
+    deltas = trends.stat_deltas(tuple(row) for row in cursor.fetchall())
+    cursor.executemany(sql_dialect.translate(trends.STATS_UPSERT_SQL, sql_dialect.SQLITE),
+                       [key + (value,) for key, value in deltas.items()])
+    conn.commit()
+
+
+def query(cursor, sql, params):
+    cursor.execute(sql_dialect.translate(sql, sql_dialect.SQLITE), params)
+    return cursor.fetchall()
+
+
+def run_derived(conn, user, today):
+    """与接口相同的读取：窗口内的记录、回归统计量、首末日期和汇总表"""
+    cursor = conn.cursor()
+    origin = sql_dialect.date_to_days(trends.rolling_origin(today))
+    rolling = trends.rolling_trend(query(cursor, trends.ROLLING_SQL, (user, origin)), today=today)
+    stats = trends.TrendStats(query(cursor, trends.STATS_READ_SQL, (user,)))
+    for transport_type in stats.transports:
+        bounds = [query(cursor, trends.DATE_BOUND_SQL.format(order=order), (user, transport_type))[0]["date"]
+                  for order in ("ASC", "DESC")]
+        stats.set_date_bounds(transport_type, *bounds)
+    snapshot = analytics.AnalyticsSnapshot().add_rows(query(cursor, analytics.SUMMARY_READ_SQL, (user,)))
+    return {"rolling_trend": rolling, "pivot": snapshot.pivot(), "regression": stats.regression()}
+
+
+def derived_result(result):
+    rolling = {item["date"]: item["rolling_avg"] for item in result["rolling_trend"]["series"]}
+    pivot = result["pivot"]
+    cells = {
+        (weekday, weather): pivot["avg_duration"][i][j]
+        for i, weekday in enumerate(pivot["weekdays"])
+        for j, weather in enumerate(pivot["weathers"])
+        if pivot["count"][i][j]
+    }
+    regression = result["regression"]
+    slopes = {"": regression["trend"]["slope_per_day"]}
+    slopes.update({item["transport_type"]: item["slope_per_day"] for item in regression["by_transport"]})
+    departure = {item["commute_type"]: item["slope_per_10_minutes"] for item in regression["departure"]}
+    return rolling, cells, slopes, departure
+
+
+def assert_same(expected, actual):
+    for section, (want, got) in zip(("rolling", "pivot", "slopes", "departure"), zip(expected, actual)):
+        assert want.keys() == got.keys(), section
+        for key in want:
+            assert math.isclose(want[key], got[key], rel_tol=1e-6, abs_tol=1e-9), (section, key, want[key], got[key])
+
+
+def main(sizes):
+    today = date.today()
+    today_days = sql_dialect.date_to_days(today)
+    print(f"{'records':>9}{'SQL (ms)':>11}{'derived (ms)':>15}{'speedup':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_database(os.path.join(tmp, "bench.db"), size)
+            prepare(conn)
+            assert_same(run_sql(conn, "bench", today_days), derived_result(run_derived(conn, "bench", today)))
+            sql = measure(run_sql, conn, "bench", today_days)
+            derived = measure(run_derived, conn, "bench", today)
+            print(f"{size:>9}{sql:>11.1f}{derived:>15.1f}{sql / derived:>9.1f}x")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
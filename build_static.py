@@ -0,0 +1,41 @@
+"""构建静态资源
+
+把 static/ 下的文件按内容哈希命名、改写文件间的引用、生成service worker的预缓存清单，
+并输出gzip/brotli预压缩版本（见 static_assets）。服务启动时发现构建目录即分发构建结果，
+部署时在启动服务前执行：
+
+    python build_static.py [--output static_dist]
+"""
+import argparse
+import os
+import sys
+
+import static_assets
+
+
+def build(output=static_assets.STATIC_DIST_DIR):
+    manifest = static_assets.build_assets(output=output)
+    for name, hashed in sorted(manifest.items()):
+        print(f"  {name} -> {hashed}")
+    if static_assets.brotli is None:
+        print("未安装brotli，只生成gzip压缩版本（pip install brotli）")
+    total = compressed = 0
+    for name in os.listdir(output):
+        if name.endswith(static_assets.COMPRESSIBLE_EXTENSIONS):
+            size = os.path.getsize(os.path.join(output, name))
+            gz = os.path.join(output, name + ".gz")
+            total += size
+            compressed += os.path.getsize(gz) if os.path.exists(gz) else size
+    print(f"✓ 构建完成: {output}（{len(manifest)} 个哈希资源，gzip {total / 1024:.0f} KB -> {compressed / 1024:.0f} KB）")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建静态资源（内容哈希、预压缩、预缓存清单）")
+    parser.add_argument("--output", default=static_assets.STATIC_DIST_DIR, help="输出目录")
+    args = parser.parse_args()
+    try:
+        build(args.output)
+    except Exception as e:
+        print(f"✗ 构建失败: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,40 @@
+"""统计汇总表一致性检查
+
+对比 commute_user_summary 及其他派生表（时长分布草图、预测模型统计量、出发时段直方图）
+与原始记录，输出不一致的分组；加 --rebuild 时按原始记录全部重建。
+
+    python check_summary.py [--user 英文名] [--rebuild]
+"""
+import argparse
+import sys
+
+import main
+
+
+def check_summary(user_eng_name=None, rebuild=False):
+    """检查（并可选重建）汇总表，返回不一致的分组数"""
+    main.init_database_backend()
+    print(f"当前数据库: {main.current_backend()}")
+    with main.get_db_connection() as conn:
+        cursor = conn.cursor()
+        mismatches = main.check_user_summary(cursor, conn, user_eng_name)
+        for mismatch in mismatches:
+            group = ", ".join(f"{k}={v!r}" for k, v in mismatch["group"].items())
+            diffs = ", ".join(f"{field}: 期望 {want} 实际 {got}"
+                              for field, (want, got) in mismatch["diffs"].items())
+            print(f"✗ {group} | {diffs}")
+        if mismatches and rebuild:
+            main.rebuild_user_summary(cursor, conn, user_eng_name)
+            print(f"✓ 已重建汇总表（修复 {len(mismatches)} 个分组）")
+        elif not mismatches:
+            print("✓ 汇总表与原始记录一致")
+        cursor.close()
+    return 0 if rebuild else len(mismatches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查统计汇总表与原始记录是否一致")
+    parser.add_argument("--user", help="只检查指定用户（英文名）")
+    parser.add_argument("--rebuild", action="store_true", help="发现不一致时重建汇总表")
+    args = parser.parse_args()
+    sys.exit(1 if check_summary(args.user, args.rebuild) else 0)
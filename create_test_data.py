@@ -121,23 +121,27 @@ for i in range(30):
     
     test_data.append(record)
 
-# 发送数据到API
+# 发送数据到API（批量接口，一次请求写入）
 success_count = 0
-for record in test_data:
-    try:
-        response = requests.post(
-            f"{base_url}/api/records",
-            headers={"Content-Type": "application/json"},
-            json=record
-        )
-        if response.status_code == 200:
-            success_count += 1
-            commute_name = commute_names[record['commute_type']]
-            transport_name = transport_names[record['transport_type']]
-            print(f"成功添加记录: {record['date']} {commute_name} - {transport_name}")
-        else:
-            print(f"添加记录失败: {response.text}")
-    except Exception as e:
-        print(f"请求失败: {str(e)}")
+try:
+    response = requests.post(
+        f"{base_url}/api/records/batch",
+        headers={"Content-Type": "application/json"},
+        json={"records": test_data}
+    )
+    if response.status_code == 200:
+        for item in response.json()["results"]:
+            record = test_data[item["index"]]
+            if item["success"]:
+                success_count += 1
+                commute_name = commute_names[record['commute_type']]
+                transport_name = transport_names[record['transport_type']]
+                print(f"成功添加记录: {record['date']} {commute_name} - {transport_name}")
+            else:
+                print(f"添加记录失败: {item['errors']}")
+    else:
+        print(f"添加记录失败: {response.text}")
+except Exception as e:
+    print(f"请求失败: {str(e)}")
 
-print(f"\n共添加 {success_count}/{len(test_data)} 条记录")
\ No newline at end of file
+print(f"\n共添加 {success_count}/{len(test_data)} 条记录")
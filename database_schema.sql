@@ -11,12 +11,90 @@ CREATE TABLE IF NOT EXISTS commute_records (
     start_time DATETIME NOT NULL COMMENT '出门时间',
     on_vehicle_time DATETIME COMMENT '上车/上地铁时间',
     arrive_time DATETIME COMMENT '到达时间',
+    to_vehicle_minutes DOUBLE AS (TIMESTAMPDIFF(SECOND, start_time, on_vehicle_time) / 60e0) STORED COMMENT '出门到上车耗时（分钟）',
+    on_vehicle_minutes DOUBLE AS (TIMESTAMPDIFF(SECOND, on_vehicle_time, arrive_time) / 60e0) STORED COMMENT '上车到到达耗时（分钟）',
     total_duration INT COMMENT '总通勤时长（分钟）',
     rating TINYINT COMMENT '评分（1-5星）',
     notes TEXT COMMENT '备注',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    INDEX idx_user_date (user_eng_name, date),
-    INDEX idx_user_type (user_eng_name, transport_type),
+    INDEX idx_user_date_time (user_eng_name, date, start_time),
+    INDEX idx_user_transport_date (user_eng_name, transport_type, date, start_time),
+    INDEX idx_user_commute_date (user_eng_name, commute_type, date, start_time),
     INDEX idx_date (date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='通勤记录表';
+
+-- 用户统计汇总表（由记录的增删改增量维护）
+CREATE TABLE IF NOT EXISTS commute_user_summary (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    transport_type VARCHAR(20) NOT NULL COMMENT '出行方式',
+    commute_type VARCHAR(20) NOT NULL COMMENT '通勤类型',
+    weekday VARCHAR(20) NOT NULL COMMENT '星期几',
+    weather VARCHAR(50) NOT NULL DEFAULT '' COMMENT '天气状况（空字符串表示未填写）',
+    record_count INT NOT NULL DEFAULT 0 COMMENT '记录数',
+    duration_count INT NOT NULL DEFAULT 0 COMMENT '有总时长的记录数',
+    duration_sum BIGINT NOT NULL DEFAULT 0 COMMENT '总时长之和（分钟）',
+    duration_min INT COMMENT '最短总时长（分钟）',
+    duration_max INT COMMENT '最长总时长（分钟）',
+    rating_sum BIGINT NOT NULL DEFAULT 0 COMMENT '评分之和（仅有总时长的记录）',
+    rating_count INT NOT NULL DEFAULT 0 COMMENT '评分数（仅有总时长的记录）',
+    segment_count INT NOT NULL DEFAULT 0 COMMENT '三个时间点齐全的记录数',
+    to_vehicle_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '出门到上车耗时之和（分钟）',
+    on_vehicle_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '上车到到达耗时之和（分钟）',
+    PRIMARY KEY (user_eng_name, transport_type, commute_type, weekday, weather)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户统计汇总表';
+
+-- 时长分布草图（按对数分桶的记录数，由记录的增删改增量维护，见quantiles.py）
+CREATE TABLE IF NOT EXISTS commute_duration_sketch (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    transport_type VARCHAR(20) NOT NULL COMMENT '出行方式',
+    commute_type VARCHAR(20) NOT NULL COMMENT '通勤类型',
+    bucket INT NOT NULL COMMENT '对数桶编号（-1表示时长不大于0）',
+    bucket_count INT NOT NULL DEFAULT 0 COMMENT '桶内记录数',
+    PRIMARY KEY (user_eng_name, transport_type, commute_type, bucket)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='时长分布草图';
+
+-- 时长预测模型的充分统计量（Σ z·zᵀ 的上三角，由记录的增删改增量维护，见prediction.py）
+CREATE TABLE IF NOT EXISTS commute_prediction_stats (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    row_index INT NOT NULL COMMENT '行号（特征序号，最后一个为总时长）',
+    col_index INT NOT NULL COMMENT '列号（不小于行号）',
+    stat_value DOUBLE NOT NULL DEFAULT 0 COMMENT '累计值',
+    PRIMARY KEY (user_eng_name, row_index, col_index)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='时长预测模型统计量';
+
+-- 按15分钟出发时段的时长直方图（对数分桶的记录数，由记录的增删改增量维护，见departure.py）
+CREATE TABLE IF NOT EXISTS commute_departure_histogram (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    transport_type VARCHAR(20) NOT NULL COMMENT '出行方式',
+    commute_type VARCHAR(20) NOT NULL COMMENT '通勤类型',
+    departure_bucket INT NOT NULL COMMENT '出发时段（当天第几个15分钟）',
+    bucket INT NOT NULL COMMENT '时长的对数桶编号',
+    bucket_count INT NOT NULL DEFAULT 0 COMMENT '桶内记录数',
+    PRIMARY KEY (user_eng_name, transport_type, commute_type, departure_bucket, bucket)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='出发时段时长直方图';
+
+-- 时长趋势回归的充分统计量（n、Σx、Σx²、Σy、Σy²、Σxy，由记录的增删改增量维护，见trends.py）
+CREATE TABLE IF NOT EXISTS commute_trend_stats (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    transport_type VARCHAR(20) NOT NULL COMMENT '出行方式',
+    commute_type VARCHAR(20) NOT NULL COMMENT '通勤类型',
+    stat_name VARCHAR(20) NOT NULL COMMENT '统计量名（date_/departure_ 前缀）',
+    stat_value BIGINT NOT NULL DEFAULT 0 COMMENT '累计值（整数，x为日期天数或出发时间的当天秒数）',
+    PRIMARY KEY (user_eng_name, transport_type, commute_type, stat_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='时长趋势回归统计量';
+
+-- 客户端记录标识（离线队列重试时按 用户 + client_id 去重，记录删除后仍保留）
+CREATE TABLE IF NOT EXISTS commute_client_records (
+    user_eng_name VARCHAR(100) NOT NULL COMMENT '用户英文名',
+    client_id VARCHAR(64) NOT NULL COMMENT '客户端生成的记录标识',
+    record_id INT NOT NULL COMMENT '对应的记录ID',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '首次写入时间',
+    PRIMARY KEY (user_eng_name, client_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='客户端记录标识';
+
+-- 已执行的一次性数据迁移（启动和熔断恢复时跳过已记录的迁移）
+CREATE TABLE IF NOT EXISTS commute_schema_migrations (
+    name VARCHAR(100) NOT NULL PRIMARY KEY COMMENT '迁移名称',
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '执行时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数据迁移记录';
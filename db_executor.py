@@ -0,0 +1,133 @@
+"""数据库操作的有界线程池
+
+pymysql和sqlite3都是阻塞驱动。接口改为async后，用 @offload 把同步的数据库
+代码提交到专用线程池执行：线程数与连接池上限一致，排队的请求在事件循环中等待
+（只占一个协程），而不是各自占住Starlette线程池中的线程再阻塞在连接池上。
+天气等非数据库的异步接口因此不受数据库排队影响。
+
+环境变量：
+    DB_EXECUTOR_WORKERS    执行数据库操作的线程数，默认与 DB_POOL_MAX_SIZE 相同；
+                           0表示不使用专用线程池，改用Starlette默认线程池（旧行为）
+    DB_EXECUTOR_MAX_QUEUE  排队等待的操作数上限，超出时返回503，默认0表示不限制
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.concurrency import run_in_threadpool
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_MAX_SIZE", 10)))
+DB_EXECUTOR_MAX_QUEUE = int(os.getenv("DB_EXECUTOR_MAX_QUEUE", 0))
+
+
+class ExecutorBusy(Exception):
+    """排队等待的数据库操作超过上限"""
+
+
+class DatabaseExecutor:
+    """把同步数据库操作放到有界线程池中执行"""
+
+    def __init__(self, max_workers=10, max_queue=0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._metrics = {"submitted": 0, "completed": 0, "rejected": 0,
+                         "queue_time_total": 0.0, "queue_time_max": 0.0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="db-worker"
+                    )
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """在线程池中执行func，保留当前上下文（请求内的追踪统计）"""
+        call = functools.partial(func, *args, **kwargs)
+        if self.max_workers <= 0:
+            return await run_in_threadpool(call)
+
+        with self._lock:
+            if self.max_queue and self._pending >= self.max_queue:
+                self._metrics["rejected"] += 1
+                raise ExecutorBusy(f"数据库操作排队数超过上限({self.max_queue})")
+            self._pending += 1
+            self._metrics["submitted"] += 1
+        submitted = time.monotonic()
+        context = contextvars.copy_context()
+
+        def task():
+            self._started(time.monotonic() - submitted)
+            try:
+                return context.run(call)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._metrics["completed"] += 1
+
+        try:
+            future = self._get_executor().submit(task)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # 请求取消时，尚未开始的操作会被取消，不再计入排队数
+        future.add_done_callback(self._cancelled)
+        return await asyncio.wrap_future(future)
+
+    def submit(self, func, *args):
+        """提交操作后不等待结果（用于清理工作）"""
+        if self.max_workers <= 0:
+            threading.Thread(target=func, args=args, daemon=True).start()
+            return
+        self._get_executor().submit(func, *args)
+
+    def offload(self, func):
+        """装饰器：把同步函数包装为在线程池中执行的协程函数（保留签名，供FastAPI解析参数）"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.run(func, *args, **kwargs)
+        return wrapper
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data.update({
+                "workers": self.max_workers,
+                "queued": self._pending,
+                "active": self._active,
+            })
+        started = data["completed"] + data["active"]
+        data["queue_time_avg"] = data["queue_time_total"] / started if started else 0.0
+        return data
+
+    def _cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    def _started(self, queue_time):
+        with self._lock:
+            self._pending -= 1
+            self._active += 1
+            self._metrics["queue_time_total"] += queue_time
+            if queue_time > self._metrics["queue_time_max"]:
+                self._metrics["queue_time_max"] = queue_time
+
+
+db_executor = DatabaseExecutor(DB_EXECUTOR_WORKERS, DB_EXECUTOR_MAX_QUEUE)
@@ -0,0 +1,296 @@
+"""数据库连接池
+
+为MySQL和SQLite提供统一的连接池：限制最小/最大连接数（启动时预先打开最小连接数）、取出时健康检查、
+空闲连接回收，并记录等待时间等指标。另提供主库熔断器，用于在后台探测
+MySQL恢复情况并在MySQL与SQLite之间切换。
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """在超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """线程安全的通用连接池
+
+    factory: 创建新连接的函数
+    ping: 健康检查函数，连接不可用时应抛出异常
+    """
+
+    def __init__(self, name, factory, ping=None, min_size=1, max_size=10,
+                 timeout=10.0, idle_timeout=300.0, check_interval=5.0):
+        if max_size < 1:
+            raise ValueError("max_size必须大于0")
+        self.name = name
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._factory = factory
+        self._ping = ping
+        self._cond = threading.Condition()
+        # 空闲连接队列：(连接, 最后使用时间)，右端最新
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._metrics = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "closed": 0,
+            "evicted_idle": 0,
+            "failed_checks": 0,
+        }
+
+    def acquire(self):
+        """取出一个连接，必要时新建或等待"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            stale = []
+            conn = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout(f"连接池{self.name}已关闭")
+                    now = time.monotonic()
+                    stale.extend(self._evict_idle_locked(now))
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise PoolTimeout(f"连接池{self.name}等待连接超时({self.timeout}s)")
+                    waited = True
+                    self._cond.wait(remaining)
+            self._close_all(stale)
+
+            if create:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._metrics["created"] += 1
+            elif now - last_used > self.check_interval and not self._is_alive(conn):
+                # 健康检查失败，丢弃后重新获取
+                with self._cond:
+                    self._metrics["failed_checks"] += 1
+                self.release(conn, discard=True)
+                continue
+
+            self._record_wait(time.monotonic() - start, waited)
+            return conn
+
+    def prefill(self):
+        """预先打开连接直到达到最小连接数，返回新建的连接数
+
+        启动时调用，首批请求不必等待建立连接。
+        """
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return opened
+                self._size += 1
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._metrics["created"] += 1
+            self.release(conn)
+            opened += 1
+
+    def release(self, conn, discard=False):
+        """归还连接；discard为True时直接关闭"""
+        stale = []
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                stale.append(conn)
+            else:
+                now = time.monotonic()
+                self._idle.append((conn, now))
+                stale.extend(self._evict_idle_locked(now))
+            self._cond.notify()
+        self._close_all(stale)
+
+    @contextmanager
+    def connection(self):
+        """取出连接，使用完毕后自动归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭连接池及所有空闲连接"""
+        with self._cond:
+            self._closed = True
+            stale = [conn for conn, _ in self._idle]
+            self._size -= len(stale)
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_all(stale)
+
+    def stats(self):
+        """返回连接池状态与等待时间指标"""
+        with self._cond:
+            data = dict(self._metrics)
+            data.update({
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        acquired = data["acquired"]
+        data["wait_time_avg"] = data["wait_time_total"] / acquired if acquired else 0.0
+        return data
+
+    def _evict_idle_locked(self, now):
+        """回收超过空闲时间的连接，保留最小连接数（需持有锁）"""
+        stale = []
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] > self.idle_timeout):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._metrics["evicted_idle"] += 1
+            stale.append(conn)
+        return stale
+
+    def _is_alive(self, conn):
+        if self._ping is None:
+            return True
+        try:
+            self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def _record_wait(self, elapsed, waited):
+        with self._cond:
+            self._metrics["acquired"] += 1
+            self._metrics["wait_time_total"] += elapsed
+            if elapsed > self._metrics["wait_time_max"]:
+                self._metrics["wait_time_max"] = elapsed
+            if waited:
+                self._metrics["waited"] += 1
+
+    def _close_all(self, conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if conns:
+            with self._cond:
+                self._metrics["closed"] += len(conns)
+
+
+class CircuitBreaker:
+    """主库熔断器
+
+    主库故障时打开熔断，请求改走备用后端；后台线程定期探测主库，
+    探测成功并完成恢复回调后关闭熔断，请求线程不会阻塞在主库连接上。
+    """
+
+    def __init__(self, name, probe, on_recover=None, probe_interval=30.0):
+        self.name = name
+        self.probe_interval = probe_interval
+        self._probe = probe
+        self._on_recover = on_recover
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._open = False
+        self._opened_at = None
+        self._last_error = None
+        self._trips = 0
+        self._recoveries = 0
+        self._probes = 0
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def trip(self, error=None):
+        """打开熔断并启动后台探测"""
+        with self._lock:
+            self._last_error = str(error) if error is not None else None
+            if self._open:
+                return
+            self._open = True
+            self._opened_at = time.time()
+            self._trips += 1
+            if self._stop.is_set():
+                return
+            self._thread = threading.Thread(
+                target=self._probe_loop, name=f"{self.name}-probe", daemon=True
+            )
+            self._thread.start()
+
+    def shutdown(self):
+        """停止后台探测"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": "open" if self._open else "closed",
+                "opened_at": self._opened_at if self._open else None,
+                "last_error": self._last_error,
+                "trips": self._trips,
+                "recoveries": self._recoveries,
+                "probes": self._probes,
+            }
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            with self._lock:
+                self._probes += 1
+            try:
+                self._probe()
+                if self._on_recover is not None:
+                    self._on_recover()
+            except Exception as e:
+                with self._lock:
+                    self._last_error = str(e)
+                continue
+            with self._lock:
+                self._open = False
+                self._thread = None
+                self._recoveries += 1
+            print(f"{self.name}已恢复，关闭熔断")
+            return
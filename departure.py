@@ -0,0 +1,157 @@
+"""按出发时段的通勤时长直方图与出发时间推荐
+
+每个 用户 × 出行方式 × 通勤类型 × 15分钟出发时段 保存一个时长草图（quantiles.py 的对数分桶计数），
+保存在 commute_departure_histogram 表中，随记录的增删改在同一事务中增量维护。
+推荐时只读取该用户的直方图（行数只与时段数和桶数有关，与记录数无关），按时段估计
+期望时长和p90时长，读取结果按用户写入版本缓存。推荐规则（objective 为 expected 或 p90）：
+
+    arrive_by  在估计到达时间不晚于 arrive_by 的时段中选出发最晚的；没有满足的时段时选到达最早的
+    earliest   在不早于 earliest 出发的时段中选到达最早的（晚一点出发反而更早到达的情况）
+    都不指定   选时长最短的时段
+
+到达时间按时段开始时出发估计；记录数少于 DEPARTURE_MIN_RECORDS 的时段不参与推荐。
+"""
+import os
+
+import quantiles
+import sql_dialect
+
+DEPARTURE_BUCKET_MINUTES = 15
+DEPARTURE_MIN_RECORDS = int(os.getenv("DEPARTURE_MIN_RECORDS", 3))
+OBJECTIVES = ("expected", "p90")
+
+HISTOGRAM_KEYS = ("user_eng_name", "transport_type", "commute_type")
+# 单条记录的分组、出发时间和时长（增量维护）
+VALUE_COLUMNS = HISTOGRAM_KEYS + ("start_time", "total_duration")
+_VALUE_SQL = f"""
+    SELECT {', '.join(VALUE_COLUMNS)}
+    FROM commute_records
+    WHERE total_duration IS NOT NULL AND start_time IS NOT NULL AND {{where}}
+"""
+VALUE_SQL = _VALUE_SQL.format(where="id = %s")
+SOURCE_ALL_SQL = _VALUE_SQL.format(where="1 = 1")
+SOURCE_USER_SQL = _VALUE_SQL.format(where="user_eng_name = %s")
+# 按桶累加计数（SQLite由sql_dialect转换为 ON CONFLICT DO UPDATE）
+HISTOGRAM_UPSERT_SQL = """
+    INSERT INTO commute_departure_histogram
+        (user_eng_name, transport_type, commute_type, departure_bucket, bucket, bucket_count)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE bucket_count = bucket_count + VALUES(bucket_count)
+"""
+HISTOGRAM_READ_SQL = """
+    SELECT transport_type, commute_type, departure_bucket, bucket, bucket_count
+    FROM commute_departure_histogram
+    WHERE user_eng_name = %s AND bucket_count > 0
+"""
+
+
+def departure_bucket(start_time):
+    """出发时间所在的时段编号（当天第几个15分钟），没有出发时间时返回None"""
+    minute = sql_dialect.minute_of_day(start_time)
+    return None if minute is None else int(minute // DEPARTURE_BUCKET_MINUTES)
+
+
+def format_minutes(minutes):
+    minutes = int(round(minutes)) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_minutes(value):
+    """HH:MM 转为当天的分钟数，格式错误时抛出ValueError"""
+    hour, minute = value.strip().split(":")
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(value)
+    return hour * 60 + minute
+
+
+def bucket_counts(values, sign=1):
+    """一组记录对直方图的增量：{(用户, 出行方式, 通勤类型, 出发时段, 时长桶): 记录数}
+
+    values为VALUE_COLUMNS顺序的序列，出发时间或总时长为空的记录不计入。
+    """
+    counts = {}
+    for user_eng_name, transport_type, commute_type, start_time, duration in values:
+        if start_time is None or duration is None:
+            continue
+        key = (user_eng_name, transport_type, commute_type, departure_bucket(start_time),
+               quantiles.bucket_index(duration))
+        counts[key] = counts.get(key, 0) + sign
+    return counts
+
+
+class DepartureHistogram:
+    """一个用户的出发时段直方图：(出行方式, 通勤类型) -> {出发时段: 时长草图}"""
+
+    def __init__(self, rows=()):
+        self.groups = {}
+        for row in rows:
+            windows = self.groups.setdefault((row['transport_type'], row['commute_type']), {})
+            sketch = windows.get(row['departure_bucket'])
+            if sketch is None:
+                sketch = windows[row['departure_bucket']] = quantiles.DurationSketch()
+            sketch.add_bucket(row['bucket'], row['bucket_count'])
+
+    def windows(self, commute_type, transport_type=None):
+        """该通勤类型（和出行方式）下记录数足够的各出发时段，按出发时间排序"""
+        result = []
+        for (transport, commute), windows in self.groups.items():
+            if commute != commute_type or (transport_type is not None and transport != transport_type):
+                continue
+            for index, sketch in windows.items():
+                if sketch.count < DEPARTURE_MIN_RECORDS:
+                    continue
+                start = index * DEPARTURE_BUCKET_MINUTES
+                expected = sum(quantiles.bucket_value(bucket) * count
+                               for bucket, count in sketch.buckets.items()) / sketch.count
+                p90 = sketch.quantile(0.9)
+                result.append({
+                    "transport_type": transport,
+                    "start": start,
+                    "count": sketch.count,
+                    "expected_duration": expected,
+                    "p90_duration": p90,
+                })
+        result.sort(key=lambda window: (window["start"], window["transport_type"]))
+        return result
+
+    def recommend(self, commute_type, transport_type=None, objective="p90", earliest=None, arrive_by=None):
+        """按推荐规则选出发时段，返回 (推荐时段, 候选时段列表)；没有候选时段时推荐为None"""
+        candidates = self.windows(commute_type, transport_type)
+        if earliest is not None:
+            candidates = [window for window in candidates if window["start"] >= earliest]
+
+        def duration(window):
+            return window[f"{objective}_duration"]
+
+        def arrival(window):
+            return window["start"] + duration(window)
+
+        best = None
+        if candidates:
+            if arrive_by is not None:
+                feasible = [window for window in candidates if arrival(window) <= arrive_by]
+                if feasible:
+                    best = max(feasible, key=lambda window: (window["start"], -duration(window)))
+                else:
+                    best = min(candidates, key=arrival)
+            elif earliest is not None:
+                best = min(candidates, key=lambda window: (arrival(window), window["start"]))
+            else:
+                best = min(candidates, key=lambda window: (duration(window), window["start"]))
+        return best, candidates
+
+
+def format_window(window):
+    """接口返回格式：时间为HH:MM，时长保留一位小数"""
+    start = window["start"]
+    return {
+        "transport_type": window["transport_type"],
+        "window_start": format_minutes(start),
+        "window_end": format_minutes(start + DEPARTURE_BUCKET_MINUTES),
+        "count": window["count"],
+        "expected_duration": round(window["expected_duration"], 1),
+        "p90_duration": round(window["p90_duration"], 1),
+        "expected_arrival": format_minutes(start + window["expected_duration"]),
+        "p90_arrival": format_minutes(start + window["p90_duration"]),
+    }
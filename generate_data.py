@@ -0,0 +1,203 @@
+"""生成大规模模拟通勤数据
+
+直接写入当前数据库（MySQL或SQLite，与服务端相同的后端选择），用于容量评估和基准测试。
+每个用户有自己的出行方式偏好、出发时间习惯、基础通勤时长和记录频率；
+天气按天在所有用户间共享，雨天、星期几和随机波动叠加在基础时长上。
+记录按用户、日期顺序分块写入，写完后按原始记录重建统计汇总表。
+
+    python generate_data.py --users 2000 --days 365 [--seed 1] [--profile profile.json]
+    python generate_data.py --records 1000000      # 按目标记录数推算用户数
+
+分布参数见 DEFAULT_PROFILE，可用 --profile 指定JSON文件覆盖其中的部分字段。
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import main
+
+WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+DEFAULT_PROFILE = {
+    # 每个用户的记录频率（每个工作日每个方向记录的概率）服从Beta分布
+    "activity_alpha": 4.0,
+    "activity_beta": 1.5,
+    # 以地铁为主的用户比例；每个用户有 habit 的概率使用自己的主要出行方式
+    "subway_share": 0.6,
+    "habit": 0.9,
+    # 基础通勤时长（分钟）：按出行方式的正态分布，截断到 [min_duration, max_duration]
+    "base_duration": {"subway": [50, 12], "car": [42, 14]},
+    "min_duration": 10,
+    "max_duration": 150,
+    # 出门到上车的时间（分钟），正态分布
+    "to_vehicle": {"subway": [10, 3], "car": [5, 2]},
+    # 出发时间习惯（小时，正态分布的均值和标准差）与每天的波动（分钟）
+    "departure": {"to_work": [8.0, 0.5], "from_work": [18.5, 0.7]},
+    "departure_jitter": 12,
+    # 每天的天气及权重，以及各出行方式的额外耗时（分钟）
+    "weather": {"晴": 0.45, "多云": 0.25, "阴": 0.15, "小雨": 0.1, "大雨": 0.05},
+    "weather_delay": {
+        "subway": {"小雨": 3, "大雨": 8},
+        "car": {"小雨": 8, "大雨": 20},
+    },
+    # 星期几对时长的乘数
+    "weekday_factor": {"星期一": 1.06, "星期五": 0.95},
+    # 每次通勤时长的对数正态波动
+    "noise_sigma": 0.12,
+    # 周末也记录的概率（相对工作日）
+    "weekend_rate": 0.05,
+    # 缺失上车/到达时间、评分的比例，以及带备注的比例
+    "missing_segment_rate": 0.05,
+    "missing_rating_rate": 0.1,
+    "notes_rate": 0.05,
+    "notes": {
+        "subway": ["地铁很准时", "人有点多", "换乘很快", "座位很紧张"],
+        "car": ["路上有点堵", "今天路况不错", "停车有点难", "高架很顺"],
+    },
+}
+
+
+def load_profile(path=None):
+    """默认分布参数，用JSON文件中的字段覆盖"""
+    profile = json.loads(json.dumps(DEFAULT_PROFILE, ensure_ascii=False))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(profile)
+        if unknown:
+            raise ValueError(f"未知的分布参数: {', '.join(sorted(unknown))}")
+        profile.update(overrides)
+    return profile
+
+
+def expected_records_per_user(profile, days):
+    """一个用户在days天内的期望记录数"""
+    activity = profile["activity_alpha"] / (profile["activity_alpha"] + profile["activity_beta"])
+    day_rate = (5 + 2 * profile["weekend_rate"]) / 7
+    return 2 * days * day_rate * activity
+
+
+def daily_weather(profile, days, end_date, rng):
+    """按天生成所有用户共享的天气和温度"""
+    names = list(profile["weather"])
+    weights = list(profile["weather"].values())
+    weather = {}
+    for offset in range(days):
+        day = end_date - timedelta(days=offset)
+        # 以年为周期的温度变化（深圳约12~32°C）
+        season = math.cos((day.timetuple().tm_yday - 200) / 365 * 2 * math.pi)
+        temperature = round(22 + 10 * season + rng.gauss(0, 2))
+        weather[day] = (rng.choices(names, weights)[0], f"{temperature}°C")
+    return weather
+
+
+def generate_user_records(user_eng_name, profile, weather, rng):
+    """按日期顺序生成一个用户的记录（RECORD_COLUMNS顺序的元组）"""
+    activity = rng.betavariate(profile["activity_alpha"], profile["activity_beta"])
+    main_transport = "subway" if rng.random() < profile["subway_share"] else "car"
+    other_transport = "car" if main_transport == "subway" else "subway"
+    base = {t: min(max(rng.gauss(*profile["base_duration"][t]), profile["min_duration"]),
+                   profile["max_duration"])
+            for t in ("subway", "car")}
+    departure = {c: rng.gauss(*profile["departure"][c]) * 60 for c in ("to_work", "from_work")}
+
+    for day in sorted(weather):
+        weekday = WEEKDAYS[day.weekday()]
+        day_rate = activity * (profile["weekend_rate"] if day.weekday() >= 5 else 1.0)
+        weather_name, temperature = weather[day]
+        for commute_type in ("to_work", "from_work"):
+            if rng.random() >= day_rate:
+                continue
+            transport = main_transport if rng.random() < profile["habit"] else other_transport
+            duration = (base[transport] * profile["weekday_factor"].get(weekday, 1.0)
+                        + profile["weather_delay"][transport].get(weather_name, 0))
+            duration *= rng.lognormvariate(0, profile["noise_sigma"])
+            total = int(round(min(max(duration, profile["min_duration"]), profile["max_duration"])))
+            to_vehicle = int(round(min(max(rng.gauss(*profile["to_vehicle"][transport]), 1), total - 1)))
+
+            minutes = departure[commute_type] + rng.gauss(0, profile["departure_jitter"])
+            start = datetime(day.year, day.month, day.day) + timedelta(minutes=int(minutes))
+            if rng.random() < profile["missing_segment_rate"]:
+                on_vehicle_time = arrive_time = None
+            else:
+                on_vehicle_time = (start + timedelta(minutes=to_vehicle)).strftime("%Y-%m-%d %H:%M:%S")
+                arrive_time = (start + timedelta(minutes=total)).strftime("%Y-%m-%d %H:%M:%S")
+
+            if rng.random() < profile["missing_rating_rate"]:
+                rating = None
+            else:
+                # 比平时快时评分高，慢时评分低
+                rating = min(5, max(1, round(4 - (total - base[transport]) / 10 + rng.gauss(0, 0.5))))
+            notes = rng.choice(profile["notes"][transport]) if rng.random() < profile["notes_rate"] else None
+
+            yield (user_eng_name, day.isoformat(), weekday, weather_name, temperature, transport,
+                   commute_type, start.strftime("%Y-%m-%d %H:%M:%S"), on_vehicle_time, arrive_time,
+                   total, rating, notes)
+
+
+def generate(users=100, days=365, seed=1, prefix="gen", profile=None, chunk_size=10000, end_date=None):
+    """生成并写入模拟数据，返回写入的记录数"""
+    profile = profile or load_profile()
+    end_date = end_date or date.today()
+    rng = random.Random(seed)
+    weather = daily_weather(profile, days, end_date, rng)
+    width = len(str(users))
+
+    main.init_database_backend()
+    print(f"当前数据库: {main.current_backend()}")
+    print(f"生成 {users} 个用户、{days} 天的记录，预计约 "
+          f"{int(users * expected_records_per_user(profile, days))} 条")
+    started = time.monotonic()
+    written = 0
+    chunk = []
+
+    def flush():
+        nonlocal written
+        with main.get_db_connection() as conn:
+            cursor = conn.cursor()
+            main.execute_many(cursor, main.INSERT_RECORD_SQL, main.record_rows(conn, chunk), conn)
+            cursor.close()
+        written += len(chunk)
+        chunk.clear()
+        elapsed = time.monotonic() - started
+        print(f"已写入 {written} 条（{written / elapsed:.0f} 条/秒）")
+
+    for index in range(users):
+        chunk.extend(generate_user_records(f"{prefix}{index:0{width}d}", profile, weather, rng))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    # 直接写入的记录不经过增量维护，统一重建汇总表
+    with main.get_db_connection() as conn:
+        cursor = conn.cursor()
+        main.rebuild_user_summary(cursor, conn)
+        cursor.close()
+    print(f"✓ 生成完成：{written} 条记录，耗时 {time.monotonic() - started:.1f} 秒")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成大规模模拟通勤数据并直接写入数据库")
+    parser.add_argument("--users", type=int, default=100, help="用户数")
+    parser.add_argument("--records", type=int, help="目标记录数（按分布参数推算用户数，覆盖 --users）")
+    parser.add_argument("--days", type=int, default=365, help="生成最近多少天的记录")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子，相同参数生成相同数据")
+    parser.add_argument("--prefix", default="gen", help="用户英文名前缀")
+    parser.add_argument("--profile", help="覆盖默认分布参数的JSON文件")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="每个事务写入的记录数")
+    args = parser.parse_args()
+    try:
+        profile = load_profile(args.profile)
+        users = args.users
+        if args.records:
+            users = max(1, math.ceil(args.records / expected_records_per_user(profile, args.days)))
+        generate(users, args.days, args.seed, args.prefix, profile, args.chunk_size)
+    except Exception as e:
+        print(f"✗ 生成失败: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,61 @@
+"""从CSV/NDJSON文件批量导入通勤记录
+
+逐块读取文件、校验并按块提交事务，输出进度和无效行；格式默认按扩展名判断。
+CSV列名与导出接口一致，可直接导入 /api/records/export 导出的文件。
+
+    python import_records.py records.csv [--format csv|ndjson] [--chunk-size 10000]
+"""
+import argparse
+import os
+import sys
+
+import main
+from record_import import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, RecordImporter
+
+# 每次从文件读取的字节数
+READ_SIZE = 1 << 20
+
+
+def print_progress(progress):
+    print(f"已处理 {progress['rows']} 行，写入 {progress['inserted']} 条，"
+          f"失败 {progress['failed']} 条（{progress['rows_per_second']:.0f} 行/秒）")
+
+
+def import_file(path, import_format=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """导入文件，返回导入结果"""
+    if import_format is None:
+        import_format = os.path.splitext(path)[1].lstrip(".").lower()
+        if import_format == "jsonl":
+            import_format = "ndjson"
+    main.init_database_backend()
+    print(f"当前数据库: {main.current_backend()}")
+    importer = RecordImporter(import_format, main.CommuteRecordCreate, main.write_import_chunk,
+                              chunk_size=chunk_size, on_progress=print_progress)
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            importer.feed(data)
+    result = importer.finish()
+    for error in result["errors"]:
+        print(f"✗ 第{error['line']}行: {'; '.join(error['errors'])}")
+    if result["failed"] > len(result["errors"]):
+        print(f"  ……另有 {result['failed'] - len(result['errors'])} 行无效")
+    print(f"✓ 导入完成：写入 {result['inserted']} 条，失败 {result['failed']} 条，"
+          f"耗时 {result['elapsed']:.1f} 秒")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从CSV/NDJSON文件批量导入通勤记录")
+    parser.add_argument("path", help="CSV或NDJSON文件")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="文件格式，默认按扩展名判断")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="每个事务写入的行数")
+    args = parser.parse_args()
+    try:
+        result = import_file(args.path, args.format, args.chunk_size)
+    except Exception as e:
+        print(f"✗ 导入失败: {str(e)}")
+        sys.exit(1)
+    sys.exit(1 if result["failed"] else 0)
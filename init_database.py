@@ -1,44 +1,28 @@
-import pymysql
-import os
+"""初始化MySQL数据库表结构
+
+与服务启动时执行同一个 main.init_mysql_schema：建表、补齐分段耗时列和索引、
+执行尚未执行的一次性数据迁移，派生表首次创建或有修正时按已有记录构建。
+使用与服务相同的 DB_HOST、DB_NAME 等环境变量。
+
+    python init_database.py
+"""
 import sys
 
-# 数据库配置
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": int(os.getenv("DB_PORT", 3306)),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", ""),
-    "database": os.getenv("DB_NAME", "eb9no2qf"),
-    "charset": "utf8mb4"
-}
+import main
 
 def init_database():
     """初始化数据库表结构"""
     try:
         print("正在连接数据库...")
-        conn = pymysql.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
         print("正在创建表结构...")
-        
-        # 读取SQL文件
-        with open('database_schema.sql', 'r', encoding='utf-8') as f:
-            sql = f.read()
-        
-        # 执行SQL
-        cursor.execute(sql)
-        conn.commit()
-        
+        main.init_mysql_schema()
         print("✓ 数据库表结构创建成功！")
-        
-        cursor.close()
-        conn.close()
-        
         return True
-        
     except Exception as e:
         print(f"✗ 数据库初始化失败: {str(e)}")
         return False
+    finally:
+        main.mysql_pool.close()
 
 if __name__ == "__main__":
     success = init_database()
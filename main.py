@@ -1,20 +1,56 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from fastapi.responses import RedirectResponse, PlainTextResponse, Response, JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import Optional, List, Dict, Any, Callable, NamedTuple
 from datetime import datetime, date, timedelta
 import pymysql
 import sqlite3
 import os
-from contextlib import contextmanager
-import requests
+from contextlib import contextmanager, asynccontextmanager
+import threading
+import time
 from collections import defaultdict
 from typing import Union
 import json
+import base64
+import csv
+import io
+import hmac
+import math
+import operator
+import sql_dialect
+import sqlite_schema
+import static_assets
+import analytics
+import departure
+import prediction
+import quantiles
+import record_format
+import trends
+import suggestions
+import tracing
+from response_cache import response_cache
+from db_pool import ConnectionPool, PoolTimeout, CircuitBreaker
+from weather import weather_service
+from db_executor import db_executor, ExecutorBusy
+from record_import import RecordImporter
 
-app = FastAPI(title="通勤时间记录系统")
+@asynccontextmanager
+async def lifespan(app):
+    # 启动时确定数据库后端并初始化表结构
+    init_database_backend()
+    # 启动天气后台刷新，接口只读缓存
+    await weather_service.start()
+    yield
+    await weather_service.stop()
+    db_executor.shutdown()
+    mysql_breaker.shutdown()
+    mysql_pool.close()
+    sqlite_pool.close()
+
+app = FastAPI(title="通勤时间记录系统", lifespan=lifespan)
 
 # CORS配置
 app.add_middleware(
@@ -25,6 +61,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """记录每个接口的耗时和请求内的数据库耗时"""
+    stats, token = tracing.begin_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        tracing.end_request(token)
+        route = request.scope.get("route")
+        if route is not None:
+            endpoint = route.path
+        elif request.url.path.startswith("/static/"):
+            endpoint = "/static"
+        else:
+            endpoint = "unmatched"
+        tracing.metrics.observe_request(
+            endpoint, request.method, status,
+            time.perf_counter() - started, stats["db_time"]
+        )
+
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    """数据库操作排队过多时快速失败"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
 # 数据库配置（从环境变量获取）
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -33,194 +98,908 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", ""),
     "database": os.getenv("DB_NAME", "commute_tracker"),
     "charset": "utf8mb4",
+    "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 5)),
     "cursorclass": pymysql.cursors.DictCursor
 }
 
+# 数据库后端：auto（MySQL优先，不可用时切换到SQLite）、mysql、sqlite
+DB_BACKEND = os.getenv("DB_BACKEND", "auto").lower()
+# MySQL熔断后的后台探测间隔（秒）
+DB_PROBE_INTERVAL = float(os.getenv("DB_PROBE_INTERVAL", 30))
+
+# 连接池配置
+DB_POOL_CONFIG = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    "idle_timeout": float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300)),
+    "check_interval": float(os.getenv("DB_POOL_CHECK_INTERVAL", 5)),
+}
+
+SQLITE_PATH = "data/commute_tracker.db"
+# 每个SQLite连接的页缓存大小（KB）
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", 16384))
+# 数据库被其他连接锁定时的等待时间（毫秒）
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+def create_mysql_connection():
+    """创建MySQL连接"""
+    return pymysql.connect(**DB_CONFIG)
+
+def create_sqlite_connection():
+    """创建SQLite连接（连接池中跨线程复用）"""
+    os.makedirs("data", exist_ok=True)
+    conn = sqlite3.connect(SQLITE_PATH, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    # WAL模式下读不阻塞写、写不阻塞读（设置保存在数据库文件中）
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    # 启用外键约束
+    conn.execute("PRAGMA foreign_keys = ON")
+    # 加大页缓存（默认约2MB），表较大时批量写入维护索引少读磁盘
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    # 设置行工厂以获取字典形式的结果
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def probe_mysql():
+    """探测MySQL是否可用"""
+    conn = create_mysql_connection()
+    try:
+        conn.ping(reconnect=False)
+    finally:
+        conn.close()
+
+mysql_pool = ConnectionPool(
+    "mysql", create_mysql_connection,
+    ping=lambda conn: conn.ping(reconnect=False),
+    **DB_POOL_CONFIG
+)
+sqlite_pool = ConnectionPool(
+    "sqlite", create_sqlite_connection,
+    ping=lambda conn: conn.execute("SELECT 1"),
+    **DB_POOL_CONFIG
+)
+
+# commute_records的二级索引（MySQL与SQLite共用）
+# 按 date, start_time 排序，配合游标分页和日期范围筛选走索引范围扫描；
+# 两个引擎的二级索引都隐含主键id，因此也覆盖 ORDER BY ... id
+RECORD_INDEXES = {
+    "idx_user_date_time": "user_eng_name, date, start_time",
+    "idx_user_transport_date": "user_eng_name, transport_type, date, start_time",
+    "idx_user_commute_date": "user_eng_name, commute_type, date, start_time",
+    "idx_date": "date",
+}
+# 旧版本MySQL表结构中的索引，是上面索引的前缀，已不再使用，只增加写入开销
+SUPERSEDED_RECORD_INDEXES = ("idx_user_date", "idx_user_type")
+
+def init_mysql_indexes(cursor):
+    """补齐MySQL中缺失的索引，删除被取代的旧索引"""
+    cursor.execute(
+        "SELECT DISTINCT index_name AS name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'commute_records'"
+    )
+    existing = {row['name'] for row in cursor.fetchall()}
+    for name, columns in RECORD_INDEXES.items():
+        if name not in existing:
+            cursor.execute(f"CREATE INDEX {name} ON commute_records ({columns})")
+            print(f"✓ 已创建索引 {name}")
+    # 新索引创建完成后再删除旧索引
+    for name in SUPERSEDED_RECORD_INDEXES:
+        if name in existing:
+            cursor.execute(f"DROP INDEX {name} ON commute_records")
+            print(f"✓ 已删除旧索引 {name}")
+
+def init_mysql_columns(cursor):
+    """补齐MySQL中缺失的分段耗时列（添加时按已有记录计算，即回填），返回是否有列添加或修改
+
+    旧版本的分段耗时列为整数分钟（TIMESTAMPDIFF(MINUTE)截断），修改为与SQLite相同的精确分钟数。
+    """
+    cursor.execute(
+        "SELECT column_name AS name, data_type AS type FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = 'commute_records'"
+    )
+    existing = {row['name']: row['type'].lower() for row in cursor.fetchall()}
+    changed = False
+    for name, definition in analytics.MYSQL_SEGMENT_COLUMNS.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE commute_records ADD COLUMN {name} {definition}")
+            print(f"✓ 已添加列 {name}")
+            changed = True
+        elif existing[name] != analytics.MYSQL_SEGMENT_COLUMN_TYPE:
+            cursor.execute(f"ALTER TABLE commute_records MODIFY COLUMN {name} {definition}")
+            print(f"✓ 已修改列 {name} 为精确分钟数")
+            changed = True
+    return changed
+
+def init_mysql_weekdays(cursor):
+    """按日期重新计算旧记录中由客户端提交的星期几，返回修改的行数"""
+    names = ", ".join(f"'{name}'" for name in sql_dialect.WEEKDAY_NAMES)
+    weekday = f"ELT(WEEKDAY(date) + 1, {names})"
+    cursor.execute(f"UPDATE commute_records SET weekday = {weekday} WHERE NOT weekday <=> {weekday}")
+    if cursor.rowcount:
+        print(f"✓ 已按日期修正 {cursor.rowcount} 条记录的星期几")
+    return cursor.rowcount
+
+# MySQL的一次性数据迁移（按顺序执行，完成后记录在commute_schema_migrations中）
+# 迁移函数返回修改的行数，有修改时重建派生表
+MYSQL_MIGRATIONS = (
+    ("weekday_from_date", init_mysql_weekdays),
+)
+
+def run_mysql_migrations(cursor):
+    """执行尚未记录的一次性数据迁移，返回修改的总行数"""
+    cursor.execute("SELECT name FROM commute_schema_migrations")
+    applied = {row['name'] for row in cursor.fetchall()}
+    changed = 0
+    for name, migration in MYSQL_MIGRATIONS:
+        if name in applied:
+            continue
+        changed += migration(cursor)
+        # 并发启动的实例可能同时执行同一迁移（迁移本身幂等），记录时忽略重复
+        cursor.execute("INSERT IGNORE INTO commute_schema_migrations (name) VALUES (%s)", (name,))
+    return changed
+
+def init_mysql_schema():
+    """执行database_schema.sql创建MySQL表结构（幂等）"""
+    schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_schema.sql")
+    with open(schema_path, "r", encoding="utf-8") as f:
+        statements = [stmt.strip() for stmt in f.read().split(";") if stmt.strip()]
+    with mysql_pool.connection() as conn:
+        cursor = conn.cursor()
+        derived_tables = ("commute_user_summary",) + tuple(sqlite_schema.DERIVED_TABLES)
+        cursor.execute(
+            "SELECT COUNT(*) AS count FROM information_schema.tables "
+            f"WHERE table_schema = DATABASE() AND table_name IN ({', '.join(['%s'] * len(derived_tables))})",
+            derived_tables
+        )
+        summary_exists = cursor.fetchone()['count'] == len(derived_tables)
+        for stmt in statements:
+            cursor.execute(stmt)
+        columns_changed = init_mysql_columns(cursor)
+        init_mysql_indexes(cursor)
+        migrated = run_mysql_migrations(cursor)
+        if not summary_exists or columns_changed or migrated:
+            # 汇总表或其他派生表首次创建、分段耗时列或数据迁移有修改时按已有记录构建
+            rebuild_user_summary(cursor, conn)
+        cursor.close()
+        conn.commit()
+    # 启动或熔断恢复时预先打开最小连接数
+    mysql_pool.prefill()
+    print("✓ MySQL数据库表结构检查完成")
+
+def init_sqlite_schema():
+    """初始化SQLite表结构"""
+    with sqlite_pool.connection() as conn:
+        init_sqlite_tables(conn)
+
+# MySQL不可用时打开熔断，后台探测恢复后先补齐表结构再切回
+mysql_breaker = CircuitBreaker(
+    "mysql", probe_mysql,
+    on_recover=init_mysql_schema,
+    probe_interval=DB_PROBE_INTERVAL
+)
+
+_db_init_lock = threading.Lock()
+_db_initialized = False
+
+def init_database_backend():
+    """启动时选择数据库后端并初始化表结构（只执行一次）"""
+    global _db_initialized
+    with _db_init_lock:
+        if _db_initialized:
+            return
+        if DB_BACKEND != "mysql":
+            init_sqlite_schema()
+        if DB_BACKEND != "sqlite":
+            try:
+                init_mysql_schema()
+            except pymysql.Error as e:
+                if DB_BACKEND == "mysql":
+                    raise
+                print(f"MySQL不可用，使用SQLite: {str(e)}")
+                mysql_breaker.trip(e)
+        if current_backend() == "sqlite":
+            sqlite_pool.prefill()
+        print(f"✓ 当前数据库后端: {current_backend()}")
+        _db_initialized = True
+
+def current_backend():
+    """当前处理请求的数据库后端"""
+    if DB_BACKEND == "sqlite" or (DB_BACKEND == "auto" and mysql_breaker.is_open):
+        return "sqlite"
+    return "mysql"
+
+def get_pool_stats():
+    """获取连接池及熔断器指标"""
+    return {
+        "backend": current_backend(),
+        "mysql": mysql_pool.stats(),
+        "sqlite": sqlite_pool.stats(),
+        "breaker": mysql_breaker.stats(),
+    }
+
 # 数据库连接池
 @contextmanager
 def get_db_connection():
-    # 尝试MySQL连接，如果失败则使用SQLite
-    mysql_error = None
+    if not _db_initialized:
+        init_database_backend()
+
+    # 后端由启动检测和熔断器决定，请求线程不再逐次尝试MySQL
+    pool = sqlite_pool if current_backend() == "sqlite" else mysql_pool
     try:
-        conn = pymysql.connect(**DB_CONFIG)
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+        conn = pool.acquire()
     except pymysql.Error as e:
+        if DB_BACKEND == "mysql":
+            raise HTTPException(status_code=500, detail=f"数据库连接失败: {str(e)}")
         mysql_error = str(e)
-        print(f"MySQL连接错误，尝试使用SQLite: {mysql_error}")
+        print(f"MySQL连接错误，切换到SQLite: {mysql_error}")
+        mysql_breaker.trip(e)
+        pool = sqlite_pool
         try:
-            # 使用SQLite作为备选方案
-            os.makedirs("data", exist_ok=True)
-            conn = sqlite3.connect("data/commute_tracker.db")
-            # 启用外键约束
-            conn.execute("PRAGMA foreign_keys = ON")
-            # 设置行工厂以获取字典形式的结果
-            conn.row_factory = sqlite3.Row
-            
-            # 初始化表结构（如果需要）
-            init_sqlite_tables(conn)
-            
-            try:
-                yield conn
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
-            finally:
-                conn.close()
+            conn = sqlite_pool.acquire()
         except Exception as sqlite_e:
             print(f"SQLite连接错误: {str(sqlite_e)}")
             raise HTTPException(status_code=500, detail=f"数据库连接失败: MySQL错误: {mysql_error}, SQLite错误: {str(sqlite_e)}")
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=f"数据库繁忙: {str(e)}")
     except Exception as e:
         # 处理其他异常
         raise HTTPException(status_code=500, detail=f"数据库连接错误: {str(e)}")
 
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            # 回滚失败说明连接已损坏，不再放回池中
+            broken = True
+        raise
+    except BaseException:
+        # 执行被中断（如生成器在事务中被关闭），连接上可能还有未读完的结果，直接丢弃
+        broken = True
+        raise
+    finally:
+        pool.release(conn, discard=broken)
+
 def init_sqlite_tables(conn):
-    """初始化SQLite数据库表结构"""
+    """初始化SQLite数据库表结构和索引（旧版本的表结构在此在线迁移）"""
     cursor = conn.cursor()
+    if sqlite_schema.needs_migration(conn):
+        sqlite_schema.migrate_with_log(conn, RECORD_INDEXES,
+                                       lambda migrate_cursor: rebuild_user_summary(migrate_cursor, conn))
     
-    # 检查表是否已存在
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='commute_records'")
-    if cursor.fetchone():
-        return  # 表已存在
-    
-    # 创建表结构（直接创建，不依赖外部SQL文件）
-    create_table_sql = """
-    CREATE TABLE commute_records (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_eng_name VARCHAR(100) NOT NULL,
-        date TEXT NOT NULL,
-        weekday TEXT NOT NULL,
-        weather TEXT,
-        temperature TEXT,
-        transport_type VARCHAR(20) NOT NULL,
-        commute_type VARCHAR(20) NOT NULL,
-        start_time TEXT,
-        on_vehicle_time TEXT,
-        arrive_time TEXT,
-        total_duration INTEGER,
-        rating INTEGER,
-        notes TEXT,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )
-    """
-    
-    cursor.execute(create_table_sql)
+    # 创建表结构和索引（已存在的数据库同样补齐索引）
+    if sqlite_schema.create_tables(conn, RECORD_INDEXES):
+        # 汇总表或其他派生表首次创建时按已有记录构建
+        rebuild_user_summary(cursor, conn)
+        print("✓ SQLite统计汇总表创建成功！")
+    cursor.close()
     conn.commit()
-    print("✓ SQLite数据库表结构创建成功！")
 
 def is_sqlite_connection(conn):
     """检查是否为SQLite连接"""
     return isinstance(conn, sqlite3.Connection)
 
-def convert_params(sql, params, conn):
-    """根据数据库类型转换SQL和参数"""
-    if is_sqlite_connection(conn):
-        # SQLite使用问号占位符
-        sqlite_sql = sql.replace('%s', '?')
-        # 移除末尾可能的多余字符
-        sqlite_sql = sqlite_sql.rstrip()
-        return sqlite_sql, params
-    return sql, params
-
-def convert_date_functions(sql, conn):
-    """根据数据库类型转换日期函数"""
-    if is_sqlite_connection(conn):
-        # SQLite日期函数转换
-        sqlite_sql = sql.replace('DATE_SUB(CURDATE(), INTERVAL 30 DAY)', "date('now', '-30 days')")
-        
-        # 更仔细地替换TIMESTAMPDIFF，避免语法错误
-        # 先查找TIMESTAMPDIFF模式
-        import re
-        pattern = r'TIMESTAMPDIFF\(MINUTE,\s*(\w+),\s*(\w+)\)'
-        
-        def replace_timestampdiff(match):
-            start_field = match.group(1)
-            end_field = match.group(2)
-            # 转换为SQLite的julianday函数
-            return f"(julianday({end_field}) - julianday({start_field})) * 1440"
-        
-        sqlite_sql = re.sub(pattern, replace_timestampdiff, sqlite_sql)
-        return sqlite_sql
-    return sql
+def get_dialect(conn):
+    """获取连接对应的SQL方言"""
+    return sql_dialect.SQLITE if isinstance(conn, sqlite3.Connection) else sql_dialect.MYSQL
 
 def execute_query(cursor, sql, params=None, conn=None):
     """执行查询，处理数据库差异"""
     if conn is None:
         conn = cursor.connection
     
-    # 转换SQL语句
-    sql, params = convert_params(sql, params if params else [], conn)
-    sql = convert_date_functions(sql, conn)
+    # 转换SQL语句（按方言缓存）
+    sql = sql_dialect.translate(sql, get_dialect(conn))
     
-    # 调试信息
-    print(f"执行SQL: {sql}")
-    if params:
-        print(f"参数: {params}")
-    
-    # 执行查询
-    if params:
-        cursor.execute(sql, params)
-    else:
-        cursor.execute(sql)
+    # 执行查询并记录耗时
+    started = time.perf_counter()
+    try:
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+    except Exception as e:
+        tracing.trace_query(sql, params, started, None, error=e)
+        raise
+    tracing.trace_query(sql, params, started, cursor.rowcount)
     
     return cursor
 
-def format_datetime_result(record, fields=None):
-    """格式化日期时间字段"""
-    if fields is None:
-        fields = ['date', 'start_time', 'on_vehicle_time', 'arrive_time', 'created_at', 'updated_at']
+def execute_many(cursor, sql, seq_params, conn=None):
+    """批量执行同一语句（MySQL的INSERT会合并为多行VALUES）"""
+    if conn is None:
+        conn = cursor.connection
+    sql = sql_dialect.translate(sql, get_dialect(conn))
+    started = time.perf_counter()
+    try:
+        cursor.executemany(sql, seq_params)
+    except Exception as e:
+        tracing.trace_query(sql, None, started, None, error=e)
+        raise
+    tracing.trace_query(sql, None, started, cursor.rowcount)
+    return cursor
+
+# 统计汇总表维护
+SUMMARY_KEY_WHERE = " AND ".join(f"{key} = %s" for key in analytics.SUMMARY_KEYS)
+
+def rebuild_user_summary(cursor, conn, user_eng_name=None):
+    """按原始记录重建统计汇总表、时长分布草图、预测模型统计量、出发时段直方图和趋势回归统计量（指定用户或全部）"""
+    columns = analytics.SUMMARY_KEYS + analytics.SUMMARY_VALUES
+    if user_eng_name is None:
+        execute_query(cursor, "DELETE FROM commute_user_summary", None, conn)
+        source_sql, params = analytics.SUMMARY_SOURCE_ALL_SQL, None
+    else:
+        execute_query(cursor, "DELETE FROM commute_user_summary WHERE user_eng_name = %s", (user_eng_name,), conn)
+        source_sql, params = analytics.SUMMARY_SOURCE_USER_SQL, (user_eng_name,)
+    sql = f"INSERT INTO commute_user_summary ({', '.join(columns)}) SELECT {', '.join(columns)} FROM ({source_sql}) AS source"
+    execute_query(cursor, sql, params, conn)
+    for table in DERIVED_TABLE_SPECS:
+        rebuild_derived_table(cursor, conn, table, user_eng_name)
+
+def check_user_summary(cursor, conn, user_eng_name=None):
+    """对比汇总表与原始记录，返回不一致的分组列表"""
+    if user_eng_name is None:
+        execute_query(cursor, analytics.SUMMARY_SOURCE_ALL_SQL, None, conn)
+    else:
+        execute_query(cursor, analytics.SUMMARY_SOURCE_USER_SQL, (user_eng_name,), conn)
+    expected = {tuple(row[k] for k in analytics.SUMMARY_KEYS): row for row in cursor.fetchall()}
     
-    if record is None:
-        return None
+    sql = f"SELECT {', '.join(analytics.SUMMARY_KEYS + analytics.SUMMARY_VALUES)} FROM commute_user_summary"
+    if user_eng_name is None:
+        execute_query(cursor, sql, None, conn)
+    else:
+        execute_query(cursor, sql + " WHERE user_eng_name = %s", (user_eng_name,), conn)
+    actual = {tuple(row[k] for k in analytics.SUMMARY_KEYS): row for row in cursor.fetchall()}
     
-    # 如果是sqlite3.Row对象，转换为字典
-    if isinstance(record, sqlite3.Row):
-        record = dict(record)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want, got = expected.get(key), actual.get(key)
+        diffs = {}
+        for field in analytics.SUMMARY_VALUES:
+            want_value = want[field] if want is not None else None
+            got_value = got[field] if got is not None else None
+            if want_value is None or got_value is None:
+                if want_value != got_value:
+                    diffs[field] = (want_value, got_value)
+            elif abs(float(want_value) - float(got_value)) > 1e-6:
+                diffs[field] = (want_value, got_value)
+        if diffs:
+            mismatches.append({"group": dict(zip(analytics.SUMMARY_KEYS, key)), "diffs": diffs})
+    for table in DERIVED_TABLE_SPECS:
+        mismatches.extend(check_derived_table(cursor, conn, table, user_eng_name))
+    return mismatches
+
+# 由记录增量维护的派生表（汇总表之外）：每张表由一个描述说明来源、增量和写入方式，
+# 重建、一致性检查和增删改时的增量更新共用下面的一组函数
+class DerivedTable(NamedTuple):
+    name: str
+    # 增量的键（表的主键列）和按键累加的值列
+    key_columns: tuple
+    value_column: str
+    # 单条记录参与计算的字段（value_sql的列，也是记录模型的属性）及按记录ID读取的查询
+    value_columns: tuple
+    value_sql: str
+    # 重建和检查时按原始记录计算的来源查询（全部、指定用户）
+    source_all_sql: str
+    source_user_sql: str
+    # deltas(values, sign) -> {键: 增量}，values为value_columns顺序的序列
+    deltas: Callable
+    # 按键累加（SQLite由sql_dialect转换为 ON CONFLICT DO UPDATE）
+    upsert_sql: str
+    # 移出记录后按用户清理的语句（参数为用户名）
+    cleanup_sql: str
+    # 来源查询的列和计算函数，默认与单条记录相同
+    source_columns: Optional[tuple] = None
+    source_deltas: Optional[Callable] = None
+    # 检查时判断期望值与实际值一致（缺少的键按0比较）
+    same: Callable = operator.eq
+
+    def record_values(self, record):
+        """请求中的记录对应的value_columns"""
+        return tuple(getattr(record, column) for column in self.value_columns)
+
+def _close_stats(want, got):
+    """浮点累加的统计量按相对误差比较"""
+    return math.isclose(want, got, rel_tol=1e-9, abs_tol=1e-6)
+
+DERIVED_TABLE_SPECS = (
+    # 时长分布草图：来源查询按总时长分组，桶编号在Python中计算
+    DerivedTable(
+        name="commute_duration_sketch",
+        key_columns=analytics.SKETCH_KEYS + ("bucket",),
+        value_column="bucket_count",
+        value_columns=analytics.SKETCH_KEYS + ("total_duration",),
+        value_sql=analytics.SKETCH_VALUE_SQL,
+        source_all_sql=analytics.SKETCH_SOURCE_ALL_SQL,
+        source_user_sql=analytics.SKETCH_SOURCE_USER_SQL,
+        deltas=quantiles.bucket_counts,
+        upsert_sql=analytics.SKETCH_UPSERT_SQL,
+        cleanup_sql="DELETE FROM commute_duration_sketch WHERE user_eng_name = %s AND bucket_count <= 0",
+        source_columns=analytics.SKETCH_KEYS + ("total_duration", "value_count"),
+        source_deltas=quantiles.grouped_bucket_counts,
+    ),
+    # 预测模型统计量：用户的记录全部移出后清除剩余的浮点误差
+    DerivedTable(
+        name="commute_prediction_stats",
+        key_columns=("user_eng_name", "row_index", "col_index"),
+        value_column="stat_value",
+        value_columns=prediction.VALUE_COLUMNS,
+        value_sql=prediction.VALUE_SQL,
+        source_all_sql=prediction.SOURCE_ALL_SQL,
+        source_user_sql=prediction.SOURCE_USER_SQL,
+        deltas=prediction.stat_deltas,
+        upsert_sql=prediction.STATS_UPSERT_SQL,
+        cleanup_sql="""
+            DELETE FROM commute_prediction_stats WHERE user_eng_name = %s AND NOT EXISTS (
+                SELECT 1 FROM commute_records
+                WHERE commute_records.user_eng_name = commute_prediction_stats.user_eng_name
+                    AND total_duration IS NOT NULL
+            )
+        """,
+        same=_close_stats,
+    ),
+    # 出发时段直方图
+    DerivedTable(
+        name="commute_departure_histogram",
+        key_columns=departure.HISTOGRAM_KEYS + ("departure_bucket", "bucket"),
+        value_column="bucket_count",
+        value_columns=departure.VALUE_COLUMNS,
+        value_sql=departure.VALUE_SQL,
+        source_all_sql=departure.SOURCE_ALL_SQL,
+        source_user_sql=departure.SOURCE_USER_SQL,
+        deltas=departure.bucket_counts,
+        upsert_sql=departure.HISTOGRAM_UPSERT_SQL,
+        cleanup_sql="DELETE FROM commute_departure_histogram WHERE user_eng_name = %s AND bucket_count <= 0",
+    ),
+    # 趋势回归统计量
+    DerivedTable(
+        name="commute_trend_stats",
+        key_columns=trends.STATS_KEYS + ("stat_name",),
+        value_column="stat_value",
+        value_columns=trends.VALUE_COLUMNS,
+        value_sql=trends.VALUE_SQL,
+        source_all_sql=trends.SOURCE_ALL_SQL,
+        source_user_sql=trends.SOURCE_USER_SQL,
+        deltas=trends.stat_deltas,
+        upsert_sql=trends.STATS_UPSERT_SQL,
+        cleanup_sql="DELETE FROM commute_trend_stats WHERE user_eng_name = %s AND stat_value = 0",
+    ),
+)
+
+def source_derived_deltas(cursor, conn, table, user_eng_name=None):
+    """按原始记录计算派生表的内容：{键: 值}"""
+    if user_eng_name is None:
+        execute_query(cursor, table.source_all_sql, None, conn)
+    else:
+        execute_query(cursor, table.source_user_sql, (user_eng_name,), conn)
+    columns = table.source_columns or table.value_columns
+    compute = table.source_deltas or table.deltas
+    return compute(tuple(row[k] for k in columns) for row in cursor.fetchall())
+
+def rebuild_derived_table(cursor, conn, table, user_eng_name=None):
+    """按原始记录重建派生表（指定用户或全部）"""
+    if user_eng_name is None:
+        execute_query(cursor, f"DELETE FROM {table.name}", None, conn)
+    else:
+        execute_query(cursor, f"DELETE FROM {table.name} WHERE user_eng_name = %s", (user_eng_name,), conn)
+    deltas = source_derived_deltas(cursor, conn, table, user_eng_name)
+    if deltas:
+        execute_many(cursor, table.upsert_sql, [key + (value,) for key, value in deltas.items()], conn)
+
+def check_derived_table(cursor, conn, table, user_eng_name=None):
+    """对比派生表与原始记录，返回不一致的项"""
+    expected = source_derived_deltas(cursor, conn, table, user_eng_name)
+    sql = f"SELECT {', '.join(table.key_columns)}, {table.value_column} FROM {table.name}"
+    if user_eng_name is None:
+        execute_query(cursor, sql, None, conn)
+    else:
+        execute_query(cursor, sql + " WHERE user_eng_name = %s", (user_eng_name,), conn)
+    actual = {tuple(row[k] for k in table.key_columns): row[table.value_column] for row in cursor.fetchall()}
+    return [
+        {"group": dict(zip(table.key_columns, key)),
+         "diffs": {table.value_column: (expected.get(key), actual.get(key))}}
+        for key in sorted(set(expected) | set(actual), key=str)
+        if not table.same(expected.get(key, 0), actual.get(key, 0))
+    ]
+
+def apply_derived_deltas(cursor, conn, table, values, sign):
+    """在当前事务中把一组记录加入（sign=1）或移出（sign=-1）派生表
+
+    values为 table.value_columns 顺序的序列，None和不参与该表的记录（如总时长为空）不计入。
+    """
+    deltas = table.deltas((value for value in values if value is not None), sign)
+    if not deltas:
+        return
+    execute_many(cursor, table.upsert_sql, [key + (value,) for key, value in deltas.items()], conn)
+    if sign < 0:
+        for user_eng_name in {key[0] for key in deltas}:
+            execute_query(cursor, table.cleanup_sql, (user_eng_name,), conn)
+
+def fetch_derived_values(cursor, conn, record_id):
+    """读取单条记录在各派生表中的字段，按DERIVED_TABLE_SPECS顺序（记录不存在时为None）"""
+    values = []
+    for table in DERIVED_TABLE_SPECS:
+        execute_query(cursor, table.value_sql, (record_id,), conn)
+        row = cursor.fetchone()
+        values.append(tuple(row[k] for k in table.value_columns) if row is not None else None)
+    return values
+
+def add_derived_records(cursor, conn, records):
+    """在当前事务中把请求中的一组新记录加入各派生表"""
+    for table in DERIVED_TABLE_SPECS:
+        apply_derived_deltas(cursor, conn, table, [table.record_values(record) for record in records], 1)
+
+def apply_derived_values(cursor, conn, old_values, new_values):
+    """按 fetch_derived_values 读取的修改前后字段更新各派生表（删除时new_values为None）"""
+    for i, table in enumerate(DERIVED_TABLE_SPECS):
+        new_value = new_values[i] if new_values is not None else None
+        if new_value != old_values[i]:
+            apply_derived_deltas(cursor, conn, table, [old_values[i]], -1)
+            apply_derived_deltas(cursor, conn, table, [new_value], 1)
+
+def fetch_summary_contribution(cursor, conn, record_id):
+    """读取单条记录对汇总表的贡献"""
+    execute_query(cursor, analytics.SUMMARY_SOURCE_RECORD_SQL, (record_id,), conn)
+    row = cursor.fetchone()
+    return dict(row) if row is not None else None
+
+def apply_summary_delta(cursor, conn, contribution, sign):
+    """在当前事务中把一组记录的贡献加到（sign=1）或减出（sign=-1）汇总表"""
+    key = [contribution[k] for k in analytics.SUMMARY_KEYS]
+    additive = [f for f in analytics.SUMMARY_VALUES if f not in ("duration_min", "duration_max")]
+    duration_min = contribution['duration_min']
+    duration_max = contribution['duration_max']
     
-    for field in fields:
-        if record.get(field):
-            if hasattr(record[field], 'strftime'):
-                if field == 'date':
-                    record[field] = record[field].strftime('%Y-%m-%d')
-                else:
-                    record[field] = record[field].strftime('%Y-%m-%d %H:%M:%S')
-            elif isinstance(record[field], str):
-                record[field] = record[field]
-        else:
-            record[field] = None
+    set_clauses = [f"{f} = {f} + %s" for f in additive]
+    params = [contribution[f] * sign for f in additive]
+    if sign > 0 and duration_min is not None:
+        set_clauses.append("duration_min = CASE WHEN duration_min IS NULL OR duration_min > %s THEN %s ELSE duration_min END")
+        set_clauses.append("duration_max = CASE WHEN duration_max IS NULL OR duration_max < %s THEN %s ELSE duration_max END")
+        params.extend([duration_min, duration_min, duration_max, duration_max])
+    update_sql = f"UPDATE commute_user_summary SET {', '.join(set_clauses)} WHERE {SUMMARY_KEY_WHERE}"
+    
+    execute_query(cursor, update_sql, params + key, conn)
+    if cursor.rowcount == 0:
+        if sign < 0:
+            return
+        columns = analytics.SUMMARY_KEYS + analytics.SUMMARY_VALUES
+        insert_sql = f"INSERT INTO commute_user_summary ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        try:
+            execute_query(cursor, insert_sql, key + [contribution[f] for f in analytics.SUMMARY_VALUES], conn)
+        except (pymysql.err.IntegrityError, sqlite3.IntegrityError):
+            # 并发写入已创建该分组，改为累加
+            execute_query(cursor, update_sql, params + key, conn)
+        return
     
-    return record
+    if sign < 0:
+        execute_query(cursor, f"SELECT record_count, duration_min, duration_max FROM commute_user_summary WHERE {SUMMARY_KEY_WHERE}", key, conn)
+        current = cursor.fetchone()
+        if current['record_count'] <= 0:
+            execute_query(cursor, f"DELETE FROM commute_user_summary WHERE {SUMMARY_KEY_WHERE}", key, conn)
+        elif duration_min is not None and (duration_min <= current['duration_min'] or duration_max >= current['duration_max']):
+            # 删除的是最小/最大值，按该分组的剩余记录重新计算
+            execute_query(cursor, """
+                SELECT MIN(total_duration) AS duration_min, MAX(total_duration) AS duration_max
+                FROM commute_records
+                WHERE user_eng_name = %s AND transport_type = %s AND commute_type = %s
+                    AND weekday = %s AND COALESCE(weather, '') = %s
+            """, key, conn)
+            bounds = cursor.fetchone()
+            execute_query(cursor, f"UPDATE commute_user_summary SET duration_min = %s, duration_max = %s WHERE {SUMMARY_KEY_WHERE}",
+                          [bounds['duration_min'], bounds['duration_max']] + key, conn)
 
-def format_datetime_results(records, fields=None):
-    """格式化多个记录的日期时间字段"""
-    if fields is None:
-        fields = ['date', 'start_time', 'on_vehicle_time', 'arrive_time', 'created_at', 'updated_at']
+def add_summary_contributions(cursor, conn, contributions):
+    """在当前事务中把多组记录的贡献加到汇总表（批量写入）
+
+    同一分组的贡献先在内存中合并；已有分组用一次executemany更新，
+    新分组逐个走 apply_summary_delta（处理并发创建）。
+    """
+    additive = [f for f in analytics.SUMMARY_VALUES if f not in ("duration_min", "duration_max")]
+    merged = {}
+    for row in contributions:
+        key = tuple(row[k] for k in analytics.SUMMARY_KEYS)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = dict(row)
+            continue
+        for f in additive:
+            current[f] += row[f]
+        if row['duration_min'] is not None:
+            if current['duration_min'] is None:
+                current['duration_min'], current['duration_max'] = row['duration_min'], row['duration_max']
+            else:
+                current['duration_min'] = min(current['duration_min'], row['duration_min'])
+                current['duration_max'] = max(current['duration_max'], row['duration_max'])
+    if not merged:
+        return
     
-    formatted_records = []
-    for record in records:
-        # 如果是sqlite3.Row对象，转换为字典
-        if isinstance(record, sqlite3.Row):
-            record = dict(record)
-        
-        # 格式化日期时间字段
-        formatted_record = format_datetime_result(record, fields)
-        formatted_records.append(formatted_record)
+    users = sorted({key[0] for key in merged})
+    existing = set()
+    for start in range(0, len(users), 500):
+        chunk = users[start:start + 500]
+        execute_query(cursor, f"""
+            SELECT {', '.join(analytics.SUMMARY_KEYS)} FROM commute_user_summary
+            WHERE user_eng_name IN ({', '.join(['%s'] * len(chunk))})
+        """, chunk, conn)
+        existing.update(tuple(row[k] for k in analytics.SUMMARY_KEYS) for row in cursor.fetchall())
     
-    return formatted_records
+    updates = [key for key in merged if key in existing]
+    if updates:
+        # 与 apply_summary_delta 的增量更新相同；duration_min为NULL时CASE保持原值
+        update_sql = f"""
+            UPDATE commute_user_summary SET {', '.join(f"{f} = {f} + %s" for f in additive)},
+                duration_min = CASE WHEN duration_min IS NULL OR duration_min > %s THEN %s ELSE duration_min END,
+                duration_max = CASE WHEN duration_max IS NULL OR duration_max < %s THEN %s ELSE duration_max END
+            WHERE {SUMMARY_KEY_WHERE}
+        """
+        seq_params = []
+        for key in updates:
+            row = merged[key]
+            seq_params.append([row[f] for f in additive]
+                              + [row['duration_min'], row['duration_min'], row['duration_max'], row['duration_max']]
+                              + list(key))
+        execute_many(cursor, update_sql, seq_params, conn)
+        if cursor.rowcount != len(updates):
+            # 分组在读取后被并发删除：按原始记录重建涉及的用户
+            rebuilt = {key[0] for key in updates}
+            for user_eng_name in sorted(rebuilt):
+                rebuild_user_summary(cursor, conn, user_eng_name)
+            existing.update(key for key in merged if key[0] in rebuilt)
+    for key in merged:
+        if key not in existing:
+            apply_summary_delta(cursor, conn, merged[key], 1)
+
+# 批量写入
+RECORD_COLUMNS = ("user_eng_name", "date", "weekday", "weather", "temperature", "transport_type",
+                  "commute_type", "start_time", "on_vehicle_time", "arrive_time", "total_duration",
+                  "rating", "notes")
+RECORD_VALUES_SQL = f"({', '.join(['%s'] * len(RECORD_COLUMNS))})"
+INSERT_RECORD_SQL = f"""
+    INSERT INTO commute_records ({', '.join(RECORD_COLUMNS)})
+    VALUES {RECORD_VALUES_SQL}
+"""
+# 按RECORD_COLUMNS顺序取出模型字段值
+record_values = operator.attrgetter(*RECORD_COLUMNS)
+_DATE_INDEX = RECORD_COLUMNS.index("date")
+_WEEKDAY_INDEX = RECORD_COLUMNS.index("weekday")
+_TIME_INDEXES = tuple(RECORD_COLUMNS.index(c) for c in ("start_time", "on_vehicle_time", "arrive_time"))
+# 每条INSERT语句的最大行数；MySQL按块合并为一条多行INSERT
+INSERT_CHUNK_SIZE = 500
+
+def encode_record_row(values):
+    """RECORD_COLUMNS顺序的一行转换为SQLite的存储格式：日期、时间为整数，星期几由日期计算"""
+    row = list(values)
+    days = sql_dialect.date_to_days(row[_DATE_INDEX])
+    row[_DATE_INDEX] = days
+    row[_WEEKDAY_INDEX] = sql_dialect.days_to_weekday(days)
+    for index in _TIME_INDEXES:
+        row[index] = sql_dialect.datetime_to_seconds(row[index])
+    return row
+
+def encode_mysql_record_row(values):
+    """RECORD_COLUMNS顺序的一行转换为MySQL的存储格式：星期几同样由日期计算，不使用客户端提交的值"""
+    row = list(values)
+    row[_WEEKDAY_INDEX] = sql_dialect.date_weekday_name(row[_DATE_INDEX])
+    return row
+
+def record_rows(conn, rows):
+    """按连接的方言转换待写入的行"""
+    if is_sqlite_connection(conn):
+        return [encode_record_row(row) for row in rows]
+    return [encode_mysql_record_row(row) for row in rows]
+
+def insert_chunks(cursor, conn, rows):
+    """把待写入的行分块，每块由一条INSERT语句写入
+
+    pymysql的executemany在语句超过max_stmt_length时拆成多条INSERT，拆分后LAST_INSERT_ID()
+    只对应最后一条；MySQL按转义后的字节数分块（与pymysql的拆分条件相同），保证每块只生成一条语句。
+    """
+    if is_sqlite_connection(conn):
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            yield rows[start:start + INSERT_CHUNK_SIZE]
+        return
+    encoding = conn.encoding
+    limit = cursor.max_stmt_length - len(INSERT_RECORD_SQL.encode(encoding))
+    chunk = []
+    size = 0
+    for row in rows:
+        # 每行加上分隔的逗号
+        length = len(cursor.mogrify(RECORD_VALUES_SQL, row).encode(encoding)) + 1
+        if chunk and (len(chunk) >= INSERT_CHUNK_SIZE or size + length > limit):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(row)
+        size += length
+    if chunk:
+        yield chunk
+
+def last_insert_ids(cursor, conn, count):
+    """取回刚由一条INSERT语句插入的一批记录的ID
+
+    SQLite写事务独占数据库，AUTOINCREMENT连续分配，last_insert_rowid()是最后一行；
+    MySQL的多行INSERT一次分配连续的自增值（auto_increment_increment=1），
+    LAST_INSERT_ID()是第一行。写入行数与预期不符时抛出异常（事务回滚）。
+    """
+    if cursor.rowcount != count:
+        raise RuntimeError(f"批量写入行数不符: 预期{count}条，实际{cursor.rowcount}条")
+    if is_sqlite_connection(conn):
+        cursor.execute("SELECT last_insert_rowid() AS id")
+        last = cursor.fetchone()['id']
+        return list(range(last - count + 1, last + 1))
+    cursor.execute("SELECT LAST_INSERT_ID() AS id")
+    first = cursor.fetchone()['id']
+    return list(range(first, first + count))
+
+def insert_records(cursor, conn, records):
+    """在当前事务中批量插入记录并更新汇总表，返回按顺序对应的ID"""
+    ids = []
+    # 本次写入的连续ID区间；相邻语句的ID首尾相接时合并为一个区间
+    ranges = []
+    for chunk in insert_chunks(cursor, conn, record_rows(conn, [record_values(record) for record in records])):
+        execute_many(cursor, INSERT_RECORD_SQL, chunk, conn)
+        chunk_ids = last_insert_ids(cursor, conn, len(chunk))
+        if ranges and ranges[-1][1] + 1 == chunk_ids[0]:
+            ranges[-1][1] = chunk_ids[-1]
+        else:
+            ranges.append([chunk_ids[0], chunk_ids[-1]])
+        ids.extend(chunk_ids)
+    # 先更新其他派生表：汇总表不一致时会按记录重建该用户（包括这些派生表）
+    add_derived_records(cursor, conn, records)
+    # 按分组读取这些记录的贡献，合并后更新汇总表
+    contributions = []
+    for first, last in ranges:
+        execute_query(cursor, analytics.SUMMARY_SOURCE_RANGE_SQL, (first, last), conn)
+        contributions.extend(cursor.fetchall())
+    add_summary_contributions(cursor, conn, contributions)
+    return ids
+
+# 幂等写入：客户端（离线队列）为每条记录生成client_id，(用户, client_id) 对应的记录ID
+# 保存在 commute_client_records 中；重试时已写入的记录返回原来的ID，不再重复写入。
+# 记录删除后对应关系仍保留，旧的重试不会让记录重新出现。
+CLIENT_RECORD_INSERT_SQL = """
+    INSERT INTO commute_client_records (user_eng_name, client_id, record_id)
+    VALUES (%s, %s, %s)
+"""
+# 每条查询的client_id个数上限
+CLIENT_ID_CHUNK_SIZE = 500
+# 写入对应关系前核对的列（原样存储，两种后端读回的值与提交的值相同）
+CLIENT_RECORD_VERIFY_COLUMNS = ("user_eng_name", "transport_type", "commute_type",
+                                "total_duration", "rating", "notes")
+
+def fetch_client_records(cursor, conn, keys):
+    """已写入的 (用户, client_id) -> 记录ID"""
+    client_ids = defaultdict(list)
+    for user_eng_name, client_id in keys:
+        client_ids[user_eng_name].append(client_id)
+    found = {}
+    for user_eng_name, values in client_ids.items():
+        for start in range(0, len(values), CLIENT_ID_CHUNK_SIZE):
+            chunk = values[start:start + CLIENT_ID_CHUNK_SIZE]
+            sql = f"""
+                SELECT client_id, record_id FROM commute_client_records
+                WHERE user_eng_name = %s AND client_id IN ({', '.join(['%s'] * len(chunk))})
+            """
+            execute_query(cursor, sql, [user_eng_name] + chunk, conn)
+            found.update({(user_eng_name, row['client_id']): row['record_id'] for row in cursor.fetchall()})
+    return found
+
+def verify_inserted_records(cursor, conn, pairs):
+    """核对 (记录ID, 记录) 中的ID确实是刚写入的这条记录，不一致时抛出异常（事务回滚）
+
+    client_id的对应关系一旦写错，之后的重试会被当作重复提交而丢失记录。
+    """
+    for start in range(0, len(pairs), CLIENT_ID_CHUNK_SIZE):
+        chunk = pairs[start:start + CLIENT_ID_CHUNK_SIZE]
+        sql = f"""
+            SELECT id, {', '.join(CLIENT_RECORD_VERIFY_COLUMNS)} FROM commute_records
+            WHERE id IN ({', '.join(['%s'] * len(chunk))})
+        """
+        execute_query(cursor, sql, [record_id for record_id, _ in chunk], conn)
+        stored = {row['id']: tuple(row[column] for column in CLIENT_RECORD_VERIFY_COLUMNS)
+                  for row in cursor.fetchall()}
+        for record_id, record in chunk:
+            if stored.get(record_id) != tuple(getattr(record, column) for column in CLIENT_RECORD_VERIFY_COLUMNS):
+                raise RuntimeError(f"写入的记录与ID不对应: {record_id}")
+
+def insert_new_records(cursor, conn, records):
+    """在当前事务中写入记录，跳过client_id已写入过的记录
+
+    返回按顺序对应的 (记录ID, 是否为重复提交)；同一批中重复的client_id只写入第一条。
+    """
+    existing = fetch_client_records(
+        cursor, conn, {(record.user_eng_name, record.client_id) for record in records if record.client_id}
+    )
+    new_records = []
+    # 每条记录对应新写入记录的位置，或已有的记录ID
+    slots = []
+    claimed = {}
+    for record in records:
+        key = (record.user_eng_name, record.client_id)
+        if record.client_id and key in existing:
+            slots.append((None, existing[key]))
+        elif record.client_id and key in claimed:
+            slots.append((claimed[key], None))
+        else:
+            if record.client_id:
+                claimed[key] = len(new_records)
+            slots.append((len(new_records), None))
+            new_records.append(record)
+    ids = insert_records(cursor, conn, new_records) if new_records else []
+    if claimed:
+        verify_inserted_records(cursor, conn, [(ids[position], new_records[position])
+                                               for position in claimed.values()])
+        # 并发提交同一client_id时主键冲突，整个事务回滚
+        execute_many(cursor, CLIENT_RECORD_INSERT_SQL,
+                     [(user_eng_name, client_id, ids[position])
+                      for (user_eng_name, client_id), position in claimed.items()], conn)
+    outcomes = []
+    written = set()
+    for position, record_id in slots:
+        if position is None:
+            outcomes.append((record_id, True))
+        else:
+            outcomes.append((ids[position], position in written))
+            written.add(position)
+    return outcomes
+
+def ingest_records(records):
+    """在一个事务中幂等写入一批记录，返回按顺序对应的 (记录ID, 是否为重复提交)
+
+    并发提交同一client_id时，后提交的事务写入对应关系时主键冲突而回滚，
+    重试一次即可读到先提交的记录。
+    """
+    for attempt in range(2):
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                outcomes = insert_new_records(cursor, conn, records)
+                cursor.close()
+            break
+        except (sqlite3.IntegrityError, pymysql.err.IntegrityError):
+            if attempt:
+                raise
+    # 事务提交后使写入了新记录的用户的缓存结果失效
+    for user_eng_name in {record.user_eng_name for record, (_, duplicate) in zip(records, outcomes) if not duplicate}:
+        response_cache.bump(user_eng_name)
+    return outcomes
+
+def record_cursor(conn):
+    """读取记录用的游标：行为元组，由 record_format 按列描述直接格式化"""
+    if is_sqlite_connection(conn):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor
+    return conn.cursor(pymysql.cursors.Cursor)
 
 # Pydantic模型
+def check_date_value(value):
+    """校验日期字符串（YYYY-MM-DD），值本身原样保留"""
+    try:
+        sql_dialect.parse_date(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的日期: {value}")
+    return value
+
+def check_datetime_value(value):
+    """校验日期时间字符串（YYYY-MM-DD HH:MM[:SS]或ISO格式），值本身原样保留"""
+    if value is None:
+        return value
+    try:
+        sql_dialect.parse_datetime(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的日期时间: {value}")
+    return value
+
 class CommuteRecordCreate(BaseModel):
     user_eng_name: str
     date: str
-    weekday: str
+    # 星期几由服务端按date计算，提交的值不使用（保留字段兼容旧客户端）
+    weekday: Optional[str] = None
     weather: Optional[str] = None
     temperature: Optional[str] = None
     transport_type: str  # subway or car
@@ -231,6 +1010,11 @@ class CommuteRecordCreate(BaseModel):
     total_duration: Optional[int] = None
     rating: Optional[int] = None
     notes: Optional[str] = None
+    # 客户端生成的记录标识（如UUID），同一用户重复提交时不重复写入
+    client_id: Optional[str] = Field(None, min_length=1, max_length=64)
+
+    _check_date = field_validator("date")(check_date_value)
+    _check_times = field_validator("start_time", "on_vehicle_time", "arrive_time")(check_datetime_value)
 
 class CommuteRecordUpdate(BaseModel):
     weather: Optional[str] = None
@@ -244,6 +1028,15 @@ class CommuteRecordUpdate(BaseModel):
     rating: Optional[int] = None
     notes: Optional[str] = None
 
+    _check_times = field_validator("start_time", "on_vehicle_time", "arrive_time")(check_datetime_value)
+
+# 单次批量写入的记录数上限
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", 5000))
+
+class CommuteRecordBatch(BaseModel):
+    # 逐条校验，单条无效不影响其余记录
+    records: List[Dict[str, Any]] = Field(..., max_length=BATCH_MAX_RECORDS)
+
 class WeatherResponse(BaseModel):
     weather: str
     temperature: str
@@ -257,157 +1050,453 @@ def read_root():
     return RedirectResponse(url="/static/index.html")
 
 @app.post("/api/records")
+@db_executor.offload
 def create_record(record: CommuteRecordCreate):
-    """创建通勤记录"""
+    """创建通勤记录（带client_id时幂等）"""
     try:
+        if record.client_id is not None:
+            (record_id, duplicate), = ingest_records([record])
+            return {"success": True, "id": record_id, "duplicate": duplicate,
+                    "message": "记录已存在" if duplicate else "记录创建成功"}
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            sql = """
-                INSERT INTO commute_records 
-                (user_eng_name, date, weekday, weather, temperature, transport_type, 
-                 commute_type, start_time, on_vehicle_time, arrive_time, total_duration, rating, notes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            params = (
-                record.user_eng_name, record.date, record.weekday, record.weather,
-                record.temperature, record.transport_type, record.commute_type,
-                record.start_time, record.on_vehicle_time, record.arrive_time,
-                record.total_duration, record.rating, record.notes
-            )
+            params = record_rows(conn, [record_values(record)])[0]
             
             # 执行查询
-            execute_query(cursor, sql, params, conn)
+            execute_query(cursor, INSERT_RECORD_SQL, params, conn)
             record_id = cursor.lastrowid
+            
+            # 同一事务中更新统计汇总表及其他派生表
+            apply_summary_delta(cursor, conn, fetch_summary_contribution(cursor, conn, record_id), 1)
+            add_derived_records(cursor, conn, [record])
             cursor.close()
-            return {"success": True, "id": record_id, "message": "记录创建成功"}
+        # 事务提交后使该用户的缓存结果失效
+        response_cache.bump(record.user_eng_name)
+        return {"success": True, "id": record_id, "message": "记录创建成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
 
-@app.get("/api/records")
+@app.post("/api/records/batch")
+@db_executor.offload
+def create_records_batch(batch: CommuteRecordBatch):
+    """批量创建通勤记录：逐条校验，有效记录在一个事务中写入，返回每条的结果
+
+    带client_id的记录幂等：已写入过的返回原来的ID（duplicate为true），离线队列可放心重试。
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(batch.records):
+        try:
+            valid.append((index, CommuteRecordCreate.model_validate(item)))
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "success": False,
+                "errors": [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()]
+            })
+    
+    try:
+        outcomes = ingest_records([record for _, record in valid]) if valid else []
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
+    
+    results.extend({"index": index, "success": True, "id": record_id, "duplicate": duplicate}
+                   for (index, _), (record_id, duplicate) in zip(valid, outcomes))
+    results.sort(key=lambda item: item["index"])
+    duplicates = sum(duplicate for _, duplicate in outcomes)
+    return {
+        "success": len(outcomes) == len(batch.records),
+        "inserted": len(outcomes) - duplicates,
+        "duplicates": duplicates,
+        "failed": len(batch.records) - len(outcomes),
+        "results": results
+    }
+
+def write_import_chunk(records):
+    """在一个事务中写入一块导入的记录，返回新写入的条数（client_id已写入过的记录跳过）"""
+    return sum(not duplicate for _, duplicate in ingest_records(records))
+
+def log_import_progress(progress):
+    tracing.logger.info("导入进度: 已处理 %d 行，写入 %d 条，失败 %d 条（%.0f 行/秒）",
+                        progress["rows"], progress["inserted"], progress["failed"],
+                        progress["rows_per_second"])
+
+@app.post("/api/records/import")
+async def import_records(request: Request, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    """从请求体流式导入CSV/NDJSON记录：逐块校验，每块一个事务写入"""
+    importer = RecordImporter(format, CommuteRecordCreate, write_import_chunk,
+                              on_progress=log_import_progress)
+    try:
+        async for data in request.stream():
+            for chunk in importer.split(data):
+                await db_executor.run(importer.process_chunk, chunk)
+        for chunk in importer.split(b"", final=True):
+            await db_executor.run(importer.process_chunk, chunk)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=f"文件不是UTF-8编码（已导入 {importer.inserted} 条）")
+    except HTTPException:
+        raise
+    except Exception as e:
+        # 之前的块已经提交，告知已导入的条数以便续传
+        raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}（已导入 {importer.inserted} 条）")
+    result = importer.result()
+    return {"success": result["failed"] == 0, **result}
+
+def encode_date_param(conn, value):
+    """日期查询参数：SQLite中日期按天数存储，参数同样转换"""
+    if not is_sqlite_connection(conn):
+        return value
+    try:
+        return sql_dialect.date_to_days(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"无效的日期: {value}")
+
+def encode_time_param(conn, value):
+    """时间参数：SQLite中时间按秒数存储"""
+    if not is_sqlite_connection(conn):
+        return value
+    return sql_dialect.datetime_to_seconds(value)
+
+def build_records_filter(conn, user_eng_name, transport_type=None, commute_type=None,
+                         start_date=None, end_date=None):
+    """构建记录筛选条件，返回(条件列表, 参数列表)；user_eng_name为None时不按用户筛选"""
+    where_clauses = []
+    params = []
+    
+    if user_eng_name is not None:
+        where_clauses.append("user_eng_name = %s")
+        params.append(user_eng_name)
+    
+    if transport_type:
+        where_clauses.append("transport_type = %s")
+        params.append(transport_type)
+    
+    if commute_type:
+        where_clauses.append("commute_type = %s")
+        params.append(commute_type)
+    
+    if start_date:
+        where_clauses.append("date >= %s")
+        params.append(encode_date_param(conn, start_date))
+    
+    if end_date:
+        where_clauses.append("date <= %s")
+        params.append(encode_date_param(conn, end_date))
+    
+    return where_clauses, params
+
+def encode_records_cursor(record, direction):
+    """根据记录的(date, start_time, id)生成不透明的分页游标"""
+    payload = json.dumps([record['date'], record['start_time'], record['id'], direction], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_records_cursor(cursor):
+    """解析分页游标，返回(date, start_time, id, direction)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        record_date, start_time, record_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev') or not isinstance(record_id, int):
+            raise ValueError(direction)
+        return record_date, start_time, record_id, direction
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def records_keyset_condition(conn, record_date, start_time, record_id, direction):
+    """游标位置之后（next，更早）或之前（prev，更新）的记录条件
+
+    排序为 date, start_time, id；start_time可能为空（旧数据迁移时无法解析的时间），
+    两种数据库都把空值视为最小（升序排在最前、降序排在最后），条件中同样按最小值处理。
+    单独的 date <= %s（或 >=）使查询从索引中游标的位置开始扫描。
+    """
+    op = '<' if direction == 'next' else '>'
+    try:
+        record_date = encode_date_param(conn, record_date)
+        start_time = encode_time_param(conn, start_time) if start_time is not None else None
+    except (HTTPException, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    if start_time is None:
+        # 游标所在的记录没有出门时间：同一天中更早的只有id更小的空值，更新的包括全部非空值
+        same_day = "start_time IS NULL AND id < %s" if direction == 'next' else "(start_time IS NOT NULL OR id > %s)"
+        sql = f"date {op}= %s AND (date {op} %s OR (date = %s AND {same_day}))"
+        return sql, [record_date, record_date, record_date, record_id]
+    # 向更早翻页时，同一天中没有出门时间的记录都在游标之后
+    null_branch = " OR start_time IS NULL" if direction == 'next' else ""
+    sql = (f"date {op}= %s AND (date {op} %s OR (date = %s AND (start_time {op} %s{null_branch} "
+           f"OR (start_time = %s AND id {op} %s))))")
+    return sql, [record_date, record_date, record_date, start_time, start_time, record_id]
+
+@app.get("/api/records", response_class=record_format.FastJSONResponse)
+@db_executor.offload
 def get_records(
     user_eng_name: str = Query(..., description="用户英文名"),
-    page: int = Query(1, ge=1),
+    page: int = Query(1, ge=1, description="页码（兼容旧客户端，建议使用cursor）"),
     page_size: int = Query(20, ge=1, le=100),
     transport_type: Optional[str] = None,
     commute_type: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一次返回的next_cursor或prev_cursor"),
+    include_total: bool = Query(False, description="是否返回符合条件的总数")
 ):
-    """获取通勤记录列表"""
+    """获取通勤记录列表（按日期、出门时间倒序，基于游标分页）"""
+    keyset = decode_records_cursor(cursor) if cursor else None
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
+            db_cursor = conn.cursor()
             
-            # 直接使用简单查询，避免动态SQL构建的问题
-            if is_sqlite_connection(conn):
-                # SQLite版本
-                sql = "SELECT * FROM commute_records WHERE user_eng_name = ? ORDER BY date DESC, start_time DESC LIMIT ? OFFSET ?"
-                count_sql = "SELECT COUNT(*) as total FROM commute_records WHERE user_eng_name = ?"
-                params = [user_eng_name]
-                count_params = [user_eng_name]
-                offset = (page - 1) * page_size
-                limit_offset_params = [page_size, offset]
-                
-                # 查询总数
-                cursor.execute(count_sql, count_params)
-                result = cursor.fetchone()
+            # 构建查询条件（MySQL与SQLite共用）
+            where_clauses, params = build_records_filter(
+                conn, user_eng_name, transport_type, commute_type, start_date, end_date
+            )
+            
+            # 查询总数（仅在需要时）
+            total = None
+            if include_total:
+                count_sql = f"SELECT COUNT(*) as total FROM commute_records WHERE {' AND '.join(where_clauses)}"
+                execute_query(db_cursor, count_sql, params, conn)
+                result = db_cursor.fetchone()
                 total = result['total'] if result else 0
-                
-                # 查询数据
-                cursor.execute(sql, params + limit_offset_params)
-                records = cursor.fetchall()
-                
-                # 格式化日期时间
-                records = format_datetime_results(records)
-                
-                cursor.close()
-                return {
-                    "success": True,
-                    "data": records,
-                    "total": total,
-                    "page": page,
-                    "page_size": page_size
-                }
-            else:
-                # MySQL版本
-                # 构建查询条件
-                where_clauses = ["user_eng_name = %s"]
-                params = [user_eng_name]
-                
-                if transport_type:
-                    where_clauses.append("transport_type = %s")
-                    params.append(transport_type)
-                
-                if commute_type:
-                    where_clauses.append("commute_type = %s")
-                    params.append(commute_type)
-                
-                if start_date:
-                    where_clauses.append("date >= %s")
-                    params.append(start_date)
-                
-                if end_date:
-                    where_clauses.append("date <= %s")
-                    params.append(end_date)
-                
-                where_sql = " AND ".join(where_clauses)
-                
-                # 查询总数
-                count_sql = f"SELECT COUNT(*) as total FROM commute_records WHERE {where_sql}"
-                cursor.execute(count_sql, params)
-                result = cursor.fetchone()
-                total = result.get('total', 0) if result else 0
-                
-                # 查询数据
-                offset = (page - 1) * page_size
-                sql = f"""
-                    SELECT * FROM commute_records 
-                    WHERE {where_sql}
-                    ORDER BY date DESC, start_time DESC
-                    LIMIT %s OFFSET %s
-                """
-                
-                cursor.execute(sql, params + [page_size, offset])
-                records = cursor.fetchall()
-                
-                # 格式化日期时间
-                records = format_datetime_results(records)
-                
-                cursor.close()
-                return {
-                    "success": True,
-                    "data": records,
-                    "total": total,
-                    "page": page,
-                    "page_size": page_size
-                }
+            
+            # 游标定位，多取一条判断是否还有下一页
+            direction = keyset[3] if keyset else 'next'
+            offset_sql = ""
+            page_params = list(params)
+            if keyset:
+                keyset_sql, keyset_params = records_keyset_condition(conn, *keyset)
+                where_clauses.append(keyset_sql)
+                page_params.extend(keyset_params)
+            elif page > 1:
+                # 旧客户端仍按页码访问
+                offset_sql = " OFFSET %s"
+            # 空的start_time在MySQL和SQLite中都视为最小值（降序排在同一天的最后），与游标条件一致
+            order = "DESC" if direction == 'next' else "ASC"
+            sql = f"""
+                SELECT * FROM commute_records 
+                WHERE {' AND '.join(where_clauses)}
+                ORDER BY date {order}, start_time {order}, id {order}
+                LIMIT %s{offset_sql}
+            """
+            page_params.append(page_size + 1)
+            if offset_sql:
+                page_params.append((page - 1) * page_size)
+            
+            db_cursor.close()
+            db_cursor = record_cursor(conn)
+            execute_query(db_cursor, sql, page_params, conn)
+            rows = db_cursor.fetchall()
+            
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            if direction == 'prev':
+                rows.reverse()
+            
+            # 由元组直接生成接口格式的字典
+            records = record_format.format_rows(db_cursor, rows)
+            db_cursor.close()
+            
+            next_cursor = None
+            prev_cursor = None
+            if records:
+                if direction == 'next':
+                    if has_more:
+                        next_cursor = encode_records_cursor(records[-1], 'next')
+                    if keyset:
+                        prev_cursor = encode_records_cursor(records[0], 'prev')
+                else:
+                    next_cursor = encode_records_cursor(records[-1], 'next')
+                    if has_more:
+                        prev_cursor = encode_records_cursor(records[0], 'prev')
+            
+            response = {
+                "success": True,
+                "data": records,
+                "page": page,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "has_more": next_cursor is not None
+            }
+            if include_total:
+                response["total"] = total
+            # 内容只含JSON基本类型，直接用orjson序列化，不经过jsonable_encoder
+            return record_format.FastJSONResponse(response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
+
+# 导出
+EXPORT_COLUMNS = ("id",) + RECORD_COLUMNS + ("created_at", "updated_at")
+# 每页读取的行数
+EXPORT_FETCH_SIZE = 1000
+# 导出全部用户记录所需的管理员令牌（未设置时不允许全量导出）
+EXPORT_ADMIN_TOKEN = os.getenv("EXPORT_ADMIN_TOKEN", "")
+_EXPORT_ID_INDEX = EXPORT_COLUMNS.index("id")
+_EXPORT_DATE_INDEX = EXPORT_COLUMNS.index("date")
+_EXPORT_START_INDEX = EXPORT_COLUMNS.index("start_time")
+
+def export_keyset_condition(by_user, last_row):
+    """上一页最后一行之后的记录条件（值为数据库中的原始值，不需要转换）
+
+    按用户导出时按 date, start_time, id 排序；start_time可能为空，两种数据库都把空值排在最前。
+    单独的 date >= %s 使查询从索引中上一页的位置开始扫描，而不是每页从头扫描。
+    """
+    record_id = last_row[_EXPORT_ID_INDEX]
+    if not by_user:
+        return "id > %s", [record_id]
+    record_date = last_row[_EXPORT_DATE_INDEX]
+    start_time = last_row[_EXPORT_START_INDEX]
+    if start_time is None:
+        sql = "date >= %s AND (date > %s OR start_time IS NOT NULL OR id > %s)"
+        return sql, [record_date, record_date, record_id]
+    sql = "date >= %s AND (date > %s OR start_time > %s OR (start_time = %s AND id > %s))"
+    return sql, [record_date, record_date, start_time, start_time, record_id]
+
+def read_export_page(filters, by_user, last_row, dialect):
+    """在一个短事务中按键集读取一页，返回 (格式化后的记录, 最后一行原始值, 方言)
+
+    每页单独取出和归还连接，下载慢的客户端不会长时间占用连接或持有读锁。
+    """
+    with get_db_connection() as conn:
+        if dialect is not None and get_dialect(conn) != dialect:
+            raise RuntimeError("导出过程中数据库后端发生切换，请重新导出")
+        where_clauses, params = build_records_filter(conn, *filters)
+        if last_row is not None:
+            condition, condition_params = export_keyset_condition(by_user, last_row)
+            where_clauses.append(condition)
+            params.extend(condition_params)
+        sql = f"""
+            SELECT {', '.join(EXPORT_COLUMNS)} FROM commute_records
+            WHERE {' AND '.join(where_clauses) or '1 = 1'}
+            ORDER BY {'date, start_time, id' if by_user else 'id'}
+            LIMIT {EXPORT_FETCH_SIZE}
+        """
+        db_cursor = record_cursor(conn)
+        execute_query(db_cursor, sql, params, conn)
+        rows = db_cursor.fetchall()
+        records = record_format.format_rows(db_cursor, rows)
+        db_cursor.close()
+        return records, (rows[-1] if rows else None), get_dialect(conn)
+
+def export_records_chunks(filters, export_format):
+    """逐页读取记录并编码为CSV/NDJSON字节块
+
+    filters为 build_records_filter 的筛选参数，参数按实际连接的方言转换。
+    各页在不同事务中读取，导出期间的写入可能部分出现在结果中。
+    """
+    by_user = filters[0] is not None
+    # 先读取第一页，查询出错时还没有输出任何内容
+    records, last_row, dialect = read_export_page(filters, by_user, None, None)
+    if export_format == "csv":
+        # 带BOM，便于Excel识别UTF-8
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    
+    while records:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # 字典按EXPORT_COLUMNS的顺序生成
+            writer.writerows(record.values() for record in records)
+            yield buffer.getvalue().encode("utf-8")
+        else:
+            yield record_format.dumps_lines(records)
+        if len(records) < EXPORT_FETCH_SIZE:
+            break
+        records, last_row, dialect = read_export_page(filters, by_user, last_row, dialect)
+
+class ChunkStream:
+    """在数据库线程池中逐块推进同步生成器
+
+    生成器只能在一个线程中推进；响应中断时可能还有一次读取在执行，
+    因此关闭操作同样交给线程池，并与读取互斥。
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            return next(self._chunks, None)
+
+    def _close(self):
+        with self._lock:
+            self._chunks.close()
+
+    async def next(self):
+        return await db_executor.run(self._next)
+
+    async def iterate(self, first):
+        try:
+            chunk = first
+            while chunk is not None:
+                yield chunk
+                chunk = await self.next()
+        finally:
+            # 关闭生成器（与可能仍在执行的读取互斥）
+            db_executor.submit(self._close)
+
+@app.get("/api/records/export")
+async def export_records(
+    request: Request,
+    user_eng_name: Optional[str] = Query(None, description="用户英文名；不传时导出全部用户（需要管理员令牌）"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    transport_type: Optional[str] = None,
+    commute_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """流式导出通勤记录（CSV或NDJSON），内存占用与记录数无关"""
+    if user_eng_name is None:
+        token = request.headers.get("x-admin-token", "")
+        if not EXPORT_ADMIN_TOKEN or not hmac.compare_digest(token, EXPORT_ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="导出全部记录需要管理员令牌")
+    
+    filters = (user_eng_name, transport_type, commute_type, start_date, end_date)
+    stream = ChunkStream(export_records_chunks(filters, format))
+    # 先取第一块，连接或查询出错时仍能返回正常的错误响应
+    try:
+        first = await stream.next()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream.iterate(first),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="commute_records.{format}"'}
+    )
 
-@app.get("/api/records/{record_id}")
+@app.get("/api/records/{record_id}", response_class=record_format.FastJSONResponse)
+@db_executor.offload
 def get_record(record_id: int, user_eng_name: str = Query(...)):
     """获取单条记录详情"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             sql = "SELECT * FROM commute_records WHERE id = %s AND user_eng_name = %s"
             execute_query(cursor, sql, (record_id, user_eng_name), conn)
-            record = cursor.fetchone()
+            rows = cursor.fetchall()
+            records = record_format.format_rows(cursor, rows)
             cursor.close()
             
-            if not record:
+            if not records:
                 raise HTTPException(status_code=404, detail="记录不存在")
             
-            # 格式化日期时间
-            record = format_datetime_result(record)
-            
-            return {"success": True, "data": record}
+            return record_format.FastJSONResponse({"success": True, "data": records[0]})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
 
 @app.put("/api/records/{record_id}")
+@db_executor.offload
 def update_record(record_id: int, record: CommuteRecordUpdate, user_eng_name: str = Query(...)):
     """更新通勤记录"""
     try:
@@ -432,13 +1521,13 @@ def update_record(record_id: int, record: CommuteRecordUpdate, user_eng_name: st
                 params.append(record.commute_type)
             if record.start_time is not None:
                 update_fields.append("start_time = %s")
-                params.append(record.start_time)
+                params.append(encode_time_param(conn, record.start_time))
             if record.on_vehicle_time is not None:
                 update_fields.append("on_vehicle_time = %s")
-                params.append(record.on_vehicle_time)
+                params.append(encode_time_param(conn, record.on_vehicle_time))
             if record.arrive_time is not None:
                 update_fields.append("arrive_time = %s")
-                params.append(record.arrive_time)
+                params.append(encode_time_param(conn, record.arrive_time))
             if record.total_duration is not None:
                 update_fields.append("total_duration = %s")
                 params.append(record.total_duration)
@@ -452,402 +1541,368 @@ def update_record(record_id: int, record: CommuteRecordUpdate, user_eng_name: st
             if not update_fields:
                 return {"success": True, "message": "没有需要更新的字段"}
             
+            # 先取出旧记录对汇总表的贡献
+            execute_query(cursor, "SELECT id FROM commute_records WHERE id = %s AND user_eng_name = %s",
+                          (record_id, user_eng_name), conn)
+            if cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail="记录不存在或无权限修改")
+            old_contribution = fetch_summary_contribution(cursor, conn, record_id)
+            old_values = fetch_derived_values(cursor, conn, record_id)
+            
             sql = f"UPDATE commute_records SET {', '.join(update_fields)} WHERE id = %s AND user_eng_name = %s"
             params.extend([record_id, user_eng_name])
             
             execute_query(cursor, sql, params, conn)
             affected_rows = cursor.rowcount
-            cursor.close()
             
             if affected_rows == 0:
                 raise HTTPException(status_code=404, detail="记录不存在或无权限修改")
             
-            return {"success": True, "message": "记录更新成功"}
+            apply_summary_delta(cursor, conn, old_contribution, -1)
+            apply_summary_delta(cursor, conn, fetch_summary_contribution(cursor, conn, record_id), 1)
+            apply_derived_values(cursor, conn, old_values, fetch_derived_values(cursor, conn, record_id))
+            cursor.close()
+        response_cache.bump(user_eng_name)
+        return {"success": True, "message": "记录更新成功"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
 
 @app.delete("/api/records/{record_id}")
+@db_executor.offload
 def delete_record(record_id: int, user_eng_name: str = Query(...)):
     """删除通勤记录"""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            execute_query(cursor, "SELECT id FROM commute_records WHERE id = %s AND user_eng_name = %s",
+                          (record_id, user_eng_name), conn)
+            if cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail="记录不存在或无权限删除")
+            contribution = fetch_summary_contribution(cursor, conn, record_id)
+            old_values = fetch_derived_values(cursor, conn, record_id)
+            
             sql = "DELETE FROM commute_records WHERE id = %s AND user_eng_name = %s"
             execute_query(cursor, sql, (record_id, user_eng_name), conn)
             affected_rows = cursor.rowcount
-            cursor.close()
             
             if affected_rows == 0:
                 raise HTTPException(status_code=404, detail="记录不存在或无权限删除")
             
-            return {"success": True, "message": "记录删除成功"}
+            apply_summary_delta(cursor, conn, contribution, -1)
+            apply_derived_values(cursor, conn, old_values, None)
+            cursor.close()
+        response_cache.bump(user_eng_name)
+        return {"success": True, "message": "记录删除成功"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"数据库错误: {str(e)}")
 
 @app.get("/api/weather")
-def get_weather():
-    """获取深圳当前天气信息（使用腾讯地图API）"""
+async def get_weather(location: Optional[str] = None):
+    """获取当前天气信息（默认深圳，按地点缓存，后台定期刷新）"""
     try:
-        # 使用腾讯地图天气API获取深圳实时天气
-        # 深圳的行政区划代码：440300
-        url = "https://apis.map.qq.com/ws/weather/v1/"
-        params = {
-            "location": "深圳",
-            "key": "OQBBZ-VHECX-LLI4P-B7PEO-QFHH7-YVFBV",  # 腾讯地图API Key
-            "output": "json"
-        }
-        
-        # 尝试调用天气API
-        try:
-            response = requests.get(url, params=params, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == 0:
-                    weather_data = data.get("data", {})
-                    observe = weather_data.get("observe", {})
-                    
-                    weather_text = observe.get("weather", "晴")
-                    temp = observe.get("temp", "25")
-                    
-                    return {
-                        "success": True,
-                        "weather": weather_text,
-                        "temperature": f"{temp}°C"
-                    }
-        except Exception as api_error:
-            print(f"天气API调用失败: {str(api_error)}")
-        
-        # 如果API调用失败，使用备用方案（模拟深圳常见天气）
-        weather_options = ["晴", "多云", "阴", "小雨"]
-        import random
-        weather = random.choice(weather_options)
-        temperature = f"{random.randint(18, 32)}°C"  # 深圳常见温度范围
-        
-        return {
-            "success": True,
-            "weather": weather,
-            "temperature": temperature
-        }
+        reading = await weather_service.get(location)
+        return {"success": True, **reading}
     except Exception as e:
         return {
             "success": False,
-            "weather": "晴",
-            "temperature": "25°C",
-            "message": str(e)
+            "message": f"天气获取失败: {str(e)}"
         }
 
+def cached_user_response(kind, request, user_eng_name, compute):
+    """按用户写入版本缓存接口结果；If-None-Match匹配时直接返回304，不访问数据库"""
+    if response_cache.max_size <= 0:
+        return compute(user_eng_name)
+    version = response_cache.version(user_eng_name)
+    etag = response_cache.etag(kind, user_eng_name, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if response_cache.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    body = response_cache.get(kind, user_eng_name, version)
+    if body is None:
+        body = json.dumps(jsonable_encoder(compute(user_eng_name)), ensure_ascii=False).encode("utf-8")
+        response_cache.put(kind, user_eng_name, version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def load_analytics_snapshot(user_eng_name):
+    """读取用户的分析快照（按写入版本缓存，统计和建议共用）"""
+    version = response_cache.version(user_eng_name)
+    snapshot = response_cache.get("snapshot", user_eng_name, version)
+    if snapshot is not None:
+        return snapshot
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        snapshot = analytics.AnalyticsSnapshot()
+        execute_query(cursor, analytics.SUMMARY_READ_SQL, (user_eng_name,), conn)
+        snapshot.add_rows(cursor.fetchall())
+        execute_query(cursor, analytics.TREND_SQL, (user_eng_name,), conn)
+        snapshot.add_trend_rows(cursor.fetchall())
+        execute_query(cursor, analytics.SKETCH_READ_SQL, (user_eng_name,), conn)
+        snapshot.add_sketch_rows(cursor.fetchall())
+        cursor.close()
+    response_cache.put("snapshot", user_eng_name, version, snapshot)
+    return snapshot
+
+def load_trend_statistics(user_eng_name):
+    """读取滑动平均窗口内的记录和趋势回归统计量（读取量与记录总数无关）"""
+    today = date.today()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        execute_query(cursor, trends.ROLLING_SQL,
+                      (user_eng_name, encode_date_param(conn, trends.rolling_origin(today))), conn)
+        rolling = trends.rolling_trend(cursor.fetchall(), today=today)
+        execute_query(cursor, trends.STATS_READ_SQL, (user_eng_name,), conn)
+        stats = trends.TrendStats(cursor.fetchall())
+        for transport_type in stats.transports:
+            bounds = []
+            for order in ("ASC", "DESC"):
+                execute_query(cursor, trends.DATE_BOUND_SQL.format(order=order), (user_eng_name, transport_type), conn)
+                row = cursor.fetchone()
+                bounds.append(row['date'] if row is not None else None)
+            if None not in bounds:
+                stats.set_date_bounds(transport_type, *bounds)
+        cursor.close()
+    return {"rolling_trend": rolling, "regression": stats.regression()}
+
+def load_prediction_model(user_eng_name):
+    """读取用户的预测模型统计量并求解（按写入版本缓存）"""
+    version = response_cache.version(user_eng_name)
+    model = response_cache.get("model", user_eng_name, version)
+    if model is not None:
+        return model
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        execute_query(cursor, prediction.STATS_READ_SQL, (user_eng_name,), conn)
+        model = prediction.DurationModel(cursor.fetchall())
+        cursor.close()
+    response_cache.put("model", user_eng_name, version, model)
+    return model
+
+def load_departure_histogram(user_eng_name):
+    """读取用户的出发时段直方图（按写入版本缓存）"""
+    version = response_cache.version(user_eng_name)
+    histogram = response_cache.get("departure", user_eng_name, version)
+    if histogram is not None:
+        return histogram
+    
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        execute_query(cursor, departure.HISTOGRAM_READ_SQL, (user_eng_name,), conn)
+        histogram = departure.DepartureHistogram(cursor.fetchall())
+        cursor.close()
+    response_cache.put("departure", user_eng_name, version, histogram)
+    return histogram
+
+@app.get("/api/suggestions/departure")
+async def suggest_departure(
+    user_eng_name: str = Query(...),
+    commute_type: Optional[str] = Query(None, pattern="^(to_work|from_work)$"),
+    transport_type: Optional[str] = Query(None, pattern="^(subway|car)$"),
+    objective: str = Query("p90", pattern="^(expected|p90)$"),
+    earliest: Optional[str] = None,
+    arrive_by: Optional[str] = None,
+):
+    """按15分钟出发时段的时长直方图推荐出发时间（规则见departure.py）
+
+    通勤类型默认按当前时间判断（12点前为上班），不指定出行方式时在各出行方式间比较；
+    earliest/arrive_by 为 HH:MM。
+    """
+    try:
+        earliest_minutes = departure.parse_minutes(earliest) if earliest else None
+        arrive_by_minutes = departure.parse_minutes(arrive_by) if arrive_by else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="时间格式错误，应为 HH:MM")
+    commute_type = commute_type or ("to_work" if datetime.now().hour < 12 else "from_work")
+    
+    histogram = response_cache.get("departure", user_eng_name, response_cache.version(user_eng_name))
+    if histogram is None:
+        try:
+            histogram = await db_executor.run(load_departure_histogram, user_eng_name)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"出发时段直方图读取失败: {str(e)}")
+    best, candidates = histogram.recommend(commute_type, transport_type, objective,
+                                           earliest_minutes, arrive_by_minutes)
+    if best is None:
+        raise HTTPException(status_code=404, detail="通勤记录不足，暂时无法推荐出发时间")
+    return {
+        "success": True,
+        "data": {
+            "commute_type": commute_type,
+            "objective": objective,
+            "recommendation": departure.format_window(best),
+            "windows": [departure.format_window(window) for window in candidates],
+        },
+    }
+
+@app.get("/api/predict")
+async def predict_duration(
+    user_eng_name: str = Query(...),
+    transport_type: str = Query(..., pattern="^(subway|car)$"),
+    commute_type: Optional[str] = Query(None, pattern="^(to_work|from_work)$"),
+    start_time: Optional[str] = None,
+    weather: Optional[str] = None,
+    temperature: Optional[str] = None,
+    location: Optional[str] = None,
+):
+    """预测现在（或start_time）出发的通勤时长及95%预测区间
+
+    通勤类型默认按出发时间判断（12点前为上班），天气和温度默认取天气服务的当前结果。
+    模型按用户写入版本缓存，缓存命中时不访问数据库。
+    """
+    try:
+        departure = sql_dialect.parse_datetime(start_time) if start_time else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"出发时间格式错误: {start_time}")
+    commute_type = commute_type or ("to_work" if departure.hour < 12 else "from_work")
+    if weather is None:
+        try:
+            reading = await weather_service.get(location)
+            weather = reading["weather"]
+            temperature = temperature or reading["temperature"]
+        except Exception:
+            # 天气不可用时按无雨、默认温度预测
+            pass
+    
+    model = response_cache.get("model", user_eng_name, response_cache.version(user_eng_name))
+    if model is None:
+        try:
+            model = await db_executor.run(load_prediction_model, user_eng_name)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"预测模型读取失败: {str(e)}")
+    vector = prediction.features(departure.date(), weather, temperature, transport_type, commute_type, departure)
+    result = model.predict(vector)
+    if result is None:
+        raise HTTPException(status_code=404, detail="通勤记录不足，暂时无法预测")
+    expected, lower, upper = result
+    transport_samples, commute_samples = model.samples(transport_type, commute_type)
+    return {
+        "success": True,
+        "data": {
+            "transport_type": transport_type,
+            "commute_type": commute_type,
+            "start_time": departure.strftime("%Y-%m-%d %H:%M:%S"),
+            "weather": weather,
+            "temperature": temperature,
+            "expected_duration": round(expected, 1),
+            "lower": round(lower, 1),
+            "upper": round(upper, 1),
+            "confidence": prediction.CONFIDENCE,
+            "expected_arrive_time": (departure + timedelta(minutes=expected)).strftime("%Y-%m-%d %H:%M:%S"),
+            "record_count": model.count,
+            "transport_record_count": transport_samples,
+            "commute_record_count": commute_samples,
+        },
+    }
+
 @app.get("/api/statistics")
-def get_statistics(user_eng_name: str = Query(...)):
-    """获取统计数据"""
+@db_executor.offload
+def get_statistics(request: Request, user_eng_name: str = Query(...)):
+    """获取统计数据（按用户写入版本缓存，支持ETag）"""
+    return cached_user_response("statistics", request, user_eng_name, compute_statistics)
+
+def compute_statistics(user_eng_name):
+    """计算统计数据"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 基础统计
-            basic_stats_sql = """
-                SELECT 
-                    COUNT(*) as total_count,
-                    AVG(total_duration) as avg_duration,
-                    MIN(total_duration) as min_duration,
-                    MAX(total_duration) as max_duration,
-                    AVG(rating) as avg_rating
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-            """
-            execute_query(cursor, basic_stats_sql, (user_eng_name,), conn)
-            basic_stats = cursor.fetchone()
-            
-            # 按出行方式统计
-            transport_stats_sql = """
-                SELECT 
-                    transport_type,
-                    COUNT(*) as count,
-                    AVG(total_duration) as avg_duration
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                GROUP BY transport_type
-            """
-            execute_query(cursor, transport_stats_sql, (user_eng_name,), conn)
-            transport_stats = cursor.fetchall()
-            transport_stats = format_datetime_results(transport_stats, ['date'])
-            
-            # 按通勤类型统计
-            commute_stats_sql = """
-                SELECT 
-                    commute_type,
-                    COUNT(*) as count,
-                    AVG(total_duration) as avg_duration
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                GROUP BY commute_type
-            """
-            execute_query(cursor, commute_stats_sql, (user_eng_name,), conn)
-            commute_stats = cursor.fetchall()
-            commute_stats = format_datetime_results(commute_stats, ['date'])
-            
-            # 按星期统计
-            weekday_stats_sql = """
-                SELECT 
-                    weekday,
-                    AVG(total_duration) as avg_duration,
-                    COUNT(*) as count
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                GROUP BY weekday
-            """
-            execute_query(cursor, weekday_stats_sql, (user_eng_name,), conn)
-            weekday_stats = cursor.fetchall()
-            weekday_stats = format_datetime_results(weekday_stats, ['date'])
-            
-            # 按天气统计
-            weather_stats_sql = """
-                SELECT 
-                    weather,
-                    AVG(total_duration) as avg_duration,
-                    COUNT(*) as count
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL AND weather IS NOT NULL
-                GROUP BY weather
-            """
-            execute_query(cursor, weather_stats_sql, (user_eng_name,), conn)
-            weather_stats = cursor.fetchall()
-            weather_stats = format_datetime_results(weather_stats, ['date'])
-            
-            # 最近30天趋势
-            trend_data_sql = """
-                SELECT 
-                    date,
-                    AVG(total_duration) as avg_duration
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                    AND date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                GROUP BY date
-                ORDER BY date
-            """
-            execute_query(cursor, trend_data_sql, (user_eng_name,), conn)
-            trend_data = cursor.fetchall()
-            trend_data = format_datetime_results(trend_data)
-            
-            # 分段时间统计（SQLite版本）
-            if is_sqlite_connection(conn):
-                # SQLite版本的分段时间统计
-                segment_stats_sql = """
-                    SELECT 
-                        AVG((julianday(on_vehicle_time) - julianday(start_time)) * 1440) as avg_to_vehicle,
-                        AVG((julianday(arrive_time) - julianday(on_vehicle_time)) * 1440) as avg_on_vehicle
-                    FROM commute_records 
-                    WHERE user_eng_name = %s 
-                        AND start_time IS NOT NULL 
-                        AND on_vehicle_time IS NOT NULL 
-                        AND arrive_time IS NOT NULL
-                """
-            else:
-                # MySQL版本的分段时间统计
-                segment_stats_sql = """
-                    SELECT 
-                        AVG(TIMESTAMPDIFF(MINUTE, start_time, on_vehicle_time)) as avg_to_vehicle,
-                        AVG(TIMESTAMPDIFF(MINUTE, on_vehicle_time, arrive_time)) as avg_on_vehicle
-                    FROM commute_records 
-                    WHERE user_eng_name = %s 
-                        AND start_time IS NOT NULL 
-                        AND on_vehicle_time IS NOT NULL 
-                        AND arrive_time IS NOT NULL
-                """
-            
-            execute_query(cursor, segment_stats_sql, (user_eng_name,), conn)
-            segment_stats = cursor.fetchone()
-            
-            cursor.close()
-            
-            return {
-                "success": True,
-                "basic": basic_stats,
-                "by_transport": transport_stats,
-                "by_commute_type": commute_stats,
-                "by_weekday": weekday_stats,
-                "by_weather": weather_stats,
-                "trend": trend_data,
-                "segments": segment_stats
-            }
+        snapshot = load_analytics_snapshot(user_eng_name)
+        trend_statistics = load_trend_statistics(user_eng_name)
+        return {
+            "success": True,
+            **snapshot.statistics(),
+            "rolling_trend": trend_statistics["rolling_trend"],
+            "pivot": snapshot.pivot(),
+            "regression": trend_statistics["regression"],
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"统计数据获取失败: {str(e)}")
 
 @app.get("/api/suggestions")
-def get_suggestions(user_eng_name: str = Query(...)):
-    """生成智能建议"""
+@db_executor.offload
+def get_suggestions(request: Request, user_eng_name: str = Query(...)):
+    """获取智能建议（按用户写入版本缓存，支持ETag）"""
+    return cached_user_response("suggestions", request, user_eng_name, compute_suggestions)
+
+def compute_suggestions(user_eng_name):
+    """按规则生成智能建议"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 检查数据量
-            execute_query(cursor, "SELECT COUNT(*) as count FROM commute_records WHERE user_eng_name = %s", (user_eng_name,), conn)
-            count_result = cursor.fetchone()
-            
-            # 处理SQLite的结果格式
-            if isinstance(count_result, sqlite3.Row):
-                count = count_result['count']
-            else:
-                count = count_result.get('count', 0) if count_result else 0
-            
-            if count < 10:
-                return {
-                    "success": False,
-                    "message": f"数据不足，当前有{count}条记录，至少需要10条记录才能生成准确建议"
-                }
-            
-            suggestions = []
-            
-            # 1. 出行方式对比
-            transport_comparison_sql = """
-                SELECT 
-                    transport_type,
-                    AVG(total_duration) as avg_duration,
-                    AVG(rating) as avg_rating,
-                    COUNT(*) as count
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                GROUP BY transport_type
-            """
-            execute_query(cursor, transport_comparison_sql, (user_eng_name,), conn)
-            transport_comparison = cursor.fetchall()
-            transport_comparison = format_datetime_results(transport_comparison, ['date'])
-            
-            if len(transport_comparison) >= 2:
-                sorted_by_time = sorted(transport_comparison, key=lambda x: float(x['avg_duration'] or 999))
-                sorted_by_rating = sorted(transport_comparison, key=lambda x: float(x['avg_rating'] or 0), reverse=True)
-                
-                fastest = sorted_by_time[0]
-                best_rated = sorted_by_rating[0]
-                
-                transport_names = {"subway": "地铁", "car": "开车"}
-                
-                suggestions.append({
-                    "type": "transport",
-                    "title": "出行方式建议",
-                    "content": f"{transport_names.get(fastest['transport_type'], fastest['transport_type'])}平均用时{float(fastest['avg_duration'] or 0):.1f}分钟，是最快的通勤方式。"
-                })
-                
-                if fastest['transport_type'] != best_rated['transport_type']:
-                    suggestions.append({
-                        "type": "experience",
-                        "title": "体验建议",
-                        "content": f"虽然{transport_names.get(fastest['transport_type'])}更快，但{transport_names.get(best_rated['transport_type'])}的平均评分更高({float(best_rated['avg_rating'] or 0):.1f}星)，体验更好。"
-                    })
-            
-            # 2. 天气影响分析
-            weather_impact_sql = """
-                SELECT 
-                    weather,
-                    AVG(total_duration) as avg_duration,
-                    COUNT(*) as count
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL AND weather IS NOT NULL
-                GROUP BY weather
-                HAVING count >= 3
-                ORDER BY avg_duration DESC
-            """
-            execute_query(cursor, weather_impact_sql, (user_eng_name,), conn)
-            weather_impact = cursor.fetchall()
-            weather_impact = format_datetime_results(weather_impact, ['date'])
-            
-            if len(weather_impact) >= 2:
-                worst_weather = weather_impact[0]
-                best_weather = weather_impact[-1]
-                time_diff = float(worst_weather['avg_duration'] or 0) - float(best_weather['avg_duration'] or 0)
-                
-                if time_diff > 10:
-                    suggestions.append({
-                        "type": "weather",
-                        "title": "天气影响",
-                        "content": f"{worst_weather['weather']}天气下通勤时间平均增加{time_diff:.1f}分钟，建议提前出门。"
-                    })
-            
-            # 3. 瓶颈环节识别
-            if is_sqlite_connection(conn):
-                # SQLite版本的分段时间统计
-                segments_sql = """
-                    SELECT 
-                        AVG((julianday(on_vehicle_time) - julianday(start_time)) * 1440) as avg_to_vehicle,
-                        AVG((julianday(arrive_time) - julianday(on_vehicle_time)) * 1440) as avg_on_vehicle
-                    FROM commute_records 
-                    WHERE user_eng_name = %s 
-                        AND start_time IS NOT NULL 
-                        AND on_vehicle_time IS NOT NULL 
-                        AND arrive_time IS NOT NULL
-                """
-            else:
-                # MySQL版本的分段时间统计
-                segments_sql = """
-                    SELECT 
-                        AVG(TIMESTAMPDIFF(MINUTE, start_time, on_vehicle_time)) as avg_to_vehicle,
-                        AVG(TIMESTAMPDIFF(MINUTE, on_vehicle_time, arrive_time)) as avg_on_vehicle
-                    FROM commute_records 
-                    WHERE user_eng_name = %s 
-                        AND start_time IS NOT NULL 
-                        AND on_vehicle_time IS NOT NULL 
-                        AND arrive_time IS NOT NULL
-                """
-            
-            execute_query(cursor, segments_sql, (user_eng_name,), conn)
-            segments = cursor.fetchone()
-            
-            if segments and segments['avg_to_vehicle'] and segments['avg_on_vehicle']:
-                avg_to_vehicle = float(segments['avg_to_vehicle'] or 0)
-                avg_on_vehicle = float(segments['avg_on_vehicle'] or 0)
-                
-                if avg_to_vehicle > avg_on_vehicle:
-                    suggestions.append({
-                        "type": "bottleneck",
-                        "title": "时间优化建议",
-                        "content": f"从出门到上车平均耗时{avg_to_vehicle:.1f}分钟，是主要瓶颈环节，建议优化出门准备流程。"
-                    })
-                else:
-                    suggestions.append({
-                        "type": "bottleneck",
-                        "title": "时间优化建议",
-                        "content": f"在途时间平均{avg_on_vehicle:.1f}分钟，占比较大，可考虑选择更快的路线。"
-                    })
-            
-            # 4. 星期规律
-            worst_day_sql = """
-                SELECT 
-                    weekday,
-                    AVG(total_duration) as avg_duration
-                FROM commute_records 
-                WHERE user_eng_name = %s AND total_duration IS NOT NULL
-                GROUP BY weekday
-                HAVING COUNT(*) >= 2
-                ORDER BY avg_duration DESC
-                LIMIT 1
-            """
-            execute_query(cursor, worst_day_sql, (user_eng_name,), conn)
-            worst_day = cursor.fetchone()
-            
-            if worst_day:
-                worst_day_weekday = worst_day['weekday']
-                worst_day_duration = float(worst_day['avg_duration'] or 0)
-                suggestions.append({
-                    "type": "schedule",
-                    "title": "时间规律",
-                    "content": f"{worst_day_weekday}的通勤时间最长(平均{worst_day_duration:.1f}分钟)，建议这天提前出门。"
-                })
-            
-            cursor.close()
-            
-            return {
-                "success": True,
-                "count": count,
-                "suggestions": suggestions
-            }
+        return suggestions.generate_suggestions(load_analytics_snapshot(user_eng_name))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"建议生成失败: {str(e)}")
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus格式的运行指标"""
+    pool_stats = get_pool_stats()
+    pools = [pool_stats["mysql"], pool_stats["sqlite"]]
+    breaker = pool_stats["breaker"]
+    gauges = [
+        ("commute_db_backend", "当前使用的数据库后端",
+         [({"backend": name}, pool_stats["backend"] == name) for name in ("mysql", "sqlite")]),
+        ("commute_db_breaker_open", "MySQL熔断是否打开",
+         [({}, breaker["state"] == "open")]),
+        ("commute_db_breaker_trips", "MySQL熔断累计打开次数",
+         [({}, breaker["trips"])]),
+    ]
+    executor_stats = db_executor.stats()
+    for field, help_text in (
+        ("workers", "数据库线程池线程数"),
+        ("queued", "排队等待执行的数据库操作数"),
+        ("active", "正在执行的数据库操作数"),
+        ("completed", "累计完成的数据库操作数"),
+        ("rejected", "累计因排队过多被拒绝的操作数"),
+        ("queue_time_total", "累计排队时间（秒）"),
+        ("queue_time_max", "最长排队时间（秒）"),
+    ):
+        gauges.append((f"commute_db_executor_{field}", help_text, [({}, executor_stats[field])]))
+    weather_stats = weather_service.stats()
+    for field, help_text in (
+        ("hits", "天气缓存累计命中次数"),
+        ("stale_hits", "天气缓存过期后返回旧结果的次数"),
+        ("misses", "天气缓存累计未命中次数"),
+        ("refreshes", "累计从天气来源刷新的次数"),
+        ("refresh_failures", "累计天气刷新失败次数"),
+    ):
+        gauges.append((f"commute_weather_{field}", help_text,
+                       [({"provider": weather_stats["provider"]}, weather_stats[field])]))
+    cache_stats = response_cache.stats()
+    for field, help_text in (
+        ("size", "响应缓存当前条数"),
+        ("hits", "响应缓存累计命中次数"),
+        ("misses", "响应缓存累计未命中次数"),
+        ("not_modified", "累计返回304的次数"),
+        ("evictions", "响应缓存累计淘汰条数"),
+        ("invalidations", "累计写入失效次数"),
+    ):
+        gauges.append((f"commute_response_cache_{field}", help_text, [({}, cache_stats[field])]))
+    for field, help_text in (
+        ("size", "连接池当前连接数"),
+        ("idle", "连接池空闲连接数"),
+        ("in_use", "连接池使用中的连接数"),
+        ("acquired", "累计取出连接次数"),
+        ("waited", "累计需要等待的取连接次数"),
+        ("timeouts", "累计等待连接超时次数"),
+        ("created", "累计新建连接数"),
+        ("evicted_idle", "累计回收的空闲连接数"),
+        ("failed_checks", "累计健康检查失败次数"),
+        ("wait_time_total", "累计等待连接时间（秒）"),
+        ("wait_time_max", "最长等待连接时间（秒）"),
+    ):
+        gauges.append((f"commute_db_pool_{field}", help_text,
+                       [({"pool": p["name"]}, p[field]) for p in pools]))
+    return PlainTextResponse(
+        tracing.metrics.render(gauges),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 # 挂载静态文件（必须在最后）
-app.mount("/static", StaticFiles(directory="static", html=True), name="static")
+# 已执行 build_static.py 时分发构建结果（哈希文件名、预压缩），否则直接分发 static/
+app.mount("/static", static_assets.CompressedStaticFiles(directory=static_assets.static_directory(), html=True),
+          name="static")
 
 # 检查是否在Railway环境
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+"""迁移旧版本的SQLite数据库
+
+把旧版本的表重建为当前版本（文本日期时间转换为整数、增加分段耗时列等，
+见 sqlite_schema），迁移期间服务可以继续读写；建议在部署新版本前对线上数据库
+执行。新版本启动时如发现未迁移的数据库，也会自动执行同样的迁移。
+
+    python migrate_sqlite.py [--batch-size 5000]
+"""
+import argparse
+import sys
+
+import main
+import sqlite_schema
+
+
+def migrate(batch_size=sqlite_schema.SQLITE_MIGRATE_BATCH_SIZE):
+    """执行迁移，返回迁移的记录数（已是最新版本时返回0）"""
+    print(f"数据库文件: {main.SQLITE_PATH}")
+    conn = main.create_sqlite_connection()
+    try:
+        if not sqlite_schema.needs_migration(conn):
+            print("✓ SQLite表结构已是最新版本，无需迁移")
+            return 0
+        return sqlite_schema.migrate_with_log(
+            conn, main.RECORD_INDEXES,
+            lambda cursor: main.rebuild_user_summary(cursor, conn),
+            batch_size
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把旧版本的SQLite数据库在线迁移为当前表结构")
+    parser.add_argument("--batch-size", type=int, default=sqlite_schema.SQLITE_MIGRATE_BATCH_SIZE,
+                        help="每个事务复制的记录数")
+    args = parser.parse_args()
+    try:
+        migrate(args.batch_size)
+    except Exception as e:
+        print(f"✗ 迁移失败: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,164 @@
+"""按用户增量维护的通勤时长预测模型
+
+每个用户一个带L2正则的线性回归模型，特征为：出行方式、通勤类型、星期几、雨雪、温度，
+以及出发时间相对早晚高峰的偏移（一次项和二次项）。模型不保存系数，而是保存充分统计量
+M = Σ z·zᵀ（z = [特征..., 总时长]，取上三角）：
+
+    XᵀX = M[:-1, :-1]    Xᵀy = M[:-1, -1]    yᵀy = M[-1, -1]    记录数 = M[0, 0]
+
+M 按项相加，新增一条记录只需把它的 z·zᵀ 加到 commute_prediction_stats 表中（删除时减去），
+与汇总表在同一事务中增量维护，不需要重新训练；预测时解一个 d×d 的线性方程组，
+结果按用户写入版本缓存，之后的每次预测只是几次向量运算，不访问数据库。
+
+预测区间使用残差方差和 xᵀ(XᵀX+λI)⁻¹x 计算，自由度为记录数减去有效参数个数
+（岭回归帽子矩阵的迹），按t分布取分位数。调整特征后需要用
+``python check_summary.py --rebuild`` 按原始记录重建统计量。
+"""
+import math
+import os
+import re
+
+import numpy as np
+
+import sql_dialect
+
+# 正则化强度（不作用于截距），用户很少使用的出行方式等特征的系数会收缩到0
+PREDICT_RIDGE = float(os.getenv("PREDICT_RIDGE", 1.0))
+# 有效自由度不低于该值时才给出预测
+PREDICT_MIN_DOF = int(os.getenv("PREDICT_MIN_DOF", 3))
+CONFIDENCE = 0.95
+
+FEATURES = (
+    "intercept", "car", "from_work",
+    "星期二", "星期三", "星期四", "星期五", "星期六", "星期日",
+    "rain", "heavy_rain", "temperature", "departure", "departure_squared",
+)
+SIZE = len(FEATURES) + 1
+# 早晚高峰的参考出发时间（当天的分钟数），出发时间特征为相对它的偏移（小时）
+RUSH_MINUTES = {"to_work": 8 * 60 + 30, "from_work": 18 * 60 + 30}
+# 温度特征为 (温度 - 20) / 10，没有温度时为0
+_TEMPERATURE_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_UPPER = [(i, j) for i in range(SIZE) for j in range(i, SIZE)]
+
+# 单条记录的特征字段（增量维护）
+VALUE_COLUMNS = ("user_eng_name", "date", "weather", "temperature", "transport_type",
+                 "commute_type", "start_time", "total_duration")
+_VALUE_SQL = f"""
+    SELECT {', '.join(VALUE_COLUMNS)}
+    FROM commute_records
+    WHERE total_duration IS NOT NULL AND {{where}}
+"""
+VALUE_SQL = _VALUE_SQL.format(where="id = %s")
+SOURCE_ALL_SQL = _VALUE_SQL.format(where="1 = 1")
+SOURCE_USER_SQL = _VALUE_SQL.format(where="user_eng_name = %s")
+# 按项累加（SQLite由sql_dialect转换为 ON CONFLICT DO UPDATE）
+STATS_UPSERT_SQL = """
+    INSERT INTO commute_prediction_stats (user_eng_name, row_index, col_index, stat_value)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE stat_value = stat_value + VALUES(stat_value)
+"""
+STATS_READ_SQL = """
+    SELECT row_index, col_index, stat_value
+    FROM commute_prediction_stats
+    WHERE user_eng_name = %s
+"""
+
+
+def _weekday(value):
+    """星期几编号（星期一为0）：SQLite中日期为天数，其他为date对象或字符串"""
+    days = value if isinstance(value, int) else sql_dialect.date_to_days(value)
+    return sql_dialect.days_to_weekday(days)
+
+
+def _temperature(value):
+    match = _TEMPERATURE_RE.search(value) if value else None
+    return (float(match.group()) - 20) / 10 if match else 0.0
+
+
+def features(date, weather, temperature, transport_type, commute_type, start_time):
+    """一次通勤的特征向量（与FEATURES顺序一致）"""
+    vector = [0.0] * len(FEATURES)
+    vector[0] = 1.0
+    vector[1] = 1.0 if transport_type == "car" else 0.0
+    vector[2] = 1.0 if commute_type == "from_work" else 0.0
+    weekday = _weekday(date)
+    if weekday:
+        vector[2 + weekday] = 1.0
+    weather = weather or ""
+    if "大雨" in weather or "暴雨" in weather or "雪" in weather:
+        vector[10] = 1.0
+    elif "雨" in weather:
+        vector[9] = 1.0
+    vector[11] = _temperature(temperature)
+    minute = sql_dialect.minute_of_day(start_time)
+    if minute is not None:
+        offset = (minute - RUSH_MINUTES.get(commute_type, RUSH_MINUTES["to_work"])) / 60
+        vector[12] = offset
+        vector[13] = offset * offset
+    return vector
+
+
+def stat_deltas(values, sign=1):
+    """一组记录对统计量的增量：{(用户, 行, 列): 值}
+
+    values为VALUE_COLUMNS顺序的序列，总时长为空的记录不计入。
+    """
+    totals = {}
+    for user_eng_name, date, weather, temperature, transport_type, commute_type, start_time, duration in values:
+        if duration is None:
+            continue
+        z = features(date, weather, temperature, transport_type, commute_type, start_time) + [float(duration)]
+        matrix = totals.get(user_eng_name)
+        if matrix is None:
+            matrix = totals[user_eng_name] = np.zeros((SIZE, SIZE))
+        matrix += np.outer(z, z)
+    return {
+        (user_eng_name, i, j): sign * float(matrix[i, j])
+        for user_eng_name, matrix in totals.items()
+        for i, j in _UPPER
+    }
+
+
+def _t_quantile(dof, confidence=CONFIDENCE):
+    """t分布的双侧分位数（正态分位数的Cornish-Fisher展开，自由度不小于3时误差在1%以内）"""
+    z = {0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}[confidence]
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+class DurationModel:
+    """由一个用户的统计量求解的模型"""
+
+    def __init__(self, rows):
+        stats = np.zeros((SIZE, SIZE))
+        for row in rows:
+            stats[row['row_index'], row['col_index']] = stats[row['col_index'], row['row_index']] = row['stat_value']
+        xtx, xty, yty = stats[:-1, :-1], stats[:-1, -1], stats[-1, -1]
+        self.count = int(round(stats[0, 0]))
+        self.car_count = int(round(stats[0, 1]))
+        self.from_work_count = int(round(stats[0, 2]))
+        self.coefficients = None
+        if self.count == 0:
+            return
+        penalty = np.full(len(FEATURES), PREDICT_RIDGE)
+        penalty[0] = 0.0
+        self.inverse = np.linalg.inv(xtx + np.diag(penalty))
+        self.coefficients = self.inverse @ xty
+        residual = yty - 2 * self.coefficients @ xty + self.coefficients @ xtx @ self.coefficients
+        self.dof = self.count - float(np.trace(self.inverse @ xtx))
+        self.variance = max(float(residual), 0.0) / self.dof if self.dof > 0 else None
+
+    def samples(self, transport_type, commute_type):
+        """同一出行方式、同一通勤类型的记录数"""
+        transport = self.car_count if transport_type == "car" else self.count - self.car_count
+        commute = self.from_work_count if commute_type == "from_work" else self.count - self.from_work_count
+        return transport, commute
+
+    def predict(self, vector):
+        """返回 (预测时长, 区间下限, 区间上限)，记录不足时返回None"""
+        if self.coefficients is None or self.variance is None or self.dof < PREDICT_MIN_DOF:
+            return None
+        x = np.asarray(vector)
+        expected = float(x @ self.coefficients)
+        spread = _t_quantile(self.dof) * math.sqrt(self.variance * (1 + float(x @ self.inverse @ x)))
+        return expected, max(expected - spread, 0.0), expected + spread
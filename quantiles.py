@@ -0,0 +1,109 @@
+"""通勤时长的可合并分位数草图（DDSketch）
+
+时长按对数分桶：γ = (1 + α) / (1 - α)，桶 i 覆盖 (γ^(i-1), γ^i]，用代表值
+2γ^i / (γ + 1) 估计桶内的值，估计值与真实值的相对误差不超过 α（RELATIVE_ACCURACY）。
+分位数取排序后第 ⌊q·(n-1)⌋ 条记录所在的桶，因此报告的 p50/p90/p95 与精确结果
+（同一名次的真实时长）的相对误差同样不超过 α。
+
+桶计数可以直接相加（合并、新增记录）或相减（删除记录），草图因此以
+(用户, 出行方式, 通勤类型, 桶, 计数) 行保存在 commute_duration_sketch 表中，随记录的
+增删改在同一事务中增量维护；读取时把各分组的草图合并为按出行方式、通勤类型和总体的草图。
+时长为整数分钟，不大于0的值记入 ZERO_BUCKET（代表值为0）；只包含一个整数的桶
+（约50分钟以内）直接用这个整数作为代表值，结果是精确的。
+"""
+import math
+
+RELATIVE_ACCURACY = 0.01
+ZERO_BUCKET = -1
+QUANTILES = (0.5, 0.9, 0.95)
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def bucket_index(value):
+    """时长所在的桶"""
+    if value <= 0:
+        return ZERO_BUCKET
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def bucket_value(index):
+    """桶的代表值"""
+    if index == ZERO_BUCKET:
+        return 0.0
+    upper = _GAMMA ** index
+    lower = upper / _GAMMA
+    if math.floor(upper) - math.floor(lower) == 1:
+        return float(math.floor(upper))
+    return 2 * upper / (_GAMMA + 1)
+
+
+def bucket_counts(values, sign=1):
+    """按 (用户, 出行方式, 通勤类型, 总时长) 序列统计各桶的记录数（乘以sign），总时长为空的不计入"""
+    counts = {}
+    for user_eng_name, transport_type, commute_type, duration in values:
+        if duration is None:
+            continue
+        key = (user_eng_name, transport_type, commute_type, bucket_index(duration))
+        counts[key] = counts.get(key, 0) + sign
+    return counts
+
+
+def grouped_bucket_counts(rows):
+    """按 (用户, 出行方式, 通勤类型, 总时长, 记录数) 的分组行统计各桶的记录数"""
+    counts = {}
+    for user_eng_name, transport_type, commute_type, duration, count in rows:
+        key = (user_eng_name, transport_type, commute_type, bucket_index(duration))
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+class DurationSketch:
+    """一组记录的时长草图（桶 -> 记录数）"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+
+    def add_bucket(self, index, count):
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+
+    def add(self, value, count=1):
+        self.add_bucket(bucket_index(value), count)
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.add_bucket(index, count)
+        return self
+
+    def quantile(self, q):
+        """第 ⌊q·(n-1)⌋ 名（从0起）的时长估计值"""
+        if self.count <= 0:
+            return None
+        rank = math.floor(q * (self.count - 1))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return bucket_value(index)
+        return bucket_value(max(self.buckets))
+
+    def percentiles(self):
+        """{count, p50, p90, p95}，估计值保留一位小数"""
+        result = {"count": self.count}
+        for q in QUANTILES:
+            value = self.quantile(q)
+            result[f"p{round(q * 100)}"] = round(value, 1) if value is not None else None
+        return result
+
+    def histogram(self, bin_minutes):
+        """按固定宽度（分钟）汇总的分布，各桶按代表值归入区间"""
+        bins = {}
+        for index, count in self.buckets.items():
+            if count <= 0:
+                continue
+            start = int(bucket_value(index) // bin_minutes) * bin_minutes
+            bins[start] = bins.get(start, 0) + count
+        return [{"start": start, "end": start + bin_minutes, "count": bins[start]} for start in sorted(bins)]
@@ -0,0 +1,85 @@
+"""通勤记录行的格式化与JSON序列化
+
+记录列表、单条记录和导出直接从游标返回的元组生成接口字典：按游标的列描述
+一次性选定每一列的转换函数，之后每行只做一次 dict(zip(...)) 和需要转换的几列，
+不再逐行把 sqlite3.Row 转为字典、对每个字段做类型判断和 strftime。
+
+    日期       SQLite为天数，MySQL为date对象    -> "YYYY-MM-DD"
+    日期时间   SQLite为秒数，MySQL为datetime对象 -> "YYYY-MM-DD HH:MM:SS"
+    星期几     SQLite为编号（星期一为0）         -> 名称
+    空值和空字符串 -> None
+
+天数和当天秒数到字符串的转换在 sql_dialect 中缓存（同一天的记录共用日期字符串）。
+生成的字典只含str、int、float和None，用 FastJSONResponse（orjson）直接序列化，
+不经过FastAPI的 jsonable_encoder。
+"""
+import orjson
+from fastapi.responses import JSONResponse
+
+import sql_dialect
+
+DATE_COLUMNS = ("date",)
+DATETIME_COLUMNS = ("start_time", "on_vehicle_time", "arrive_time", "created_at", "updated_at")
+
+
+def format_date(value):
+    if type(value) is int:
+        return sql_dialect.days_to_date(value)
+    if not value:
+        return None
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def format_datetime(value):
+    if type(value) is int:
+        return sql_dialect.seconds_to_datetime(value)
+    if not value:
+        return None
+    return value if isinstance(value, str) else value.isoformat(" ", "seconds")
+
+
+def format_weekday(value):
+    return sql_dialect.WEEKDAY_NAMES[value] if type(value) is int else value
+
+
+CONVERTERS = dict.fromkeys(DATE_COLUMNS, format_date)
+CONVERTERS.update(dict.fromkeys(DATETIME_COLUMNS, format_datetime))
+CONVERTERS["weekday"] = format_weekday
+
+
+def row_formatter(description):
+    """按游标的列描述（cursor.description）生成格式化函数：元组序列 -> 字典列表"""
+    names = tuple(column[0] for column in description)
+    converters = tuple((name, CONVERTERS[name]) for name in names if name in CONVERTERS)
+
+    def format_rows(rows):
+        records = []
+        for row in rows:
+            record = dict(zip(names, row))
+            for name, convert in converters:
+                record[name] = convert(record[name])
+            records.append(record)
+        return records
+
+    return format_rows
+
+
+def format_rows(cursor, rows):
+    """格式化该游标读取的一批行"""
+    return row_formatter(cursor.description)(rows)
+
+
+def dumps(content):
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_lines(records):
+    """NDJSON：每条记录一行"""
+    return b"".join(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE) for record in records)
+
+
+class FastJSONResponse(JSONResponse):
+    """用orjson序列化的JSON响应，内容须已是JSON基本类型（接口直接返回该响应实例）"""
+
+    def render(self, content):
+        return dumps(content)
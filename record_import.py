@@ -0,0 +1,184 @@
+"""通勤记录批量导入（CSV/NDJSON）
+
+按块处理上传的文件或本地文件：文本按逻辑行切分（CSV中带引号的字段可以跨行），
+每攒够一块就校验并交给写入函数，在一个事务中写入，内存占用只与块大小有关。
+无效的行跳过并记录行号和原因，不影响其余记录。
+
+CSV首行为表头，列名与导出接口一致（id、created_at、updated_at等多余的列忽略），
+空字段视为未填写；NDJSON每行一个JSON对象，空行忽略。
+
+环境变量：
+    IMPORT_CHUNK_SIZE  每个事务写入的行数，默认10000
+    IMPORT_MAX_ERRORS  结果中保留的错误明细条数上限，默认100（失败总数不受限制）
+"""
+import codecs
+import csv
+import json
+import os
+import time
+
+from pydantic import ValidationError
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 10000))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 100))
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class LineSplitter:
+    """把任意切分的文本块拼接为逻辑行，返回 (起始行号, 行文本)
+
+    CSV按引号个数的奇偶判断一行是否结束（转义的引号成对出现，不影响判断）。
+    """
+
+    def __init__(self, quoted=False):
+        self.quoted = quoted
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._pending = ""
+        self._line_no = 1
+
+    def feed(self, data, final=False):
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data, final)
+        lines = (self._pending + data).split("\n")
+        last = lines.pop()
+        self._pending = "" if final else last
+        if final and last:
+            lines.append(last)
+        records = []
+        partial = None
+        for line in lines:
+            partial = line if partial is None else partial + "\n" + line
+            if self.quoted and partial.count('"') % 2 and not final:
+                continue
+            records.append((self._line_no, partial.rstrip("\r")))
+            self._line_no += partial.count("\n") + 1
+            partial = None
+        if partial is not None:
+            # 引号未闭合的行留到下一块
+            self._pending = partial + "\n" + self._pending
+        return records
+
+    def finish(self):
+        return self.feed(b"", final=True)
+
+
+class RecordImporter:
+    """逐块校验并写入记录，累计进度和错误
+
+    write_chunk(records) 在一个事务中写入一块已校验的记录并返回写入条数；
+    on_progress(progress) 在每块写入后调用。
+    """
+
+    def __init__(self, import_format, model, write_chunk, chunk_size=IMPORT_CHUNK_SIZE,
+                 max_errors=IMPORT_MAX_ERRORS, on_progress=None):
+        if import_format not in IMPORT_FORMATS:
+            raise ValueError(f"不支持的导入格式: {import_format}")
+        self.import_format = import_format
+        self.model = model
+        self.write_chunk = write_chunk
+        self.chunk_size = max(1, chunk_size)
+        self.max_errors = max_errors
+        self.on_progress = on_progress
+        self.splitter = LineSplitter(quoted=import_format == "csv")
+        self._header = None
+        self._missing_header = False
+        self._buffer = []
+        self._started = time.monotonic()
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors = []
+
+    def split(self, data, final=False):
+        """切分一段原始数据，返回已攒够的块（final时包括剩余部分）
+
+        只做文本切分，开销很小；调用方可以在其他线程中逐块 process_chunk。
+        """
+        self._buffer.extend(self.splitter.finish() if final else self.splitter.feed(data))
+        chunks = []
+        while len(self._buffer) >= self.chunk_size or (final and self._buffer):
+            chunks.append(self._buffer[:self.chunk_size])
+            del self._buffer[:self.chunk_size]
+        return chunks
+
+    def feed(self, data):
+        """追加一段原始数据；攒够一块时校验并写入"""
+        for chunk in self.split(data):
+            self.process_chunk(chunk)
+
+    def finish(self):
+        """处理剩余数据，返回导入结果"""
+        for chunk in self.split(b"", final=True):
+            self.process_chunk(chunk)
+        return self.result()
+
+    def result(self):
+        if self.import_format == "csv" and self._header is None and not self._missing_header:
+            self._missing_header = True
+            self._error(1, ["缺少表头"])
+        return self.progress()
+
+    def process_chunk(self, lines):
+        """解析、校验一块逻辑行，并在一个事务中写入有效记录"""
+        records = []
+        for line_no, item in self._parse(lines):
+            self.rows += 1
+            try:
+                records.append(self.model.model_validate(item))
+            except ValidationError as e:
+                self._error(line_no, [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+                                      for err in e.errors()])
+        if records:
+            self.inserted += self.write_chunk(records)
+        self.chunks += 1
+        if self.on_progress is not None:
+            self.on_progress(self.progress())
+
+    def progress(self):
+        elapsed = time.monotonic() - self._started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "elapsed": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "errors": list(self.errors),
+        }
+
+    def _parse(self, lines):
+        if self.import_format == "ndjson":
+            for line_no, line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    self.rows += 1
+                    self._error(line_no, [f"JSON解析失败: {str(e)}"])
+                    continue
+                if not isinstance(item, dict):
+                    self.rows += 1
+                    self._error(line_no, ["每行应为一个JSON对象"])
+                    continue
+                yield line_no, item
+            return
+
+        line_numbers = [line_no for line_no, _ in lines]
+        for line_no, values in zip(line_numbers, csv.reader(line for _, line in lines)):
+            if not values:
+                continue
+            if self._header is None:
+                self._header = [name.strip() for name in values]
+                continue
+            if len(values) != len(self._header):
+                self.rows += 1
+                self._error(line_no, [f"列数为{len(values)}，与表头的{len(self._header)}列不一致"])
+                continue
+            yield line_no, {name: value for name, value in zip(self._header, values) if value != ""}
+
+    def _error(self, line_no, messages):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no, "errors": messages})
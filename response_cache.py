@@ -0,0 +1,99 @@
+"""按用户写入版本缓存的接口响应
+
+统计和建议接口的结果只取决于用户的记录（以及当天日期）。每个用户有一个写入版本号，
+所有修改记录的接口在提交事务后递增版本号；计算结果以 (接口, 用户, 版本号)
+为键放入有界LRU缓存，版本号变化后旧结果自然失效，按LRU淘汰。
+
+ETag由进程启动标识、用户版本号和接口名组成，客户端通过 If-None-Match
+重新验证时只需比较版本号，无需访问数据库。版本号保存在进程内，
+多进程部署时应让同一用户的请求落在同一进程，或关闭缓存（RESPONSE_CACHE_SIZE=0）。
+
+环境变量：
+    RESPONSE_CACHE_SIZE  缓存的响应条数上限，默认1024，0表示关闭缓存和ETag
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+
+
+class VersionedCache:
+    """线程安全的按用户版本号失效的LRU缓存"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        # 进程启动标识，避免重启后版本号重新计数导致误判304
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._entries = OrderedDict()
+        self._metrics = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "invalidations": 0}
+
+    def version(self, user_eng_name):
+        """用户当前的缓存版本：写入版本号加当天日期（30天趋势随日期滑动）"""
+        with self._lock:
+            count = self._versions.get(user_eng_name, 0)
+        return f"{count}.{date.today():%Y%m%d}"
+
+    def bump(self, user_eng_name):
+        """递增用户的写入版本号（在写事务提交后调用）"""
+        with self._lock:
+            self._versions[user_eng_name] = self._versions.get(user_eng_name, 0) + 1
+            self._metrics["invalidations"] += 1
+
+    def etag(self, kind, user_eng_name, version):
+        user_hash = hashlib.sha1(user_eng_name.encode("utf-8")).hexdigest()[:12]
+        return f'W/"{kind}-{self.epoch}-{user_hash}-{version}"'
+
+    def matches(self, if_none_match, etag):
+        """判断If-None-Match头是否与ETag匹配（弱比较）"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag.removeprefix("W/") in candidates:
+            with self._lock:
+                self._metrics["not_modified"] += 1
+            return True
+        return False
+
+    def get(self, kind, user_eng_name, version):
+        key = (kind, user_eng_name, version)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._metrics["hits"] += 1
+            return value
+
+    def put(self, kind, user_eng_name, version, value):
+        if self.max_size <= 0:
+            return
+        key = (kind, user_eng_name, version)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data.update({"size": len(self._entries), "max_size": self.max_size, "users": len(self._versions)})
+        return data
+
+
+response_cache = VersionedCache(RESPONSE_CACHE_SIZE)
@@ -0,0 +1,120 @@
+"""SQL方言转换
+
+main.py中的语句统一按MySQL语法编写。每条语句在首次执行时按方言转换一次
+并缓存，之后的执行只需要一次缓存查找。
+
+SQLite中日期和时间按整数存储（MySQL使用DATE/DATETIME）：
+    date                                  距1970-01-01的天数
+    start_time/on_vehicle_time/arrive_time  距1970-01-01 00:00:00的秒数（记录中的本地时间，不做时区换算）
+    weekday                               0~6（星期一为0），由date计算（MySQL中为由date计算的名称）
+参数的编码和结果的解码见下方的 *_to_* 函数，接口返回的仍是原来的字符串格式。
+"""
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+MYSQL = "mysql"
+SQLITE = "sqlite"
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+# 1970-01-01是星期四
+_EPOCH_WEEKDAY = 3
+WEEKDAY_NAMES = ("星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日")
+
+_TIMESTAMPDIFF_RE = re.compile(r'TIMESTAMPDIFF\(MINUTE,\s*(\w+),\s*(\w+)\)')
+_VALUES_FUNC_RE = re.compile(r'VALUES\((\w+)\)')
+
+
+def _to_sqlite(sql):
+    # SQLite使用问号占位符
+    sqlite_sql = sql.replace('%s', '?').rstrip()
+    # 日期函数转换：按本地日期计算天数
+    sqlite_sql = sqlite_sql.replace(
+        'DATE_SUB(CURDATE(), INTERVAL 30 DAY)',
+        "(CAST(strftime('%s', 'now', 'localtime') AS INTEGER) / 86400 - 30)"
+    )
+    # ON DUPLICATE KEY UPDATE 转换为 UPSERT，VALUES(col) 对应 excluded.col
+    if 'ON DUPLICATE KEY UPDATE' in sqlite_sql:
+        head, tail = sqlite_sql.split('ON DUPLICATE KEY UPDATE', 1)
+        sqlite_sql = head + 'ON CONFLICT DO UPDATE SET' + _VALUES_FUNC_RE.sub(r"excluded.\1", tail)
+    # TIMESTAMPDIFF转换为秒数之差
+    return _TIMESTAMPDIFF_RE.sub(r"((\2 - \1) / 60.0)", sqlite_sql)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql, dialect):
+    """将MySQL语句转换为指定方言（结果按语句和方言缓存）"""
+    if dialect == SQLITE:
+        return _to_sqlite(sql)
+    return sql
+
+
+def parse_date(value):
+    """解析日期（date对象或 YYYY-MM-DD 字符串）"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value.strip()[:10])
+
+
+def parse_datetime(value):
+    """解析日期时间（datetime对象或ISO格式字符串，带时区时保留其本地时间）"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(value.strip()).replace(tzinfo=None)
+
+
+def date_to_days(value):
+    if value is None:
+        return None
+    return (parse_date(value) - EPOCH_DATE).days
+
+
+def datetime_to_seconds(value):
+    if value is None:
+        return None
+    return int((parse_datetime(value) - EPOCH).total_seconds())
+
+
+def minute_of_day(value):
+    """时间在当天的分钟数（SQLite中为秒数，其他为datetime对象或字符串），None原样返回"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value % 86400 / 60
+    moment = parse_datetime(value)
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+# 结果解码时同一天、同一时刻的字符串重复出现，按值缓存
+@lru_cache(maxsize=4096)
+def days_to_date(days):
+    return (EPOCH_DATE + timedelta(days=days)).isoformat()
+
+
+@lru_cache(maxsize=None)
+def _time_of_day(seconds):
+    """当天的秒数（0~86399）转为 HH:MM:SS"""
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}"
+
+
+def seconds_to_datetime(seconds):
+    days, seconds = divmod(seconds, 86400)
+    return f"{days_to_date(days)} {_time_of_day(seconds)}"
+
+
+def days_to_weekday(days):
+    return (days + _EPOCH_WEEKDAY) % 7
+
+
+def date_weekday_name(value):
+    """日期的星期几名称（MySQL中按名称存储）"""
+    return WEEKDAY_NAMES[parse_date(value).weekday()]
+
+
+def weekday_name(value):
+    """SQLite中的星期几编号转换为名称，其他值原样返回"""
+    return WEEKDAY_NAMES[value] if isinstance(value, int) else value
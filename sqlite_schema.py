@@ -0,0 +1,324 @@
+"""SQLite表结构与在线迁移
+
+SQLite中的日期和时间按整数存储（编码见 sql_dialect）：比较和区间扫描是整数比较，
+时长直接相减，不再逐行解析文本；星期几由日期计算，不再信任客户端传入的文本。
+分段耗时 to_vehicle_minutes/on_vehicle_minutes 是写入时计算并存储的生成列，
+统计只需对这两列求和。表结构版本记录在 PRAGMA user_version 中：
+    0  日期时间为文本
+    1  日期时间为整数
+    2  增加分段耗时生成列（当前版本）
+
+旧版本的表通过在线迁移重建，服务可以继续读写：
+    1. 创建影子表 commute_records_migrating，并在原表上建触发器，把迁移期间的
+       写入（新增、修改、删除）同步到影子表；
+    2. 按ID分批把原表转换后复制到影子表，每批一个短事务（生成列随复制写入）；
+    3. 在一个事务中删除原表、把影子表改名为 commute_records、重建索引、汇总表及其他派生表。
+从版本0迁移时，第3步完成后、新版本启动前，旧版本写入的文本值由兼容触发器就地转换。
+
+环境变量：
+    SQLITE_MIGRATE_BATCH_SIZE  迁移时每个事务复制的记录数，默认5000
+"""
+import os
+import time
+
+SCHEMA_VERSION = 2
+SQLITE_MIGRATE_BATCH_SIZE = int(os.getenv("SQLITE_MIGRATE_BATCH_SIZE", 5000))
+
+MIGRATING_TABLE = "commute_records_migrating"
+
+RECORDS_TABLE_SQL = """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_eng_name VARCHAR(100) NOT NULL,
+        date INTEGER NOT NULL,
+        weekday INTEGER NOT NULL,
+        weather TEXT,
+        temperature TEXT,
+        transport_type VARCHAR(20) NOT NULL,
+        commute_type VARCHAR(20) NOT NULL,
+        start_time INTEGER,
+        on_vehicle_time INTEGER,
+        arrive_time INTEGER,
+        to_vehicle_minutes REAL GENERATED ALWAYS AS ((on_vehicle_time - start_time) / 60.0) STORED,
+        on_vehicle_minutes REAL GENERATED ALWAYS AS ((arrive_time - on_vehicle_time) / 60.0) STORED,
+        total_duration INTEGER,
+        rating INTEGER,
+        notes TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+SUMMARY_TABLE_SQL = """
+    CREATE TABLE commute_user_summary (
+        user_eng_name VARCHAR(100) NOT NULL,
+        transport_type VARCHAR(20) NOT NULL,
+        commute_type VARCHAR(20) NOT NULL,
+        weekday INTEGER NOT NULL,
+        weather TEXT NOT NULL DEFAULT '',
+        record_count INTEGER NOT NULL DEFAULT 0,
+        duration_count INTEGER NOT NULL DEFAULT 0,
+        duration_sum INTEGER NOT NULL DEFAULT 0,
+        duration_min INTEGER,
+        duration_max INTEGER,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        segment_count INTEGER NOT NULL DEFAULT 0,
+        to_vehicle_sum REAL NOT NULL DEFAULT 0,
+        on_vehicle_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_eng_name, transport_type, commute_type, weekday, weather)
+    )
+"""
+
+SKETCH_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commute_duration_sketch (
+        user_eng_name VARCHAR(100) NOT NULL,
+        transport_type VARCHAR(20) NOT NULL,
+        commute_type VARCHAR(20) NOT NULL,
+        bucket INTEGER NOT NULL,
+        bucket_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_eng_name, transport_type, commute_type, bucket)
+    )
+"""
+
+PREDICTION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commute_prediction_stats (
+        user_eng_name VARCHAR(100) NOT NULL,
+        row_index INTEGER NOT NULL,
+        col_index INTEGER NOT NULL,
+        stat_value REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_eng_name, row_index, col_index)
+    )
+"""
+
+DEPARTURE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commute_departure_histogram (
+        user_eng_name VARCHAR(100) NOT NULL,
+        transport_type VARCHAR(20) NOT NULL,
+        commute_type VARCHAR(20) NOT NULL,
+        departure_bucket INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        bucket_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_eng_name, transport_type, commute_type, departure_bucket, bucket)
+    )
+"""
+
+TREND_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commute_trend_stats (
+        user_eng_name VARCHAR(100) NOT NULL,
+        transport_type VARCHAR(20) NOT NULL,
+        commute_type VARCHAR(20) NOT NULL,
+        stat_name VARCHAR(20) NOT NULL,
+        stat_value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_eng_name, transport_type, commute_type, stat_name)
+    )
+"""
+
+# 客户端记录标识（幂等写入，不由记录构建，迁移时保留）
+CLIENT_RECORDS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commute_client_records (
+        user_eng_name VARCHAR(100) NOT NULL,
+        client_id VARCHAR(64) NOT NULL,
+        record_id INTEGER NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_eng_name, client_id)
+    )
+"""
+
+# 由记录构建的派生表（新建时需要按已有记录构建）
+DERIVED_TABLES = {
+    "commute_duration_sketch": SKETCH_TABLE_SQL,
+    "commute_prediction_stats": PREDICTION_TABLE_SQL,
+    "commute_departure_histogram": DEPARTURE_TABLE_SQL,
+    "commute_trend_stats": TREND_TABLE_SQL,
+}
+
+# 迁移时复制的列（生成列由新表自行计算）
+
+COLUMNS = ("id", "user_eng_name", "date", "weekday", "weather", "temperature", "transport_type",
+           "commute_type", "start_time", "on_vehicle_time", "arrive_time", "total_duration",
+           "rating", "notes", "created_at", "updated_at")
+TIME_COLUMNS = ("start_time", "on_vehicle_time", "arrive_time")
+
+
+def _days_sql(row):
+    # 日期文本转换为天数；无法解析时退回到创建日期
+    return (f"COALESCE(CAST(strftime('%s', substr({row}date, 1, 10)) AS INTEGER) / 86400, "
+            f"CAST(strftime('%s', substr({row}created_at, 1, 10)) AS INTEGER) / 86400, 0)")
+
+
+def _seconds_sql(value, day):
+    # 时间文本转换为秒数；只有时分的旧数据与记录日期（day为日期文本的表达式）组合
+    return (f"CAST(strftime('%s', CASE WHEN {value} LIKE '__:__%' "
+            f"THEN {day} || ' ' || {value} ELSE {value} END) AS INTEGER)")
+
+
+def _converted_columns(version, row=""):
+    """旧表一行（row为 "NEW." 等前缀）转换为新表各列的表达式；版本1起各列原样复制"""
+    expressions = {column: f"{row}{column}" for column in COLUMNS}
+    if version >= 1:
+        return ", ".join(expressions[column] for column in COLUMNS)
+    expressions["date"] = _days_sql(row)
+    expressions["weekday"] = f"({_days_sql(row)} + 3) % 7"
+    for column in TIME_COLUMNS:
+        expressions[column] = _seconds_sql(f"{row}{column}", f"substr({row}date, 1, 10)")
+    return ", ".join(expressions[column] for column in COLUMNS)
+
+
+def _compat_triggers():
+    # 旧版本在迁移完成后写入的文本值，写入后就地转换为整数
+    text_check = " OR ".join(f"typeof(NEW.{column}) = 'text'" for column in ("date",) + TIME_COLUMNS)
+    day = ("CASE WHEN typeof(NEW.date) = 'integer' THEN date(NEW.date * 86400, 'unixepoch') "
+           "ELSE substr(NEW.date, 1, 10) END")
+    days = f"CASE WHEN typeof(NEW.date) = 'integer' THEN NEW.date ELSE {_days_sql('NEW.')} END"
+    assignments = ", ".join(
+        [f"date = {days}", f"weekday = ({days} + 3) % 7"]
+        + [f"{column} = CASE WHEN typeof(NEW.{column}) = 'text' "
+           f"THEN {_seconds_sql(f'NEW.{column}', day)} ELSE NEW.{column} END" for column in TIME_COLUMNS]
+    )
+    return [
+        f"""CREATE TRIGGER commute_records_legacy_{event.lower()} AFTER {event} ON commute_records
+        WHEN {text_check}
+        BEGIN
+            UPDATE commute_records SET {assignments} WHERE id = NEW.id;
+        END"""
+        for event in ("INSERT", "UPDATE")
+    ]
+
+
+COMPAT_TRIGGERS = ("commute_records_legacy_insert", "commute_records_legacy_update")
+SYNC_TRIGGERS = ("commute_records_migrate_insert", "commute_records_migrate_update",
+                 "commute_records_migrate_delete")
+
+
+def _sync_triggers(version):
+    insert = (f"INSERT OR REPLACE INTO {MIGRATING_TABLE} ({', '.join(COLUMNS)}) "
+              f"SELECT {_converted_columns(version, 'NEW.')}")
+    return [
+        f"CREATE TRIGGER commute_records_migrate_insert AFTER INSERT ON commute_records BEGIN {insert}; END",
+        f"CREATE TRIGGER commute_records_migrate_update AFTER UPDATE ON commute_records BEGIN {insert}; END",
+        f"CREATE TRIGGER commute_records_migrate_delete AFTER DELETE ON commute_records "
+        f"BEGIN DELETE FROM {MIGRATING_TABLE} WHERE id = OLD.id; END",
+    ]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def create_indexes(conn, indexes):
+    for name, columns in indexes.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON commute_records ({columns})")
+
+
+def create_tables(conn, indexes):
+    """创建当前版本的表结构（新数据库），返回是否新建了汇总表或其他派生表（需要按记录构建）"""
+    if not table_exists(conn, "commute_records"):
+        conn.execute(RECORDS_TABLE_SQL.format(table="commute_records"))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        print("✓ SQLite数据库表结构创建成功！")
+    create_indexes(conn, indexes)
+    for name in COMPAT_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(CLIENT_RECORDS_TABLE_SQL)
+    created = False
+    for name, sql in DERIVED_TABLES.items():
+        if not table_exists(conn, name):
+            conn.execute(sql)
+            created = True
+    if not table_exists(conn, "commute_user_summary"):
+        conn.execute(SUMMARY_TABLE_SQL)
+        created = True
+    return created
+
+
+def needs_migration(conn):
+    return table_exists(conn, "commute_records") and schema_version(conn) < SCHEMA_VERSION
+
+
+def migrate(conn, indexes, rebuild_summary, batch_size=SQLITE_MIGRATE_BATCH_SIZE, on_progress=None):
+    """把旧版本的表在线迁移为当前版本，返回复制的记录数
+
+    rebuild_summary(cursor) 在切换事务中按新表重建汇总表；
+    on_progress(copied, total) 在每批复制后调用。
+    """
+    conn.commit()
+    version = schema_version(conn)
+    # 上次中断留下的影子表和触发器直接丢弃，从头开始
+    for name in SYNC_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"DROP TABLE IF EXISTS {MIGRATING_TABLE}")
+    conn.execute(RECORDS_TABLE_SQL.format(table=MIGRATING_TABLE))
+    for trigger in _sync_triggers(version):
+        conn.execute(trigger)
+    conn.commit()
+
+    total = conn.execute("SELECT COUNT(*) FROM commute_records").fetchone()[0]
+    copy_sql = f"""
+        INSERT OR IGNORE INTO {MIGRATING_TABLE} ({', '.join(COLUMNS)})
+        SELECT {_converted_columns(version)} FROM commute_records
+        WHERE id > ? AND id <= ?
+    """
+    copied = 0
+    last_id = 0
+    while True:
+        # 先确定本批的ID上界，复制语句按主键范围扫描
+        row = conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM commute_records WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, batch_size)
+        ).fetchone()
+        if row[0] is None:
+            break
+        copied += conn.execute(copy_sql, (last_id, row[0])).rowcount
+        conn.commit()
+        last_id = row[0]
+        if on_progress is not None:
+            on_progress(copied, total)
+
+    # 切换：写锁只在这个事务中持有
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in SYNC_TRIGGERS:
+            conn.execute(f"DROP TRIGGER {name}")
+        # 保留自增序列（末尾删除过的ID不再复用）
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, COALESCE("
+            "(SELECT seq FROM sqlite_sequence WHERE name = 'commute_records'), 0)) WHERE name = ?",
+            (MIGRATING_TABLE,)
+        )
+        conn.execute("DROP TABLE commute_records")
+        conn.execute(f"ALTER TABLE {MIGRATING_TABLE} RENAME TO commute_records")
+        create_indexes(conn, indexes)
+        if version == 0:
+            for trigger in _compat_triggers():
+                conn.execute(trigger)
+        conn.execute("DROP TABLE IF EXISTS commute_user_summary")
+        conn.execute(SUMMARY_TABLE_SQL)
+        for sql in DERIVED_TABLES.values():
+            conn.execute(sql)
+        cursor = conn.cursor()
+        rebuild_summary(cursor)
+        cursor.close()
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return copied
+
+
+def migrate_with_log(conn, indexes, rebuild_summary, batch_size=SQLITE_MIGRATE_BATCH_SIZE):
+    """迁移并打印进度"""
+    started = time.monotonic()
+
+    def report(copied, total):
+        print(f"已迁移 {copied}/{total} 条记录")
+
+    print(f"检测到旧版本（{schema_version(conn)}）的SQLite表结构，开始迁移……")
+    copied = migrate(conn, indexes, rebuild_summary, batch_size, report)
+    print(f"✓ SQLite表结构迁移完成：{copied} 条记录，耗时 {time.monotonic() - started:.1f} 秒")
+    return copied
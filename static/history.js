@@ -1,7 +1,11 @@
 import { showToast, formatDate, formatTime, formatDuration, apiRequest, showLoading, showEmpty, showError } from './utils.js';
 
+const PAGE_SIZE = 10;
+
 let currentUser = null;
 let currentPage = 1;
+let currentCursor = null;
+let totalRecords = null;
 let currentFilters = {};
 let currentRecordId = null;
 
@@ -10,6 +14,7 @@ export function initHistoryPage(user) {
     
     // 监听页面显示事件
     window.addEventListener('historyPageShow', () => {
+        resetPaging();
         loadRecords();
     });
     
@@ -38,7 +43,7 @@ function initFilter() {
             transport_type: document.getElementById('filterTransport').value || undefined,
             commute_type: document.getElementById('filterCommuteType').value || undefined
         };
-        currentPage = 1;
+        resetPaging();
         loadRecords();
         filterPanel.classList.add('hidden');
     });
@@ -49,12 +54,19 @@ function initFilter() {
         document.getElementById('filterTransport').value = '';
         document.getElementById('filterCommuteType').value = '';
         currentFilters = {};
-        currentPage = 1;
+        resetPaging();
         loadRecords();
         filterPanel.classList.add('hidden');
     });
 }
 
+// 回到第一页
+function resetPaging() {
+    currentPage = 1;
+    currentCursor = null;
+    totalRecords = null;
+}
+
 // 加载记录列表
 async function loadRecords() {
     const recordsList = document.getElementById('recordsList');
@@ -63,16 +75,26 @@ async function loadRecords() {
     try {
         const params = new URLSearchParams({
             user_eng_name: currentUser?.engName || 'guest',
-            page: currentPage,
-            page_size: 10,
-            ...currentFilters
+            page_size: PAGE_SIZE
         });
+        Object.entries(currentFilters).forEach(([key, value]) => {
+            if (value !== undefined) params.append(key, value);
+        });
+        if (currentCursor) {
+            params.append('cursor', currentCursor);
+        } else {
+            // 只在第一页统计总数
+            params.append('include_total', 'true');
+        }
         
         const data = await apiRequest(`/api/records?${params}`);
+        if (data.total !== undefined) {
+            totalRecords = data.total;
+        }
         
         if (data.success && data.data.length > 0) {
             renderRecords(data.data);
-            renderPagination(data.total, data.page, data.page_size);
+            renderPagination(data.prev_cursor, data.next_cursor);
         } else {
             showEmpty(recordsList, '暂无通勤记录');
             document.getElementById('pagination').classList.add('hidden');
@@ -151,11 +173,10 @@ function renderRecords(records) {
 }
 
 // 渲染分页
-function renderPagination(total, page, pageSize) {
+function renderPagination(prevCursor, nextCursor) {
     const pagination = document.getElementById('pagination');
-    const totalPages = Math.ceil(total / pageSize);
     
-    if (totalPages <= 1) {
+    if (!prevCursor && !nextCursor) {
         pagination.classList.add('hidden');
         return;
     }
@@ -165,30 +186,28 @@ function renderPagination(total, page, pageSize) {
     let html = '';
     
     // 上一页
-    if (page > 1) {
-        html += `<button class="px-3 py-1 bg-white border border-gray-300 rounded hover:bg-gray-50" data-page="${page - 1}">上一页</button>`;
+    if (prevCursor) {
+        html += `<button class="px-3 py-1 bg-white border border-gray-300 rounded hover:bg-gray-50" data-cursor="${prevCursor}" data-step="-1">上一页</button>`;
     }
     
     // 页码
-    for (let i = 1; i <= totalPages; i++) {
-        if (i === 1 || i === totalPages || (i >= page - 2 && i <= page + 2)) {
-            html += `<button class="px-3 py-1 ${i === page ? 'bg-blue-600 text-white' : 'bg-white border border-gray-300 hover:bg-gray-50'} rounded" data-page="${i}">${i}</button>`;
-        } else if (i === page - 3 || i === page + 3) {
-            html += `<span class="px-2">...</span>`;
-        }
-    }
+    const pageInfo = totalRecords !== null
+        ? `第 ${currentPage} / ${Math.max(1, Math.ceil(totalRecords / PAGE_SIZE))} 页`
+        : `第 ${currentPage} 页`;
+    html += `<span class="px-3 py-1">${pageInfo}</span>`;
     
     // 下一页
-    if (page < totalPages) {
-        html += `<button class="px-3 py-1 bg-white border border-gray-300 rounded hover:bg-gray-50" data-page="${page + 1}">下一页</button>`;
+    if (nextCursor) {
+        html += `<button class="px-3 py-1 bg-white border border-gray-300 rounded hover:bg-gray-50" data-cursor="${nextCursor}" data-step="1">下一页</button>`;
     }
     
     pagination.innerHTML = html;
     
     // 添加点击事件
-    pagination.querySelectorAll('[data-page]').forEach(btn => {
+    pagination.querySelectorAll('[data-cursor]').forEach(btn => {
         btn.addEventListener('click', () => {
-            currentPage = parseInt(btn.dataset.page);
+            currentCursor = btn.dataset.cursor;
+            currentPage += parseInt(btn.dataset.step);
             loadRecords();
         });
     });
@@ -324,6 +343,7 @@ function initModal() {
             if (data.success) {
                 showToast('删除成功');
                 closeModal();
+                resetPaging();
                 loadRecords();
             }
         } catch (error) {
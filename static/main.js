@@ -296,6 +296,25 @@ if ('serviceWorker' in navigator) {
                 console.error('❌ Service Worker 注册失败:', error);
             });
         
+        // 离线记录同步完成后提示
+        navigator.serviceWorker.addEventListener('message', event => {
+            if (event.data && event.data.type === 'OUTBOX_SYNCED') {
+                if (event.data.synced) {
+                    showToast(`已同步 ${event.data.synced} 条离线记录`);
+                }
+                if (event.data.rejected.length) {
+                    showToast(`${event.data.rejected.length} 条离线记录无效，未能保存`, 'error');
+                }
+            }
+        });
+        
+        // 联网时通知Service Worker提交离线记录（不支持后台同步的浏览器依赖此消息）
+        window.addEventListener('online', () => {
+            if (navigator.serviceWorker.controller) {
+                navigator.serviceWorker.controller.postMessage({ type: 'FLUSH_OUTBOX' });
+            }
+        });
+        
         // 监听Service Worker控制器变化
         navigator.serviceWorker.addEventListener('controllerchange', () => {
             console.log('🔄 Service Worker 已更新');
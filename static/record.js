@@ -1,4 +1,4 @@
-import { showToast, getWeekday, calculateDuration, formatDuration, apiRequest } from './utils.js';
+import { showToast, getWeekday, calculateDuration, formatDuration, apiRequest, newClientId } from './utils.js';
 
 let currentUser = null;
 let timeRecords = {
@@ -7,6 +7,8 @@ let timeRecords = {
     arriveTime: null
 };
 let currentRating = 0;
+// 当前表单的客户端标识：保存失败后重试沿用同一个，保存成功重置表单时清除
+let pendingClientId = null;
 
 export function initRecordPage(user) {
     currentUser = user;
@@ -380,7 +382,8 @@ function initSubmit() {
             arrive_time: timeRecords.arriveTime,
             total_duration: totalDuration,
             rating: currentRating || null,
-            notes: notesTextarea.value || null
+            notes: notesTextarea.value || null,
+            client_id: pendingClientId || (pendingClientId = newClientId())
         };
         
         // 提交数据
@@ -393,7 +396,11 @@ function initSubmit() {
                 body: JSON.stringify(recordData)
             });
             
-            if (result.success) {
+            if (result.queued) {
+                // Service Worker已存入离线队列，联网后自动同步
+                showToast(result.message);
+                resetForm();
+            } else if (result.success) {
                 showToast('记录保存成功！');
                 resetForm();
             } else {
@@ -410,6 +417,8 @@ function initSubmit() {
 
 // 重置表单
 function resetForm() {
+    pendingClientId = null;
+    
     // 重置时间记录
     timeRecords = {
         startTime: null,
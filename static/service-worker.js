@@ -1,5 +1,6 @@
-const CACHE_NAME = 'commute-tracker-v1';
-const urlsToCache = [
+// precache-manifest:start（未构建时使用原文件名；构建时由 build_static.py 按内容哈希生成）
+const CACHE_VERSION = 'dev';
+const PRECACHE_URLS = [
   '/static/index.html',
   '/static/main.js',
   '/static/user.js',
@@ -7,11 +8,29 @@ const urlsToCache = [
   '/static/record.js',
   '/static/history.js',
   '/static/analysis.js',
-  '/static/manifest.json',
+  '/static/manifest.json'
+];
+// precache-manifest:end
+// 每次构建的缓存名不同，激活时删除旧版本的缓存
+const CACHE_NAME = `commute-tracker-${CACHE_VERSION}`;
+const urlsToCache = PRECACHE_URLS.concat([
   'https://cdn.tailwindcss.com',
   'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
   'https://cdn.jsdelivr.net/npm/echarts@5.4.3/dist/echarts.min.js'
-];
+]);
+
+// 接口缓存：历史记录和统计按“过期再验证”读取（先返回缓存，同时在后台更新），不随版本清理
+const API_CACHE = 'commute-tracker-api';
+const STALE_WHILE_REVALIDATE_PATHS = ['/api/records', '/api/statistics', '/api/suggestions'];
+
+// 离线写入队列：网络不可用时新建的记录存入IndexedDB，联网后批量提交到 /api/records/batch。
+// 每条记录带client_id，服务端按 用户 + client_id 去重，重复提交不会产生重复记录
+const OUTBOX_DB = 'commute-tracker-outbox';
+const OUTBOX_STORE = 'records';
+const OUTBOX_BATCH_SIZE = 100;
+const SYNC_TAG = 'sync-records';
+// 服务端暂时不可用的状态码，记录同样加入队列
+const RETRYABLE_STATUS = [502, 503, 504];
 
 // 安装事件 - 缓存资源
 self.addEventListener('install', event => {
@@ -33,13 +52,14 @@ self.addEventListener('activate', event => {
     caches.keys().then(cacheNames => {
       return Promise.all(
         cacheNames.map(cacheName => {
-          if (cacheName !== CACHE_NAME) {
+          if (cacheName !== CACHE_NAME && cacheName !== API_CACHE) {
             console.log('[Service Worker] 删除旧缓存:', cacheName);
             return caches.delete(cacheName);
           }
         })
       );
     }).then(() => self.clients.claim())
+      .then(() => flushOutbox().catch(() => {}))
   );
 });
 
@@ -48,27 +68,46 @@ self.addEventListener('fetch', event => {
   const { request } = event;
   const url = new URL(request.url);
 
-  // API请求使用网络优先策略
   if (url.pathname.startsWith('/api/')) {
+    if (request.method === 'POST' && url.pathname === '/api/records') {
+      // 新建记录：网络不可用时加入离线队列
+      event.respondWith(createRecord(request));
+    } else if (request.method !== 'GET') {
+      // 其他写操作直接访问网络，成功后清除接口缓存
+      event.respondWith(
+        fetch(request).then(response => {
+          if (response.ok) {
+            invalidateApiCache();
+          }
+          return response;
+        })
+      );
+    } else if (STALE_WHILE_REVALIDATE_PATHS.includes(url.pathname)) {
+      event.respondWith(staleWhileRevalidate(event, request));
+    }
+    // 其他接口（天气、预测等）不经过缓存
+    return;
+  }
+
+  // 页面使用网络优先策略：页面引用的是当前版本的哈希资源
+  if (url.pathname === '/static/index.html' || url.pathname === '/static/') {
     event.respondWith(
       fetch(request)
         .then(response => {
-          // 克隆响应，一份给缓存，一份返回
-          const responseClone = response.clone();
-          caches.open(CACHE_NAME).then(cache => {
-            cache.put(request, responseClone);
-          });
+          if (response && response.status === 200) {
+            const responseClone = response.clone();
+            caches.open(CACHE_NAME).then(cache => {
+              cache.put('/static/index.html', responseClone);
+            });
+          }
           return response;
         })
-        .catch(() => {
-          // 网络失败时尝试从缓存获取
-          return caches.match(request);
-        })
+        .catch(() => caches.match('/static/index.html'))
     );
     return;
   }
 
-  // 静态资源使用缓存优先策略
+  // 静态资源（文件名含内容哈希）使用缓存优先策略
   event.respondWith(
     caches.match(request)
       .then(response => {
@@ -104,25 +143,164 @@ self.addEventListener('fetch', event => {
   );
 });
 
-// 后台同步
-self.addEventListener('sync', event => {
-  console.log('[Service Worker] 后台同步:', event.tag);
-  if (event.tag === 'sync-records') {
-    event.waitUntil(syncRecords());
+// 过期再验证：有缓存时立即返回，后台请求网络更新缓存；没有缓存时等待网络
+async function staleWhileRevalidate(event, request) {
+  const cache = await caches.open(API_CACHE);
+  const cached = await cache.match(request);
+  const network = fetch(request).then(response => {
+    if (response.ok) {
+      return cache.put(request, response.clone()).then(() => response);
+    }
+    return response;
+  });
+  if (cached) {
+    event.waitUntil(network.catch(error => {
+      console.log('[Service Worker] 后台更新失败，继续使用缓存:', request.url, error);
+    }));
+    return cached;
   }
-});
+  return network;
+}
+
+function invalidateApiCache() {
+  return caches.delete(API_CACHE);
+}
+
+function newClientId() {
+  if (self.crypto && self.crypto.randomUUID) {
+    return self.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
 
-// 同步记录函数
-async function syncRecords() {
+// 新建记录：先尝试网络，失败时加入离线队列并返回202
+async function createRecord(request) {
+  let record;
   try {
-    // 这里可以实现离线数据同步逻辑
-    console.log('[Service Worker] 同步记录...');
-    // 实际实现需要配合IndexedDB存储离线数据
+    record = await request.clone().json();
   } catch (error) {
-    console.error('[Service Worker] 同步失败:', error);
+    return fetch(request);
   }
+  if (!record.client_id) {
+    record.client_id = newClientId();
+  }
+  try {
+    const response = await fetch(request.url, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(record)
+    });
+    if (!RETRYABLE_STATUS.includes(response.status)) {
+      if (response.ok) {
+        invalidateApiCache();
+        // 网络已恢复，顺便提交之前排队的记录
+        flushOutbox().catch(() => {});
+      }
+      return response;
+    }
+  } catch (error) {
+    console.log('[Service Worker] 网络不可用，记录加入离线队列');
+  }
+  await withOutbox('readwrite', store => store.put({ client_id: record.client_id, record, queued_at: Date.now() }));
+  if (self.registration.sync) {
+    self.registration.sync.register(SYNC_TAG).catch(() => {});
+  }
+  return new Response(JSON.stringify({
+    success: true,
+    queued: true,
+    client_id: record.client_id,
+    message: '网络不可用，记录已离线保存，联网后自动同步'
+  }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+}
+
+function openOutbox() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(OUTBOX_DB, 1);
+    request.onupgradeneeded = () => {
+      const store = request.result.createObjectStore(OUTBOX_STORE, { keyPath: 'client_id' });
+      store.createIndex('queued_at', 'queued_at');
+    };
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+// 在一个IndexedDB事务中操作队列，callback返回的请求结果在事务完成后返回
+async function withOutbox(mode, callback) {
+  const db = await openOutbox();
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction(OUTBOX_STORE, mode);
+    const request = callback(transaction.objectStore(OUTBOX_STORE));
+    transaction.oncomplete = () => {
+      db.close();
+      resolve(request ? request.result : undefined);
+    };
+    transaction.onerror = transaction.onabort = () => {
+      db.close();
+      reject(transaction.error);
+    };
+  });
+}
+
+// 同一时间只有一次同步在进行
+let flushing = null;
+
+function flushOutbox() {
+  if (!flushing) {
+    flushing = syncOutbox().finally(() => {
+      flushing = null;
+    });
+  }
+  return flushing;
+}
+
+// 按排队顺序分批提交；网络或服务端错误时抛出，由后台同步稍后重试
+async function syncOutbox() {
+  let synced = 0;
+  const rejected = [];
+  while (true) {
+    const entries = await withOutbox('readonly', store => store.index('queued_at').getAll(null, OUTBOX_BATCH_SIZE));
+    if (!entries.length) {
+      break;
+    }
+    const response = await fetch('/api/records/batch', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ records: entries.map(entry => entry.record) })
+    });
+    if (!response.ok) {
+      throw new Error(`同步失败: HTTP ${response.status}`);
+    }
+    const result = await response.json();
+    // 写入成功（包括之前已写入的重复提交）和校验失败的记录都移出队列，校验失败的重试也不会成功
+    result.results.forEach(item => {
+      if (!item.success) {
+        rejected.push({ record: entries[item.index].record, errors: item.errors });
+      }
+    });
+    await withOutbox('readwrite', store => {
+      entries.forEach(entry => store.delete(entry.client_id));
+      return null;
+    });
+    synced += result.inserted + result.duplicates;
+  }
+  if (synced || rejected.length) {
+    console.log(`[Service Worker] 离线记录已同步: ${synced} 条，无效 ${rejected.length} 条`);
+    await invalidateApiCache();
+    const windows = await self.clients.matchAll({ type: 'window' });
+    windows.forEach(client => client.postMessage({ type: 'OUTBOX_SYNCED', synced, rejected }));
+  }
+  return synced;
 }
 
+// 后台同步：联网后由浏览器触发，失败时浏览器稍后重试
+self.addEventListener('sync', event => {
+  console.log('[Service Worker] 后台同步:', event.tag);
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(flushOutbox());
+  }
+});
+
 // 推送通知
 self.addEventListener('push', event => {
   console.log('[Service Worker] 收到推送消息');
@@ -158,6 +336,13 @@ self.addEventListener('message', event => {
   if (event.data.type === 'SKIP_WAITING') {
     self.skipWaiting();
   }
+
+  // 页面检测到联网（不支持后台同步的浏览器依赖此消息）
+  if (event.data.type === 'FLUSH_OUTBOX') {
+    event.waitUntil(flushOutbox().catch(error => {
+      console.log('[Service Worker] 同步未完成，稍后重试:', error);
+    }));
+  }
   
   if (event.data.type === 'CLEAR_CACHE') {
     event.waitUntil(
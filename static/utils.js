@@ -62,6 +62,14 @@ export function getWeekday(dateStr) {
     return weekdays[date.getDay()];
 }
 
+// 生成记录的客户端标识（服务端按它去重，重试不会产生重复记录）
+export function newClientId() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
 // API请求封装
 export async function apiRequest(url, options = {}) {
     try {
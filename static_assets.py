@@ -0,0 +1,216 @@
+"""静态资源构建与分发
+
+构建（python build_static.py）把 static/ 下的文件输出到 STATIC_DIST_DIR：
+
+    main.3f2a9c1e07.js     按内容哈希命名的副本，文件间的引用（import、<script src>、manifest）
+                           改写为哈希文件名；被引用的文件先处理，引用方的哈希包含依赖的哈希
+    index.html             入口页面和service-worker.js保持原名，内容中的引用同样改写
+    service-worker.js      预缓存清单（缓存版本和哈希URL列表）按构建结果生成
+    *.gz / *.br            文本文件的gzip/brotli预压缩版本（brotli需要安装brotli包，未安装时跳过）
+    asset-manifest.json    原文件名 -> 哈希文件名
+
+原文件名的副本同样保留，部署前已打开的旧页面仍能加载。
+
+分发（CompressedStaticFiles）：按 Accept-Encoding 选择预压缩文件（br优先于gzip）并设置
+Content-Encoding 和 Vary；哈希文件名的资源内容不会变化，返回 Cache-Control: immutable
+（一年），其他文件返回 no-cache，由ETag重新验证。未构建时直接分发 static/，不压缩。
+
+环境变量：
+    STATIC_DIST_DIR   构建输出目录，默认 static_dist；存在 asset-manifest.json 时分发该目录
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_SOURCE_DIR = "static"
+STATIC_DIST_DIR = os.getenv("STATIC_DIST_DIR", "static_dist")
+STATIC_URL = "/static/"
+ASSET_MANIFEST = "asset-manifest.json"
+# 保持原名的入口文件（URL需要固定）
+ENTRY_FILES = ("index.html", "service-worker.js")
+SERVICE_WORKER = "service-worker.js"
+# 预压缩的文件类型；压缩后没有变小的不保留
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".json", ".css", ".svg", ".txt")
+HASH_LENGTH = 10
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 按 Accept-Encoding 优先顺序：(编码, 文件后缀)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# service-worker.js 中由构建替换的预缓存清单
+PRECACHE_BLOCK_RE = re.compile(r"// precache-manifest:start.*?// precache-manifest:end\n", re.S)
+
+
+def _reference_re(names):
+    """匹配文件中对其他资源的引用：引号或括号后、./ 或 /static/ 后的文件名"""
+    alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(r"""(?<=["'(/])(%s)(?=["')?#])""" % alternatives)
+
+
+def hashed_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{digest}{extension}"
+
+
+def _precache_block(version, urls):
+    lines = ",\n".join(f"  {json.dumps(url)}" for url in urls)
+    return ("// precache-manifest:start（由 build_static.py 按内容哈希生成）\n"
+            f"const CACHE_VERSION = {json.dumps(version)};\n"
+            f"const PRECACHE_URLS = [\n{lines}\n];\n"
+            "// precache-manifest:end\n")
+
+
+def build_assets(source=STATIC_SOURCE_DIR, output=STATIC_DIST_DIR):
+    """构建静态资源，返回 asset-manifest（原文件名 -> 哈希文件名）"""
+    names = sorted(name for name in os.listdir(source) if os.path.isfile(os.path.join(source, name)))
+    contents = {}
+    for name in names:
+        with open(os.path.join(source, name), "rb") as f:
+            contents[name] = f.read()
+    text_names = [name for name in names if name.endswith(COMPRESSIBLE_EXTENSIONS)]
+    # 入口文件的URL固定，对它们的引用不改写
+    references = _reference_re([name for name in names if name not in ENTRY_FILES])
+    dependencies = {
+        name: {match.group(1) for match in references.finditer(contents[name].decode("utf-8"))} - {name}
+        for name in text_names
+    }
+
+    manifest = {}
+    rewritten = {}
+
+    def rewrite(name, visiting=()):
+        """按依赖顺序改写引用并计算哈希"""
+        if name in rewritten:
+            return
+        if name in visiting:
+            raise ValueError(f"静态资源存在循环引用: {' -> '.join(visiting + (name,))}")
+        for dependency in sorted(dependencies.get(name, ())):
+            rewrite(dependency, visiting + (name,))
+        content = contents[name]
+        if name in dependencies:
+            content = references.sub(lambda match: manifest.get(match.group(1), match.group(1)),
+                                     content.decode("utf-8")).encode("utf-8")
+        rewritten[name] = content
+        if name not in ENTRY_FILES:
+            manifest[name] = hashed_name(name, content)
+
+    for name in names:
+        if name != SERVICE_WORKER:
+            rewrite(name)
+
+    # 预缓存清单：入口页面和全部哈希资源；版本由它们的内容决定
+    urls = [STATIC_URL + "index.html"] + [STATIC_URL + manifest[name] for name in sorted(manifest)]
+    version = hashlib.sha256("\n".join(
+        [hashlib.sha256(rewritten["index.html"]).hexdigest()] + urls
+    ).encode("utf-8")).hexdigest()[:HASH_LENGTH]
+    worker = contents[SERVICE_WORKER].decode("utf-8")
+    if not PRECACHE_BLOCK_RE.search(worker):
+        raise ValueError(f"{SERVICE_WORKER} 中缺少 precache-manifest 标记")
+    rewritten[SERVICE_WORKER] = PRECACHE_BLOCK_RE.sub(lambda _: _precache_block(version, urls), worker).encode("utf-8")
+
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.makedirs(output)
+    files = {}
+    for name in names:
+        # 原文件名保留原始内容（入口文件为改写后的内容），另写一份哈希文件名的改写版本
+        files[name] = rewritten[name] if name in ENTRY_FILES else contents[name]
+        if name in manifest:
+            files[manifest[name]] = rewritten[name]
+    files[ASSET_MANIFEST] = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+    for name, content in files.items():
+        _write(os.path.join(output, name), content)
+        if name.endswith(COMPRESSIBLE_EXTENSIONS):
+            _write_compressed(os.path.join(output, name), content)
+    return manifest
+
+
+def _write(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _write_compressed(path, content):
+    # mtime固定为0，同样的内容每次构建得到同样的文件
+    compressed = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed[".br"] = brotli.compress(content, quality=11)
+    for suffix, data in compressed.items():
+        if len(data) < len(content):
+            _write(path + suffix, data)
+
+
+def load_manifest(directory):
+    """读取构建目录的 asset-manifest，未构建时返回None"""
+    try:
+        with open(os.path.join(directory, ASSET_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def static_directory():
+    """分发的目录：已构建时为 STATIC_DIST_DIR，否则为 static/"""
+    return STATIC_DIST_DIR if load_manifest(STATIC_DIST_DIR) is not None else STATIC_SOURCE_DIR
+
+
+def accepted_encodings(header):
+    """Accept-Encoding中可接受的编码（q=0的排除）"""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressedStaticFiles(StaticFiles):
+    """按Accept-Encoding分发预压缩文件，按文件名设置缓存策略"""
+
+    def __init__(self, *, directory, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.immutable = set((load_manifest(directory) or {}).values())
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        path = os.fspath(full_path)
+        media_type = mimetypes.guess_type(path)[0] or "text/plain"
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        encoding = None
+        for coding, suffix in ENCODINGS:
+            if coding in accepted or "*" in accepted:
+                try:
+                    stat_result = os.stat(path + suffix)
+                except FileNotFoundError:
+                    continue
+                encoding = coding
+                path += suffix
+                break
+
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        if encoding is not None:
+            response.headers["content-encoding"] = encoding
+        name = os.path.basename(os.fspath(full_path))
+        if name.endswith(COMPRESSIBLE_EXTENSIONS):
+            response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = (
+            IMMUTABLE_CACHE_CONTROL if name in self.immutable else REVALIDATE_CACHE_CONTROL
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,106 @@
+"""智能建议规则
+
+每条规则是一个读取 AnalyticsSnapshot 并产出建议的函数，用 @rule 注册后按注册
+顺序执行。规则只使用快照中已经汇总好的数据，新增规则不会增加数据库查询。
+"""
+
+# 生成建议所需的最少记录数
+MIN_RECORDS = 10
+
+TRANSPORT_NAMES = {"subway": "地铁", "car": "开车"}
+
+RULES = []
+
+
+def rule(func):
+    """注册一条建议规则"""
+    RULES.append(func)
+    return func
+
+
+def generate_suggestions(snapshot):
+    """依次执行全部规则，生成 /api/suggestions 的结果"""
+    if snapshot.record_count < MIN_RECORDS:
+        return {
+            "success": False,
+            "message": f"数据不足，当前有{snapshot.record_count}条记录，至少需要{MIN_RECORDS}条记录才能生成准确建议"
+        }
+    suggestions = []
+    for func in RULES:
+        suggestions.extend(func(snapshot))
+    return {
+        "success": True,
+        "count": snapshot.record_count,
+        "suggestions": suggestions
+    }
+
+
+def _transport_name(transport_type):
+    return TRANSPORT_NAMES.get(transport_type, transport_type)
+
+
+@rule
+def transport_comparison(snapshot):
+    """出行方式对比"""
+    groups = snapshot.by_transport
+    if len(groups) < 2:
+        return
+    fastest = min(groups, key=lambda k: groups[k].avg)
+    best_rated = max(groups, key=lambda k: groups[k].avg_rating or 0)
+
+    yield {
+        "type": "transport",
+        "title": "出行方式建议",
+        "content": f"{_transport_name(fastest)}平均用时{groups[fastest].avg:.1f}分钟，是最快的通勤方式。"
+    }
+    if fastest != best_rated:
+        yield {
+            "type": "experience",
+            "title": "体验建议",
+            "content": f"虽然{_transport_name(fastest)}更快，但{_transport_name(best_rated)}的平均评分更高({groups[best_rated].avg_rating or 0:.1f}星)，体验更好。"
+        }
+
+
+@rule
+def weather_impact(snapshot):
+    """天气影响分析（只比较至少3条记录的天气）"""
+    groups = {k: v for k, v in snapshot.by_weather.items() if v.count >= 3}
+    if len(groups) < 2:
+        return
+    worst = max(groups, key=lambda k: groups[k].avg)
+    best = min(groups, key=lambda k: groups[k].avg)
+    time_diff = groups[worst].avg - groups[best].avg
+    if time_diff > 10:
+        yield {
+            "type": "weather",
+            "title": "天气影响",
+            "content": f"{worst}天气下通勤时间平均增加{time_diff:.1f}分钟，建议提前出门。"
+        }
+
+
+@rule
+def bottleneck(snapshot):
+    """瓶颈环节识别"""
+    avg_to_vehicle = snapshot.avg_to_vehicle
+    avg_on_vehicle = snapshot.avg_on_vehicle
+    if not avg_to_vehicle or not avg_on_vehicle:
+        return
+    if avg_to_vehicle > avg_on_vehicle:
+        content = f"从出门到上车平均耗时{avg_to_vehicle:.1f}分钟，是主要瓶颈环节，建议优化出门准备流程。"
+    else:
+        content = f"在途时间平均{avg_on_vehicle:.1f}分钟，占比较大，可考虑选择更快的路线。"
+    yield {"type": "bottleneck", "title": "时间优化建议", "content": content}
+
+
+@rule
+def worst_weekday(snapshot):
+    """星期规律（只比较至少2条记录的星期）"""
+    groups = {k: v for k, v in snapshot.by_weekday.items() if v.count >= 2}
+    if not groups:
+        return
+    worst = max(groups, key=lambda k: groups[k].avg)
+    yield {
+        "type": "schedule",
+        "title": "时间规律",
+        "content": f"{worst}的通勤时间最长(平均{groups[worst].avg:.1f}分钟)，建议这天提前出门。"
+    }
@@ -0,0 +1,51 @@
+"""接口测试共用的夹具：每个测试使用临时目录中的新SQLite数据库"""
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db_pool import ConnectionPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """SQLite后端的main模块（数据库文件在tmp_path下，响应缓存已清空）"""
+    # main在导入时按相对路径挂载 static/
+    monkeypatch.chdir(ROOT)
+    import main
+    monkeypatch.chdir(tmp_path)
+    pool = ConnectionPool("sqlite", main.create_sqlite_connection,
+                          ping=lambda conn: conn.execute("SELECT 1"), **main.DB_POOL_CONFIG)
+    monkeypatch.setattr(main, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(main, "sqlite_pool", pool)
+    monkeypatch.setattr(main, "_db_initialized", False)
+    main.response_cache.clear()
+    yield main
+    pool.close()
+
+
+@pytest.fixture
+def client(main):
+    # 不进入lifespan：数据库在首次请求时初始化，不启动天气后台刷新
+    return TestClient(main.app)
+
+
+def make_record(user_eng_name="u", day="2026-10-15", **fields):
+    """接口格式的记录，字段可覆盖"""
+    record = {
+        "user_eng_name": user_eng_name,
+        "date": day,
+        "weather": "晴",
+        "temperature": "20°C",
+        "transport_type": "subway",
+        "commute_type": "to_work",
+        "start_time": f"{day} 08:00:00",
+        "on_vehicle_time": f"{day} 08:10:00",
+        "arrive_time": f"{day} 08:50:00",
+        "total_duration": 50,
+        "rating": 4,
+    }
+    record.update(fields)
+    return record
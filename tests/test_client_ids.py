@@ -0,0 +1,57 @@
+"""带client_id的写入幂等：离线队列重试同一批记录时返回原来的ID，不重复写入"""
+from conftest import make_record
+
+
+def record_count(main, user_eng_name="u"):
+    with main.get_db_connection() as conn:
+        cursor = conn.cursor()
+        main.execute_query(cursor, "SELECT COUNT(*) AS count FROM commute_records WHERE user_eng_name = %s",
+                           (user_eng_name,), conn)
+        return cursor.fetchone()['count']
+
+
+def test_batch_retry_returns_same_ids(main, client):
+    records = [make_record(day=f"2026-10-{day:02d}", client_id=f"c{day}") for day in range(1, 6)]
+    first = client.post("/api/records/batch", json={"records": records}).json()
+    assert first["inserted"] == 5 and first["duplicates"] == 0
+
+    # 重试时带上一条新记录，已写入的返回原来的ID
+    retry = client.post("/api/records/batch",
+                        json={"records": records + [make_record(day="2026-10-06", client_id="c6")]}).json()
+    assert retry["inserted"] == 1 and retry["duplicates"] == 5
+    assert [item["id"] for item in retry["results"][:5]] == [item["id"] for item in first["results"]]
+    assert [item["duplicate"] for item in retry["results"]] == [True] * 5 + [False]
+    assert record_count(main) == 6
+    with main.get_db_connection() as conn:
+        assert main.check_user_summary(conn.cursor(), conn) == []
+
+
+def test_repeated_client_id_in_one_batch_is_written_once(main, client):
+    record = make_record(client_id="same")
+    body = client.post("/api/records/batch", json={"records": [record, record]}).json()
+    assert body["inserted"] == 1 and body["duplicates"] == 1
+    assert body["results"][0]["id"] == body["results"][1]["id"]
+    assert record_count(main) == 1
+
+
+def test_client_id_is_scoped_to_user(main, client):
+    body = client.post("/api/records/batch", json={"records": [
+        make_record(user_eng_name="u", client_id="c1"),
+        make_record(user_eng_name="v", client_id="c1"),
+    ]}).json()
+    assert body["inserted"] == 2
+    assert record_count(main, "u") == 1 and record_count(main, "v") == 1
+
+
+def test_single_create_retry_and_deleted_record(main, client):
+    record = make_record(client_id="c1")
+    first = client.post("/api/records", json=record).json()
+    assert first["duplicate"] is False
+    retry = client.post("/api/records", json=record).json()
+    assert retry == {**first, "duplicate": True, "message": "记录已存在"}
+
+    # 记录删除后对应关系仍保留，迟到的重试不会把记录写回来
+    assert client.delete(f"/api/records/{first['id']}", params={"user_eng_name": "u"}).status_code == 200
+    late = client.post("/api/records", json=record).json()
+    assert late["duplicate"] is True and late["id"] == first["id"]
+    assert record_count(main) == 0
@@ -0,0 +1,88 @@
+"""出发时段推荐：时段选择规则"""
+import departure
+
+
+def histogram(groups):
+    """groups: {(出行方式, 出发时间 HH:MM): [时长, ...]}，时长取50分钟以内（草图中精确）"""
+    values = [
+        ("u", transport_type, "to_work", f"2026-10-15 {start}:00", duration)
+        for (transport_type, start), durations in groups.items()
+        for duration in durations
+    ]
+    rows = [
+        {"transport_type": transport_type, "commute_type": commute_type, "departure_bucket": window,
+         "bucket": bucket, "bucket_count": count}
+        for (_, transport_type, commute_type, window, bucket), count in departure.bucket_counts(values).items()
+    ]
+    return departure.DepartureHistogram(rows)
+
+
+ENOUGH = departure.DEPARTURE_MIN_RECORDS
+SUBWAY = {
+    ("subway", "07:30"): [40] * ENOUGH,   # 08:10 到达
+    ("subway", "08:00"): [30] * ENOUGH,   # 08:30 到达
+    ("subway", "08:30"): [45] * ENOUGH,   # 09:15 到达
+    ("subway", "09:00"): [20] * ENOUGH,   # 09:20 到达
+    # 记录数不足的时段不参与推荐
+    ("subway", "06:00"): [5] * (ENOUGH - 1),
+}
+
+
+def start_of(window):
+    return departure.format_minutes(window["start"])
+
+
+def test_shortest_duration_without_constraints():
+    best, candidates = histogram(SUBWAY).recommend("to_work", objective="expected")
+    assert start_of(best) == "09:00"
+    assert [start_of(window) for window in candidates] == ["07:30", "08:00", "08:30", "09:00"]
+
+
+def test_arrive_by_picks_latest_feasible_departure():
+    best, _ = histogram(SUBWAY).recommend("to_work", objective="expected",
+                                          arrive_by=departure.parse_minutes("09:00"))
+    assert start_of(best) == "08:00"
+
+
+def test_arrive_by_without_feasible_window_picks_earliest_arrival():
+    best, _ = histogram(SUBWAY).recommend("to_work", objective="expected",
+                                          arrive_by=departure.parse_minutes("07:00"))
+    assert start_of(best) == "07:30"
+
+
+def test_earliest_picks_earliest_arrival_after_it():
+    best, candidates = histogram(SUBWAY).recommend("to_work", objective="expected",
+                                                   earliest=departure.parse_minutes("08:15"))
+    assert start_of(best) == "08:30"
+    assert [start_of(window) for window in candidates] == ["08:30", "09:00"]
+
+
+def test_p90_objective_uses_slow_tail():
+    groups = {
+        # 平均25分钟，但p90（第9名）为45分钟
+        ("subway", "08:00"): [20] * 8 + [45] * 2,
+        ("subway", "08:15"): [27] * 10,
+    }
+    assert start_of(histogram(groups).recommend("to_work", objective="expected")[0]) == "08:00"
+    assert start_of(histogram(groups).recommend("to_work", objective="p90")[0]) == "08:15"
+
+
+def test_transport_filter():
+    groups = dict(SUBWAY)
+    groups[("car", "07:00")] = [10] * ENOUGH
+    assert start_of(histogram(groups).recommend("to_work")[0]) == "07:00"
+    best, candidates = histogram(groups).recommend("to_work", transport_type="subway")
+    assert start_of(best) == "09:00"
+    assert {window["transport_type"] for window in candidates} == {"subway"}
+
+
+def test_no_candidates():
+    assert histogram(SUBWAY).recommend("from_work") == (None, [])
+
+
+def test_format_window():
+    best, _ = histogram(SUBWAY).recommend("to_work", objective="expected")
+    formatted = departure.format_window(best)
+    assert formatted["window_start"] == "09:00"
+    assert formatted["window_end"] == "09:15"
+    assert formatted["expected_arrival"] == "09:20"
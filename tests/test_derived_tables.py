@@ -0,0 +1,114 @@
+"""写入接口在同一事务中维护汇总表和各派生表：与按原始记录重建的结果一致"""
+import csv
+import io
+import random
+
+import pytest
+
+import sqlite_schema
+from conftest import make_record
+
+TABLES = ("commute_user_summary",) + tuple(sqlite_schema.DERIVED_TABLES)
+USERS = ("u", "v")
+
+
+def random_record(rng, user_eng_name=None):
+    day = f"2026-{rng.randint(8, 10):02d}-{rng.randint(1, 28):02d}"
+    hour = rng.choice((7, 8, 9, 17, 18))
+    return make_record(
+        user_eng_name=user_eng_name or rng.choice(USERS),
+        day=day,
+        weather=rng.choice(("晴", "小雨", "大雨", None)),
+        temperature=rng.choice(("12°C", "25°C", None)),
+        transport_type=rng.choice(("subway", "car", "bus")),
+        commute_type="to_work" if hour < 12 else "from_work",
+        start_time=f"{day} {hour:02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+        on_vehicle_time=rng.choice((None, f"{day} {hour:02d}:59:00")),
+        arrive_time=f"{day} {hour + 1:02d}:{rng.randint(0, 59):02d}:00",
+        total_duration=rng.choice((None, 25, 40, 55, 70, 95)),
+        rating=rng.choice((None, 2, 4, 5)),
+    )
+
+
+def snapshot(main):
+    """汇总表和各派生表的全部行（浮点数取6位小数）"""
+    tables = {}
+    with main.get_db_connection() as conn:
+        cursor = conn.cursor()
+        for table in TABLES:
+            main.execute_query(cursor, f"SELECT * FROM {table}", None, conn)
+            rows = [tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                    for row in cursor.fetchall()]
+            tables[table] = sorted(rows, key=str)
+    return tables
+
+
+def assert_consistent(main):
+    with main.get_db_connection() as conn:
+        assert main.check_user_summary(conn.cursor(), conn) == []
+    maintained = snapshot(main)
+    with main.get_db_connection() as conn:
+        main.rebuild_user_summary(conn.cursor(), conn)
+    rebuilt = snapshot(main)
+    for table in TABLES:
+        assert maintained[table] == rebuilt[table], table
+    return maintained
+
+
+@pytest.fixture
+def rng():
+    return random.Random(20)
+
+
+def test_create_update_delete(main, client, rng):
+    ids = []
+    for _ in range(40):
+        record = random_record(rng)
+        response = client.post("/api/records", json=record)
+        assert response.status_code == 200, response.text
+        ids.append((response.json()["id"], record["user_eng_name"]))
+    tables = assert_consistent(main)
+    assert all(tables[table] for table in TABLES)
+
+    for record_id, user_eng_name in ids[:15]:
+        changes = random_record(rng, user_eng_name)
+        fields = rng.sample(["total_duration", "transport_type", "weather", "start_time", "date", "rating"], 3)
+        response = client.put(f"/api/records/{record_id}", params={"user_eng_name": user_eng_name},
+                              json={field: changes[field] for field in fields})
+        assert response.status_code == 200, response.text
+    assert_consistent(main)
+
+    for record_id, user_eng_name in ids[15:30]:
+        response = client.delete(f"/api/records/{record_id}", params={"user_eng_name": user_eng_name})
+        assert response.status_code == 200, response.text
+    assert_consistent(main)
+
+
+def test_delete_everything_leaves_no_rows(main, client, rng):
+    ids = [client.post("/api/records", json=random_record(rng, "u")).json()["id"] for _ in range(10)]
+    for record_id in ids:
+        client.delete(f"/api/records/{record_id}", params={"user_eng_name": "u"})
+    tables = assert_consistent(main)
+    assert tables == {table: [] for table in TABLES}
+
+
+def test_batch(main, client, rng):
+    records = [random_record(rng) for _ in range(30)]
+    # 无效的记录不影响其余记录
+    records.insert(5, {"user_eng_name": "u"})
+    body = client.post("/api/records/batch", json={"records": records}).json()
+    assert body["inserted"] == 30
+    assert body["failed"] == 1
+    assert_consistent(main)
+
+
+def test_import(main, client, rng):
+    records = [random_record(rng) for _ in range(25)]
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    body = client.post("/api/records/import", params={"format": "csv"},
+                       content=output.getvalue().encode("utf-8")).json()
+    assert body["inserted"] == 25, body
+    assert_consistent(main)
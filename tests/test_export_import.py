@@ -0,0 +1,59 @@
+"""导出的CSV/NDJSON可以原样导入：删除后重新导入，记录内容和汇总表与原来一致"""
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import make_record
+
+# 重新写入后会变化的列
+GENERATED_COLUMNS = ("id", "created_at", "updated_at")
+
+RECORDS = [
+    make_record(day="2026-10-01"),
+    make_record(day="2026-10-02", weather=None, temperature=None, on_vehicle_time=None, rating=None,
+                notes='备注含逗号, "引号"\n和换行'),
+    make_record(day="2026-10-03", transport_type="car", commute_type="from_work",
+                start_time="2026-10-03 18:05:30", on_vehicle_time=None, arrive_time="2026-10-03 18:47:00",
+                total_duration=None),
+    make_record(day="2026-10-05", notes="", rating=1),
+]
+
+
+def parse_export(response, export_format):
+    text = response.content.decode("utf-8-sig")
+    if export_format == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def export(client, export_format):
+    response = client.get("/api/records/export", params={"user_eng_name": "u", "format": export_format})
+    assert response.status_code == 200
+    return response
+
+
+def content(rows):
+    return sorted(({k: v for k, v in row.items() if k not in GENERATED_COLUMNS} for row in rows),
+                  key=lambda row: row["date"])
+
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_export_import_round_trip(main, client, export_format):
+    for record in RECORDS:
+        assert client.post("/api/records", json=record).status_code == 200
+    exported = export(client, export_format)
+    before = parse_export(exported, export_format)
+    assert len(before) == len(RECORDS)
+    statistics = client.get("/api/statistics", params={"user_eng_name": "u"}).json()
+
+    for row in before:
+        client.delete(f"/api/records/{row['id']}", params={"user_eng_name": "u"})
+    result = client.post("/api/records/import", params={"format": export_format}, content=exported.content).json()
+    assert result["success"] and result["inserted"] == len(RECORDS), result
+
+    assert content(parse_export(export(client, export_format), export_format)) == content(before)
+    assert client.get("/api/statistics", params={"user_eng_name": "u"}).json() == statistics
+    with main.get_db_connection() as conn:
+        assert main.check_user_summary(conn.cursor(), conn) == []
@@ -0,0 +1,37 @@
+"""MySQL一次性数据迁移只在未记录时执行"""
+
+
+class RecordingCursor:
+    """记录执行的SQL；commute_schema_migrations 的内容保存在 applied 中"""
+
+    def __init__(self, applied=(), rowcount=3):
+        self.applied = set(applied)
+        self.statements = []
+        self.rowcount = 0
+        self._rowcount = rowcount
+        self._rows = []
+
+    def execute(self, sql, args=None):
+        self.statements.append(sql)
+        self.rowcount, self._rows = 0, []
+        if sql.startswith("SELECT name FROM commute_schema_migrations"):
+            self._rows = [{"name": name} for name in self.applied]
+        elif sql.startswith("INSERT IGNORE INTO commute_schema_migrations"):
+            self.applied.add(args[0])
+        elif sql.startswith("UPDATE commute_records"):
+            self.rowcount = self._rowcount
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_weekday_migration_runs_once(main):
+    cursor = RecordingCursor()
+    assert main.run_mysql_migrations(cursor) == 3
+    assert cursor.applied == {name for name, _ in main.MYSQL_MIGRATIONS}
+    assert any(sql.startswith("UPDATE commute_records") for sql in cursor.statements)
+
+    # 再次启动（或熔断恢复）时不再扫描记录表
+    cursor.statements.clear()
+    assert main.run_mysql_migrations(cursor) == 0
+    assert not any(sql.startswith("UPDATE") for sql in cursor.statements)
@@ -0,0 +1,78 @@
+"""预测模型：由增量统计量求解的岭回归与闭式解一致"""
+import random
+
+import numpy as np
+import pytest
+
+import prediction
+
+WEATHERS = ("晴", "多云", "小雨", "大雨", "雪", None)
+
+
+def make_records(rng, count, user="u"):
+    records = []
+    for _ in range(count):
+        day = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        commute_type = rng.choice(("to_work", "from_work"))
+        hour = 8 if commute_type == "to_work" else 18
+        start_time = f"{day} {hour + rng.randint(-1, 1):02d}:{rng.randint(0, 59):02d}:00"
+        temperature = rng.choice((None, f"{rng.randint(-5, 35)}°C"))
+        records.append((user, day, rng.choice(WEATHERS), temperature, rng.choice(("car", "subway", "bus")),
+                        commute_type, start_time, rng.randint(20, 90)))
+    return records
+
+
+def stat_rows(*groups):
+    """把若干组 (记录, 符号) 的增量累加为 commute_prediction_stats 的行"""
+    totals = {}
+    for records, sign in groups:
+        for key, value in prediction.stat_deltas(records, sign).items():
+            totals[key] = totals.get(key, 0.0) + value
+    return [{"row_index": i, "col_index": j, "stat_value": value} for (_, i, j), value in totals.items()]
+
+
+def closed_form(records):
+    x = np.array([prediction.features(*record[1:7]) for record in records])
+    y = np.array([record[7] for record in records], dtype=float)
+    penalty = np.diag([0.0] + [prediction.PREDICT_RIDGE] * (len(prediction.FEATURES) - 1))
+    inverse = np.linalg.inv(x.T @ x + penalty)
+    coefficients = inverse @ x.T @ y
+    dof = len(records) - np.trace(x @ inverse @ x.T)
+    residual = y - x @ coefficients
+    # 岭回归的残差平方和：(y - Xβ)ᵀ(y - Xβ)
+    return coefficients, dof, float(residual @ residual) / dof
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_closed_form_ridge_solution(seed):
+    records = make_records(random.Random(seed), 200)
+    model = prediction.DurationModel(stat_rows((records, 1)))
+    coefficients, dof, variance = closed_form(records)
+    assert model.count == len(records)
+    np.testing.assert_allclose(model.coefficients, coefficients, rtol=1e-8, atol=1e-8)
+    assert model.dof == pytest.approx(dof, rel=1e-9)
+    assert model.variance == pytest.approx(variance, rel=1e-6)
+
+
+def test_removed_records_leave_no_trace():
+    rng = random.Random(11)
+    kept, removed = make_records(rng, 150), make_records(rng, 40)
+    model = prediction.DurationModel(stat_rows((kept + removed, 1), (removed, -1)))
+    expected = prediction.DurationModel(stat_rows((kept, 1)))
+    assert model.count == len(kept)
+    np.testing.assert_allclose(model.coefficients, expected.coefficients, rtol=1e-7, atol=1e-7)
+
+
+def test_prediction_interval_contains_estimate():
+    records = make_records(random.Random(3), 100)
+    model = prediction.DurationModel(stat_rows((records, 1)))
+    vector = prediction.features("2026-10-19", "小雨", "12°C", "car", "to_work", "2026-10-19 08:40:00")
+    expected, lower, upper = model.predict(vector)
+    assert expected == pytest.approx(float(np.asarray(vector) @ model.coefficients))
+    assert lower <= expected <= upper
+
+
+def test_no_records_no_prediction():
+    model = prediction.DurationModel([])
+    assert model.count == 0
+    assert model.predict([0.0] * len(prediction.FEATURES)) is None
@@ -0,0 +1,69 @@
+"""时长草图：相对误差界、合并与删除"""
+import math
+import random
+
+import pytest
+
+import quantiles
+
+
+def sketch_of(values):
+    sketch = quantiles.DurationSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+
+def test_bucket_value_within_relative_accuracy():
+    for value in range(1, 20000):
+        estimate = quantiles.bucket_value(quantiles.bucket_index(value))
+        assert abs(estimate - value) <= quantiles.RELATIVE_ACCURACY * value
+
+
+def test_small_durations_are_exact():
+    for value in range(1, 40):
+        assert quantiles.bucket_value(quantiles.bucket_index(value)) == value
+
+
+def test_non_positive_durations_use_zero_bucket():
+    sketch = sketch_of([0, -5, 0])
+    assert sketch.buckets == {quantiles.ZERO_BUCKET: 3}
+    assert sketch.quantile(0.5) == 0.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_quantiles_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = [int(rng.lognormvariate(4, 0.8)) + 1 for _ in range(rng.randint(1, 3000))]
+    sketch = sketch_of(values)
+    for q in (0.0, 0.25) + quantiles.QUANTILES + (1.0,):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= quantiles.RELATIVE_ACCURACY * exact
+
+
+def test_merge_equals_sketch_of_all_values():
+    rng = random.Random(7)
+    values = [rng.randint(1, 600) for _ in range(1000)]
+    merged = sketch_of(values[:300]).merge(sketch_of(values[300:]))
+    whole = sketch_of(values)
+    assert merged.count == whole.count
+    assert merged.buckets == whole.buckets
+    assert merged.percentiles() == whole.percentiles()
+
+
+def test_negative_counts_remove_values():
+    sketch = sketch_of([10, 20, 30, 300])
+    sketch.add(300, -1)
+    assert sketch.count == 3
+    assert sketch.quantile(1.0) == 30
+
+
+def test_empty_sketch():
+    sketch = quantiles.DurationSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.percentiles() == {"count": 0, "p50": None, "p90": None, "p95": None}
@@ -0,0 +1,49 @@
+"""导入文本按逻辑行切分"""
+import csv
+
+import pytest
+
+from record_import import LineSplitter
+
+CSV_TEXT = 'date,notes\n2026-10-01,"第一行\n第二行"\n2026-10-02,"含""引号"""\n2026-10-03,\n'
+EXPECTED = [
+    (1, "date,notes"),
+    (2, '2026-10-01,"第一行\n第二行"'),
+    (4, '2026-10-02,"含""引号"""'),
+    (5, "2026-10-03,"),
+]
+
+
+def split_all(data, chunk_size, quoted=True):
+    splitter = LineSplitter(quoted=quoted)
+    records = []
+    for start in range(0, len(data), chunk_size):
+        records.extend(splitter.feed(data[start:start + chunk_size]))
+    return records + splitter.finish()
+
+
+def test_quoted_newlines_stay_in_one_record():
+    records = split_all(CSV_TEXT.encode("utf-8"), len(CSV_TEXT.encode("utf-8")))
+    assert records == EXPECTED
+    assert next(csv.reader([records[1][1]])) == ["2026-10-01", "第一行\n第二行"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 13])
+def test_any_chunk_boundary(chunk_size):
+    # 按字节切分，多字节字符和跨行字段都可能被切开
+    assert split_all(CSV_TEXT.encode("utf-8"), chunk_size) == EXPECTED
+
+
+def test_crlf_bom_and_missing_final_newline():
+    data = "\ufeffdate,notes\r\n2026-10-01,\"a\r\nb\"\r\n2026-10-02,c".encode("utf-8")
+    assert split_all(data, 4) == [(1, "date,notes"), (2, '2026-10-01,"a\r\nb"'), (4, "2026-10-02,c")]
+
+
+def test_unclosed_quote_is_flushed_line_by_line_at_end():
+    # 引号到文件末尾仍未闭合时按物理行输出，各行分别报告错误
+    assert split_all(b'a,b\n1,"open\n2,x\n', 3) == [(1, "a,b"), (2, '1,"open'), (3, "2,x")]
+
+
+def test_unquoted_mode_splits_every_line():
+    data = '{"notes": "a"}\n{"notes": "\\""}\n\n'.encode("utf-8")
+    assert split_all(data, 5, quoted=False) == [(1, '{"notes": "a"}'), (2, '{"notes": "\\""}'), (3, "")]
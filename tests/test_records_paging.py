@@ -0,0 +1,69 @@
+"""GET /api/records 的游标分页"""
+import pytest
+
+from conftest import make_record
+
+# (日期, 出门时间)，出门时间为None的记录写入后置空（旧数据迁移时无法解析的时间）
+ROWS = [
+    ("2026-10-15", "08:00:00"),
+    ("2026-10-15", None),
+    ("2026-10-15", "09:30:00"),
+    ("2026-10-14", None),
+    ("2026-10-14", None),
+    ("2026-10-14", "07:45:00"),
+    ("2026-10-13", "08:00:00"),
+]
+
+
+@pytest.fixture
+def record_ids(main, client):
+    ids = []
+    for day, start in ROWS:
+        response = client.post("/api/records", json=make_record(day=day, start_time=f"{day} {start or '08:00:00'}"))
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    with main.get_db_connection() as conn:
+        cursor = conn.cursor()
+        for record_id, (_, start) in zip(ids, ROWS):
+            if start is None:
+                main.execute_query(cursor, "UPDATE commute_records SET start_time = NULL WHERE id = %s",
+                                   (record_id,), conn)
+    # 期望顺序：日期、出门时间（空值最小）、id 均倒序
+    order = sorted(zip(ids, ROWS), key=lambda item: (item[1][0], item[1][1] is not None, item[1][1] or "", item[0]),
+                   reverse=True)
+    return [record_id for record_id, _ in order]
+
+
+def walk(client, page_size, direction="next", cursor=None):
+    pages = []
+    while True:
+        params = {"user_eng_name": "u", "page_size": page_size, "include_total": True}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/records", params=params).json()
+        pages.append(body)
+        cursor = body[f"{direction}_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 4, 7, 10])
+def test_walks_every_record_including_null_start_times(client, record_ids, page_size):
+    pages = walk(client, page_size)
+    assert pages[0]["total"] == len(ROWS)
+    assert [record["id"] for page in pages for record in page["data"]] == record_ids
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3])
+def test_prev_cursors_walk_back(client, record_ids, page_size):
+    last = walk(client, page_size)[-1]
+    if last["prev_cursor"] is None:
+        pytest.skip("只有一页")
+    pages = walk(client, page_size, "prev", last["prev_cursor"])
+    ids = [record["id"] for page in reversed(pages) for record in page["data"]]
+    assert ids + [record["id"] for record in last["data"]] == record_ids
+
+
+def test_invalid_cursor(client, record_ids):
+    response = client.get("/api/records", params={"user_eng_name": "u", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
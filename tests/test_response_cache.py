@@ -0,0 +1,76 @@
+"""统计和建议接口的ETag：未修改时返回304且不访问数据库，写入提交后ETag变化"""
+import pytest
+
+from conftest import make_record
+
+ENDPOINTS = ("/api/statistics", "/api/suggestions")
+
+
+def get(client, path, user_eng_name="u", etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(path, params={"user_eng_name": user_eng_name}, headers=headers)
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_matching_etag_returns_304_without_database(main, client, monkeypatch, path):
+    client.post("/api/records", json=make_record())
+    response = get(client, path)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    def no_database():
+        raise AssertionError("304 不应访问数据库")
+
+    monkeypatch.setattr(main, "get_db_connection", no_database)
+    cached = get(client, path, etag=etag)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+    # 列表和强比较形式的 If-None-Match 同样匹配
+    assert get(client, path, etag=f'"other", {etag.removeprefix("W/")}').status_code == 304
+    # 未带验证头时由缓存的结果返回
+    assert get(client, path).json() == response.json()
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_writes_change_etag(client, path):
+    created = client.post("/api/records", json=make_record()).json()
+    etags = [get(client, path).headers["etag"]]
+    writes = [
+        lambda: client.post("/api/records", json=make_record(day="2026-10-16")),
+        lambda: client.put(f"/api/records/{created['id']}", params={"user_eng_name": "u"}, json={"total_duration": 70}),
+        lambda: client.post("/api/records/batch", json={"records": [make_record(day="2026-10-17")]}),
+        lambda: client.delete(f"/api/records/{created['id']}", params={"user_eng_name": "u"}),
+    ]
+    for write in writes:
+        assert write().status_code == 200
+        response = get(client, path, etag=etags[-1])
+        assert response.status_code == 200
+        etags.append(response.headers["etag"])
+    assert len(set(etags)) == len(etags)
+
+
+def test_etag_unchanged_by_other_users_and_failed_writes(client):
+    client.post("/api/records", json=make_record())
+    etag = get(client, "/api/statistics").headers["etag"]
+    assert get(client, "/api/suggestions").headers["etag"] != etag
+
+    client.post("/api/records", json=make_record(user_eng_name="v"))
+    assert client.delete("/api/records/999", params={"user_eng_name": "u"}).status_code == 404
+    assert get(client, "/api/statistics", etag=etag).status_code == 304
+    # 重复提交的client_id没有写入新记录
+    record = make_record(client_id="c1")
+    client.post("/api/records", json=record)
+    etag = get(client, "/api/statistics").headers["etag"]
+    assert client.post("/api/records", json=record).json()["duplicate"] is True
+    assert get(client, "/api/statistics", etag=etag).status_code == 304
+
+
+def test_statistics_reflect_write_after_revalidation(client):
+    client.post("/api/records", json=make_record(total_duration=40))
+    first = get(client, "/api/statistics")
+    client.post("/api/records", json=make_record(day="2026-10-16", total_duration=60))
+    second = get(client, "/api/statistics", etag=first.headers["etag"])
+    assert second.status_code == 200
+    assert second.json()["basic"]["total_count"] == 2
+    assert second.json()["basic"]["avg_duration"] == pytest.approx(50)
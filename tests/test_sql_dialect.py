@@ -0,0 +1,54 @@
+"""MySQL语句到SQLite的转换"""
+import sqlite3
+
+import analytics
+import sql_dialect
+
+
+def to_sqlite(sql):
+    return sql_dialect.translate(sql, sql_dialect.SQLITE)
+
+
+def test_placeholders():
+    sql = "SELECT id FROM commute_records WHERE user_eng_name = %s AND date >= %s"
+    assert to_sqlite(sql) == "SELECT id FROM commute_records WHERE user_eng_name = ? AND date >= ?"
+
+
+def test_mysql_is_unchanged():
+    assert sql_dialect.translate(analytics.SKETCH_UPSERT_SQL, sql_dialect.MYSQL) == analytics.SKETCH_UPSERT_SQL
+
+
+def test_on_duplicate_key_update():
+    sql = to_sqlite(analytics.SKETCH_UPSERT_SQL)
+    assert "ON DUPLICATE KEY" not in sql
+    assert "ON CONFLICT DO UPDATE SET bucket_count = bucket_count + excluded.bucket_count" in sql
+    # 插入列表中的 VALUES (...) 不受影响
+    assert "VALUES (?, ?, ?, ?, ?)" in sql
+
+
+def test_upsert_accumulates_in_sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE commute_duration_sketch (
+            user_eng_name TEXT, transport_type TEXT, commute_type TEXT, bucket INTEGER, bucket_count INTEGER,
+            PRIMARY KEY (user_eng_name, transport_type, commute_type, bucket)
+        )
+    """)
+    sql = to_sqlite(analytics.SKETCH_UPSERT_SQL)
+    conn.executemany(sql, [("u", "car", "to_work", 3, 2), ("u", "car", "to_work", 3, 5), ("u", "car", "to_work", 4, 1)])
+    assert conn.execute("SELECT bucket, bucket_count FROM commute_duration_sketch ORDER BY bucket").fetchall() == [
+        (3, 7), (4, 1)]
+
+
+def test_timestampdiff_minutes():
+    sql = to_sqlite("SELECT TIMESTAMPDIFF(MINUTE, start_time, arrive_time) AS minutes FROM commute_records")
+    assert sql == "SELECT ((arrive_time - start_time) / 60.0) AS minutes FROM commute_records"
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE commute_records (start_time INTEGER, arrive_time INTEGER)")
+    conn.execute("INSERT INTO commute_records VALUES (0, 90)")
+    assert conn.execute(sql).fetchone() == (1.5,)
+
+
+def test_translation_is_cached():
+    sql = "SELECT 1 FROM commute_records WHERE id = %s"
+    assert to_sqlite(sql) is to_sqlite(sql)
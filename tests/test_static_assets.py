@@ -0,0 +1,121 @@
+"""静态资源构建：内容哈希命名与引用改写"""
+import gzip
+import json
+import re
+
+import pytest
+
+import static_assets
+
+SERVICE_WORKER = """// precache-manifest:start
+const CACHE_VERSION = 'dev';
+const PRECACHE_URLS = ['/static/index.html'];
+// precache-manifest:end
+self.addEventListener('fetch', () => {});
+"""
+
+
+def write_sources(directory, **files):
+    directory.mkdir(parents=True)
+    files.setdefault("service-worker.js", SERVICE_WORKER)
+    for name, content in files.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    return directory
+
+
+def sources(tmp_path, utils="export const add = (a, b) => a + b;\n"):
+    return write_sources(
+        tmp_path / "static",
+        **{
+            "index.html": '<link rel="manifest" href="/static/manifest.json">\n'
+                          '<script type="module" src="/static/main.js"></script>\n',
+            "main.js": "import { add } from './utils.js';\nconsole.log(add(1, 2));\n",
+            "utils.js": utils,
+            "manifest.json": '{"name": "通勤记录"}\n',
+        },
+    )
+
+
+def read(path):
+    return path.read_text(encoding="utf-8")
+
+
+def test_hashed_names_follow_content(tmp_path):
+    source = sources(tmp_path)
+    manifest = static_assets.build_assets(str(source), str(tmp_path / "dist"))
+    assert sorted(manifest) == ["main.js", "manifest.json", "utils.js"]
+    for name, hashed in manifest.items():
+        stem, extension = name.rsplit(".", 1)
+        assert re.fullmatch(rf"{re.escape(stem)}\.[0-9a-f]{{{static_assets.HASH_LENGTH}}}\.{extension}", hashed)
+    # 没有依赖的文件按原内容哈希
+    assert manifest["utils.js"] == static_assets.hashed_name("utils.js", (source / "utils.js").read_bytes())
+
+
+def test_imports_and_entry_references_are_rewritten(tmp_path):
+    source = sources(tmp_path)
+    dist = tmp_path / "dist"
+    manifest = static_assets.build_assets(str(source), str(dist))
+    main = read(dist / manifest["main.js"])
+    assert f"from './{manifest['utils.js']}'" in main
+    assert manifest["main.js"] == static_assets.hashed_name("main.js", main.encode("utf-8"))
+    index = read(dist / "index.html")
+    assert f'src="/static/{manifest["main.js"]}"' in index
+    assert f'href="/static/{manifest["manifest.json"]}"' in index
+    # 原文件名保留原始内容，旧页面仍能加载
+    assert read(dist / "main.js") == read(source / "main.js")
+    assert json.loads(read(dist / static_assets.ASSET_MANIFEST)) == manifest
+
+
+def test_dependency_change_changes_importer_hash(tmp_path):
+    first = static_assets.build_assets(str(sources(tmp_path / "a")), str(tmp_path / "a" / "dist"))
+    second = static_assets.build_assets(str(sources(tmp_path / "b", utils="export const add = (a, b) => b + a;\n")),
+                                        str(tmp_path / "b" / "dist"))
+    assert first["utils.js"] != second["utils.js"]
+    # main.js 本身没有变化，但引用的文件名变了
+    assert first["main.js"] != second["main.js"]
+    assert first["manifest.json"] == second["manifest.json"]
+
+
+def test_build_is_reproducible(tmp_path):
+    source = sources(tmp_path)
+    first = static_assets.build_assets(str(source), str(tmp_path / "dist1"))
+    second = static_assets.build_assets(str(source), str(tmp_path / "dist2"))
+    assert first == second
+    assert (tmp_path / "dist1" / "service-worker.js").read_bytes() == (tmp_path / "dist2" / "service-worker.js").read_bytes()
+
+
+def test_service_worker_precache_manifest(tmp_path):
+    dist = tmp_path / "dist"
+    manifest = static_assets.build_assets(str(sources(tmp_path)), str(dist))
+    worker = read(dist / "service-worker.js")
+    assert "CACHE_VERSION = 'dev'" not in worker
+    urls = json.loads(re.search(r"PRECACHE_URLS = (\[.*?\]);", worker, re.S).group(1))
+    assert urls == ["/static/index.html"] + [f"/static/{manifest[name]}" for name in sorted(manifest)]
+    assert "self.addEventListener('fetch'" in worker
+
+
+def test_precompressed_copies(tmp_path):
+    dist = tmp_path / "dist"
+    manifest = static_assets.build_assets(
+        str(sources(tmp_path, utils="export const text = '" + "通勤" * 200 + "';\n")), str(dist))
+    hashed = dist / manifest["utils.js"]
+    assert gzip.decompress((dist / (hashed.name + ".gz")).read_bytes()) == hashed.read_bytes()
+
+
+def test_circular_imports_are_rejected(tmp_path):
+    source = write_sources(tmp_path / "static", **{
+        "index.html": '<script type="module" src="/static/a.js"></script>\n',
+        "a.js": "import './b.js';\n",
+        "b.js": "import './a.js';\n",
+    })
+    with pytest.raises(ValueError, match="循环引用"):
+        static_assets.build_assets(str(source), str(tmp_path / "dist"))
+
+
+def test_missing_precache_marker_is_rejected(tmp_path):
+    source = write_sources(tmp_path / "static", **{
+        "index.html": "<p></p>\n",
+        "service-worker.js": "self.addEventListener('fetch', () => {});\n",
+    })
+    with pytest.raises(ValueError, match="precache-manifest"):
+        static_assets.build_assets(str(source), str(tmp_path / "dist"))
@@ -0,0 +1,218 @@
+"""趋势分析：向量化的回归、透视表与逐项循环计算一致，滑动平均按窗口计算"""
+import random
+from fractions import Fraction
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import analytics
+import sql_dialect
+import trends
+
+TODAY = date(2026, 10, 18)
+
+
+def make_values(rng, count):
+    values = []
+    for _ in range(count):
+        day = TODAY - timedelta(days=rng.randint(0, 400))
+        start_time = rng.choice((None, f"{day} {rng.randint(6, 9):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"))
+        values.append(("u", rng.choice(("car", "subway")), rng.choice(("to_work", "from_work")),
+                       day.isoformat(), start_time, rng.randint(20, 90)))
+    return values
+
+
+def trend_stats(*groups):
+    """把若干组 (记录, 符号) 的增量累加为 TrendStats"""
+    totals = {}
+    for values, sign in groups:
+        for key, value in trends.stat_deltas(values, sign).items():
+            totals[key] = totals.get(key, 0) + value
+    return trends.TrendStats(
+        {"transport_type": transport_type, "commute_type": commute_type, "stat_name": name, "stat_value": value}
+        for (_, transport_type, commute_type, name), value in totals.items() if value
+    )
+
+
+def set_bounds(stats, values):
+    for transport_type in stats.transports:
+        days = [value[3] for value in values if value[1] == transport_type]
+        stats.set_date_bounds(transport_type, min(days), max(days))
+    return stats
+
+
+def test_date_trend_matches_polyfit():
+    values = make_values(random.Random(1), 500)
+    result = set_bounds(trend_stats((values, 1)), values).regression()
+    x = np.array([sql_dialect.date_to_days(value[3]) for value in values], dtype=float)
+    y = np.array([value[5] for value in values], dtype=float)
+    slope, intercept = np.polyfit(x, y, 1)
+    trend = result["trend"]
+    assert trend["count"] == len(values)
+    assert trend["slope_per_day"] == pytest.approx(slope, rel=1e-9)
+    assert trend["fitted_start"] == pytest.approx(intercept + slope * x.min(), rel=1e-9)
+    assert trend["r_squared"] == pytest.approx(np.corrcoef(x, y)[0, 1] ** 2, rel=1e-9)
+    assert trend["start_date"] == sql_dialect.days_to_date(int(x.min()))
+    assert [item["transport_type"] for item in result["by_transport"]] == ["car", "subway"]
+
+
+def test_departure_effect_matches_polyfit():
+    values = make_values(random.Random(2), 500)
+    effect = trend_stats((values, 1)).regression()["departure"]
+    for item in effect:
+        points = [value for value in values if value[2] == item["commute_type"] and value[4] is not None]
+        moment = [sql_dialect.parse_datetime(value[4]) for value in points]
+        minutes = np.array([m.hour * 60 + m.minute + m.second / 60 for m in moment])
+        slope, _ = np.polyfit(minutes, np.array([value[5] for value in points], dtype=float), 1)
+        assert item["count"] == len(points)
+        assert item["slope_per_10_minutes"] == pytest.approx(slope * 10, rel=1e-9)
+        rounded = int(round(minutes.mean()))
+        assert item["avg_departure"] == f"{rounded // 60:02d}:{rounded % 60:02d}"
+
+
+def test_removed_records_cancel_exactly():
+    rng = random.Random(3)
+    kept, removed = make_values(rng, 200), make_values(rng, 50)
+    merged, expected = trend_stats((kept + removed, 1), (removed, -1)), trend_stats((kept, 1))
+    assert merged.keys == expected.keys
+    assert np.array_equal(merged.sums, expected.sums)
+
+
+def loop_fit(points):
+    """逐点循环、用分数精确计算的最小二乘拟合 (b, a, R²)"""
+    n = len(points)
+    if n < 2:
+        return None
+    mean_x = Fraction(sum(x for x, _ in points), n)
+    mean_y = Fraction(sum(y for _, y in points), n)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    if sxx == 0:
+        return None
+    slope = sxy / sxx
+    return slope, mean_y - slope * mean_x, sxy * sxy / (sxx * syy) if syy else 1
+
+
+def test_regression_matches_loop():
+    values = make_values(random.Random(4), 300)
+    result = set_bounds(trend_stats((values, 1)), values).regression()
+    subsets = [(result["trend"], values)] + [
+        (item, [value for value in values if value[1] == item["transport_type"]]) for item in result["by_transport"]
+    ]
+    for item, subset in subsets:
+        points = [(sql_dialect.date_to_days(value[3]), value[5]) for value in subset]
+        slope, intercept, r_squared = loop_fit(points)
+        first = min(x for x, _ in points)
+        assert item["slope_per_day"] == pytest.approx(float(slope), rel=1e-9)
+        assert item["fitted_start"] == pytest.approx(float(intercept + slope * first), rel=1e-9)
+        assert item["r_squared"] == pytest.approx(float(r_squared), rel=1e-9)
+    for item in result["departure"]:
+        points = [(trends._second_of_day(value[4]), value[5]) for value in values
+                  if value[2] == item["commute_type"] and value[4] is not None]
+        slope, _, r_squared = loop_fit(points)
+        assert item["slope_per_10_minutes"] == pytest.approx(float(slope * 600), rel=1e-9)
+        assert item["r_squared"] == pytest.approx(float(r_squared), rel=1e-9)
+
+
+def test_linear_fits_large_sums_do_not_overflow():
+    # 300万条记录：n·Σx² 超出int64范围，平移后的计算仍然精确
+    points = [(20000 + i % 500, 30 + i % 7 + (i % 500) // 50) for i in range(3500)]
+    repeat = 3000000 // len(points)
+    sums = [0] * len(trends.SUM_NAMES)
+    for x, y in points:
+        for i, value in enumerate((1, x, x * x, y, y * y, x * y)):
+            sums[i] += value * repeat
+    assert sums[0] * sums[2] > np.iinfo(np.int64).max
+    slope, intercept, r_squared = (float(values[0]) for values in trends.linear_fits(np.array([sums])))
+    expected = loop_fit(points)
+    assert slope == pytest.approx(float(expected[0]), rel=1e-9)
+    assert intercept == pytest.approx(float(expected[1]), rel=1e-9)
+    assert r_squared == pytest.approx(float(expected[2]), rel=1e-9)
+
+
+def test_linear_fits_degenerate_rows():
+    slope, intercept, r_squared = trends.linear_fits(np.array([
+        [1, 5, 25, 30, 900, 150],       # 只有一条记录
+        [2, 10, 50, 70, 2500, 350],     # x没有变化
+        [2, 10, 52, 60, 1800, 300],     # y没有变化，R²为1
+    ]))
+    assert np.isnan(slope[:2]).all() and np.isnan(r_squared[:2]).all()
+    assert slope[2] == 0 and intercept[2] == 30 and r_squared[2] == 1
+
+
+def loop_pivot(rows):
+    """逐分组累加到字典的透视表"""
+    cells = {}
+    for row in rows:
+        if row["duration_count"] and row["weather"]:
+            key = (sql_dialect.weekday_name(row["weekday"]), row["weather"])
+            count, total = cells.get(key, (0, 0))
+            cells[key] = (count + row["duration_count"], total + row["duration_sum"])
+    weathers = sorted({weather for _, weather in cells})
+    grid = [[cells.get((weekday, weather), (0, 0)) for weather in weathers] for weekday in sql_dialect.WEEKDAY_NAMES]
+    return {
+        "weekdays": list(sql_dialect.WEEKDAY_NAMES),
+        "weathers": weathers,
+        "count": [[count for count, _ in row] for row in grid],
+        "avg_duration": [[total / count if count else None for count, total in row] for row in grid],
+    }
+
+
+def summary_rows(rng, count):
+    rows = []
+    for _ in range(count):
+        duration_count = rng.choice((0, rng.randint(1, 20)))
+        rows.append({
+            "transport_type": rng.choice(("car", "subway")), "commute_type": rng.choice(("to_work", "from_work")),
+            "weekday": rng.randint(0, 6), "weather": rng.choice(("", "晴", "雨", "多云", "雪")),
+            "record_count": duration_count + rng.randint(0, 2), "duration_count": duration_count,
+            "duration_sum": duration_count * rng.randint(20, 90),
+            "duration_min": 20 if duration_count else None, "duration_max": 90 if duration_count else None,
+            "rating_sum": 0, "rating_count": 0, "segment_count": 0, "to_vehicle_sum": 0, "on_vehicle_sum": 0,
+        })
+    return rows
+
+
+@pytest.mark.parametrize("count", [0, 1, 200])
+def test_pivot_matches_loop(count):
+    rows = summary_rows(random.Random(count), count)
+    pivot = analytics.AnalyticsSnapshot().add_rows(rows).pivot()
+    expected = loop_pivot(rows)
+    assert pivot["weekdays"] == expected["weekdays"]
+    assert pivot["weathers"] == expected["weathers"]
+    assert pivot["count"] == expected["count"]
+    for row, expected_row in zip(pivot["avg_duration"], expected["avg_duration"]):
+        assert row == [pytest.approx(value) if value is not None else None for value in expected_row]
+
+
+def test_sqlite_and_mysql_values_give_same_sums():
+    # SQLite中日期为天数、时间为秒数，MySQL为date/datetime对象
+    record = ("u", "car", "to_work", "2026-10-15", "2026-10-15 08:05:30", 42)
+    sqlite_record = record[:3] + (sql_dialect.date_to_days(record[3]), sql_dialect.datetime_to_seconds(record[4]), 42)
+    mysql_record = record[:3] + (date(2026, 10, 15), sql_dialect.parse_datetime(record[4]), 42)
+    expected = trends.stat_deltas([record])
+    assert trends.stat_deltas([sqlite_record]) == expected
+    assert trends.stat_deltas([mysql_record]) == expected
+    assert expected[("u", "car", "to_work", "departure_x")] == 8 * 3600 + 5 * 60 + 30
+
+
+def test_too_few_records_have_no_fit():
+    result = trend_stats(([("u", "car", "to_work", "2026-10-15", None, 30)], 1)).regression()
+    assert result["trend"]["count"] == 1
+    assert result["trend"]["slope_per_day"] is None
+    assert result["departure"] == [{"commute_type": "to_work", "count": 0, "avg_departure": None,
+                                    "slope_per_10_minutes": None, "r_squared": None}]
+
+
+def test_rolling_trend_window():
+    rows = [{"date": (TODAY - timedelta(days=offset)).isoformat(), "total_duration": duration}
+            for offset, duration in ((0, 30), (0, 50), (2, 60), (9, 90), (500, 10))]
+    series = trends.rolling_trend(rows, today=TODAY, days=7, window=3)["series"]
+    assert [item["date"] for item in series] == [(TODAY - timedelta(days=offset)).isoformat() for offset in (2, 1, 0)]
+    assert series[0] == {"date": (TODAY - timedelta(days=2)).isoformat(), "count": 1,
+                         "avg_duration": 60.0, "rolling_avg": 60.0}
+    assert series[-1]["count"] == 2
+    assert series[-1]["rolling_avg"] == pytest.approx((30 + 50 + 60) / 3)
+    assert trends.rolling_origin(TODAY, days=7, window=3) == TODAY - timedelta(days=8)
@@ -0,0 +1,277 @@
+"""查询追踪与指标
+
+记录每个接口和每条SQL语句的耗时直方图、返回/影响行数以及请求内的数据库耗时，
+并以Prometheus文本格式输出。行数取自驱动的rowcount：MySQL的SELECT和所有写操作
+都有值，SQLite的SELECT不提供行数，不计入行数直方图。
+
+SQL日志按采样率输出到 commute_tracker.sql 日志，只在日志级别为DEBUG时生效；
+超过慢查询阈值的语句总是以WARNING输出。
+
+语句指标按规范化后的SQL分组：字面量和占位符统一为 ?，IN列表和多行VALUES折叠为一项，
+UPDATE的SET列表折叠为一项，同一语句的不同参数个数、不同更新字段共用一个标签。
+标签数超过 TRACE_MAX_STATEMENTS 后，新出现的语句计入 statement="other"。
+
+环境变量：
+    LOG_LEVEL            日志级别，默认INFO
+    TRACE_SAMPLE_RATE    DEBUG级别下SQL日志的采样率（0~1），默认1
+    TRACE_SLOW_QUERY_MS  慢查询阈值（毫秒），默认500，0表示关闭
+    TRACE_MAX_STATEMENTS 语句指标的标签数上限，默认200
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1))
+TRACE_SLOW_QUERY_MS = float(os.getenv("TRACE_SLOW_QUERY_MS", 500))
+TRACE_MAX_STATEMENTS = int(os.getenv("TRACE_MAX_STATEMENTS", 200))
+
+logger = logging.getLogger("commute_tracker")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
+sql_logger = logger.getChild("sql")
+
+# 耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 行数直方图的桶
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000, 10000)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+# 规范化：字符串和数字字面量、占位符 -> ?；(?, ?, ...) -> (?)；(?), (?), ... -> (?)；SET a = ?, b = ? -> SET ? = ?
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|\?|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS_RE = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SET_RE = re.compile(r"\bSET \w+ = \?(?:, \w+ = \?)*", re.IGNORECASE)
+# 超过标签数上限后的语句
+OVERFLOW_STATEMENT = "other"
+# 语句信息中SQL文本的最大长度
+STATEMENT_TEXT_LIMIT = 300
+
+# 当前请求的数据库耗时统计（由中间件设置）
+_request_stats = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    """累积桶直方图"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+        yield "+Inf", self.count
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(sql):
+    """去掉参数个数和字面量差异后的SQL文本"""
+    normalized = _WHITESPACE_RE.sub(" ", sql).strip()
+    normalized = _PARAM_RE.sub("?", _STRING_RE.sub("?", normalized))
+    normalized = _ROWS_RE.sub("(?)", _LIST_RE.sub("(?)", normalized))
+    return _SET_RE.sub("SET ? = ?", normalized)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """生成语句的低基数标签：操作_表名_校验码（按规范化后的SQL）"""
+    normalized = normalize_statement(sql)
+    operation = normalized.split(" ", 1)[0].lower() if normalized else "unknown"
+    match = _TABLE_RE.search(normalized)
+    table = match.group(1) if match else "none"
+    return f"{operation}_{table}_{zlib.crc32(normalized.encode('utf-8')):08x}"
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self, max_statements=TRACE_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._request_latency = {}
+        self._request_db_time = {}
+        self._request_total = {}
+        self._query_latency = {}
+        self._query_rows = {}
+        self._query_errors = {}
+        self._statements = {}
+
+    def observe_request(self, endpoint, method, status, duration, db_time):
+        key = (endpoint, method)
+        with self._lock:
+            hist = self._request_latency.get(key)
+            if hist is None:
+                hist = self._request_latency[key] = Histogram(LATENCY_BUCKETS)
+                self._request_db_time[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(duration)
+            self._request_db_time[key].observe(db_time)
+            status_key = (endpoint, method, str(status))
+            self._request_total[status_key] = self._request_total.get(status_key, 0) + 1
+
+    def observe_query(self, label, sql, duration, rows, error=False):
+        with self._lock:
+            hist = self._query_latency.get(label)
+            if hist is None and len(self._query_latency) >= self.max_statements:
+                label = OVERFLOW_STATEMENT
+                hist = self._query_latency.get(label)
+            if hist is None:
+                hist = self._query_latency[label] = Histogram(LATENCY_BUCKETS)
+                self._query_rows[label] = Histogram(ROW_BUCKETS)
+                text = normalize_statement(sql) if label != OVERFLOW_STATEMENT else "（超出标签数上限的语句）"
+                if len(text) > STATEMENT_TEXT_LIMIT:
+                    text = text[:STATEMENT_TEXT_LIMIT] + "..."
+                self._statements[label] = text
+            hist.observe(duration)
+            if rows is not None and rows >= 0:
+                self._query_rows[label].observe(rows)
+            if error:
+                self._query_errors[label] = self._query_errors.get(label, 0) + 1
+
+    def render(self, extra_gauges=None):
+        """以Prometheus文本格式输出全部指标"""
+        lines = []
+        with self._lock:
+            _render_histograms(
+                lines, "commute_http_request_duration_seconds", "接口请求耗时",
+                ("endpoint", "method"), self._request_latency)
+            _render_histograms(
+                lines, "commute_http_request_db_seconds", "接口请求内的数据库耗时",
+                ("endpoint", "method"), self._request_db_time)
+            _render_counter(
+                lines, "commute_http_requests_total", "接口请求次数",
+                ("endpoint", "method", "status"), self._request_total)
+            _render_histograms(
+                lines, "commute_db_query_duration_seconds", "SQL语句耗时",
+                ("statement",), {(k,): v for k, v in self._query_latency.items()})
+            _render_histograms(
+                lines, "commute_db_query_rows", "SQL语句返回或影响的行数",
+                ("statement",), {(k,): v for k, v in self._query_rows.items()})
+            _render_counter(
+                lines, "commute_db_query_errors_total", "SQL语句执行失败次数",
+                ("statement",), {(k,): v for k, v in self._query_errors.items()})
+            lines.append("# HELP commute_db_statement_info 语句标签对应的规范化SQL文本")
+            lines.append("# TYPE commute_db_statement_info gauge")
+            for label, sql in sorted(self._statements.items()):
+                lines.append(f"commute_db_statement_info{_format_labels({'statement': label, 'sql': sql})} 1")
+        for name, help_text, samples in extra_gauges or ():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            for table in (self._request_latency, self._request_db_time, self._request_total,
+                          self._query_latency, self._query_rows, self._query_errors,
+                          self._statements):
+                table.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _render_histograms(lines, name, help_text, label_names, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, hist in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, count in hist.cumulative():
+            bucket_labels = dict(labels, le=bound if bound == "+Inf" else repr(float(bound)))
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {repr(hist.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+
+
+def _render_counter(lines, name, help_text, label_names, counters):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in sorted(counters.items()):
+        lines.append(f"{name}{_format_labels(dict(zip(label_names, key)))} {value}")
+
+
+def begin_request():
+    """开始统计当前请求的数据库耗时，返回用于结束的令牌"""
+    stats = {"db_time": 0.0, "queries": 0}
+    return stats, _request_stats.set(stats)
+
+
+def end_request(token):
+    _request_stats.reset(token)
+
+
+def trace_query(sql, params, started, rows, error=None):
+    """记录一条SQL的执行耗时，并按采样率/慢查询阈值输出日志"""
+    duration = time.perf_counter() - started
+    label = statement_label(sql)
+    metrics.observe_query(label, sql, duration, rows, error=error is not None)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["db_time"] += duration
+        stats["queries"] += 1
+
+    duration_ms = duration * 1000
+    if TRACE_SLOW_QUERY_MS and duration_ms >= TRACE_SLOW_QUERY_MS:
+        sql_logger.warning(_query_log(label, sql, params, duration_ms, rows, error, slow=True))
+    elif sql_logger.isEnabledFor(logging.DEBUG) and (
+            TRACE_SAMPLE_RATE >= 1 or random.random() < TRACE_SAMPLE_RATE):
+        sql_logger.debug(_query_log(label, sql, params, duration_ms, rows, error))
+
+
+def _query_log(label, sql, params, duration_ms, rows, error, slow=False):
+    entry = {
+        "event": "slow_query" if slow else "query",
+        "statement": label,
+        "sql": _WHITESPACE_RE.sub(" ", sql).strip(),
+        "params": list(params) if params else [],
+        "duration_ms": round(duration_ms, 3),
+        "rows": rows,
+    }
+    if error is not None:
+        entry["error"] = str(error)
+    return json.dumps(entry, ensure_ascii=False, default=str)
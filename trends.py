@@ -0,0 +1,290 @@
+"""用户通勤记录的趋势与回归分析
+
+/api/statistics 中汇总表各维度之外的部分，读取量都与用户的记录总数无关：
+
+    rolling_trend  最近 STATS_ROLLING_DAYS 天每天的平均时长和 STATS_ROLLING_WINDOW 天滑动平均，
+                   只按日期索引读取窗口内的记录，用 bincount 按天聚合、累计和之差求滑动窗口
+    pivot          星期 × 天气 的记录数和平均时长透视表，由汇总表的分组（见 analytics.AnalyticsSnapshot）
+                   用 bincount 按单元格累加
+    regression     总时长随日期的线性趋势（总体和按出行方式），以及按通勤类型的出发时间影响，
+                   各子集的统计量由分组成员矩阵与统计量数组相乘得到，所有子集的拟合一次求解
+
+线性回归只需要充分统计量 n、Σx、Σx²、Σy、Σy²、Σxy。按 (用户, 出行方式, 通勤类型) 保存在
+commute_trend_stats 中，随记录的增删改在同一事务中增量维护。x为日期的天数或出发时间在当天的
+秒数，y为总时长，都是整数，累加没有舍入误差；求解时先按整数均值平移再计算离差平方和，
+int64中既不溢出也没有相消误差。
+各出行方式的首末日期按索引各读取一行。
+"""
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+import sql_dialect
+
+# 滑动平均的展示天数和窗口天数
+STATS_ROLLING_DAYS = int(os.getenv("STATS_ROLLING_DAYS", 90))
+STATS_ROLLING_WINDOW = int(os.getenv("STATS_ROLLING_WINDOW", 7))
+
+# 滑动窗口内的有效记录（参数为窗口起始日期）
+ROLLING_SQL = """
+    SELECT date, total_duration
+    FROM commute_records
+    WHERE user_eng_name = %s AND total_duration IS NOT NULL AND date >= %s
+"""
+
+STATS_KEYS = ("user_eng_name", "transport_type", "commute_type")
+# 两个回归各自的充分统计量，统计量名为 date_n、departure_xy 等
+FITS = ("date", "departure")
+SUM_NAMES = ("n", "x", "xx", "y", "yy", "xy")
+# 单条记录的分组、日期、出发时间和时长（增量维护）
+VALUE_COLUMNS = STATS_KEYS + ("date", "start_time", "total_duration")
+_VALUE_SQL = f"""
+    SELECT {', '.join(VALUE_COLUMNS)}
+    FROM commute_records
+    WHERE total_duration IS NOT NULL AND {{where}}
+"""
+VALUE_SQL = _VALUE_SQL.format(where="id = %s")
+SOURCE_ALL_SQL = _VALUE_SQL.format(where="1 = 1")
+SOURCE_USER_SQL = _VALUE_SQL.format(where="user_eng_name = %s")
+# 按统计量累加（SQLite由sql_dialect转换为 ON CONFLICT DO UPDATE）
+STATS_UPSERT_SQL = """
+    INSERT INTO commute_trend_stats (user_eng_name, transport_type, commute_type, stat_name, stat_value)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE stat_value = stat_value + VALUES(stat_value)
+"""
+STATS_READ_SQL = """
+    SELECT transport_type, commute_type, stat_name, stat_value
+    FROM commute_trend_stats
+    WHERE user_eng_name = %s AND stat_value != 0
+"""
+# 某种出行方式最早（ASC）、最晚（DESC）的有效记录日期
+DATE_BOUND_SQL = """
+    SELECT date FROM commute_records
+    WHERE user_eng_name = %s AND transport_type = %s AND total_duration IS NOT NULL
+    ORDER BY date {order} LIMIT 1
+"""
+
+
+def _days(value):
+    """日期转为天数（SQLite已是天数，MySQL为date对象，新记录为字符串）"""
+    return value if isinstance(value, int) else sql_dialect.date_to_days(value)
+
+
+def _second_of_day(value):
+    """出发时间在当天的秒数（SQLite为秒数，其他为datetime对象或字符串），None原样返回"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value % 86400
+    moment = sql_dialect.parse_datetime(value)
+    return moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def stat_deltas(values, sign=1):
+    """一组记录对回归统计量的增量：{(用户, 出行方式, 通勤类型, 统计量名): 值}
+
+    values为VALUE_COLUMNS顺序的序列，总时长为空的记录不计入，出发时间为空的记录只计入日期趋势。
+    """
+    deltas = {}
+    for user_eng_name, transport_type, commute_type, record_date, start_time, duration in values:
+        if duration is None:
+            continue
+        points = [("date", _days(record_date))]
+        second = _second_of_day(start_time)
+        if second is not None:
+            points.append(("departure", second))
+        for fit, x in points:
+            for name, value in zip(SUM_NAMES, (1, x, x * x, duration, duration * duration, x * duration)):
+                key = (user_eng_name, transport_type, commute_type, f"{fit}_{name}")
+                deltas[key] = deltas.get(key, 0) + sign * value
+    return deltas
+
+
+def linear_fits(sums):
+    """逐行由充分统计量 (n, Σx, Σx², Σy, Σy², Σxy) 求最小二乘拟合 y = a + b·x
+
+    sums为 [行数, 6] 的int64数组，返回 (b, a, R²) 三个数组；样本不足或x没有变化的行为nan。
+    先按整数均值x0、y0平移：Σ(x-x0)² 等在int64中精确计算且数量级只与离差有关，
+    再减去平移余量 (Σx - n·x0)²/n 得到离差平方和。
+    """
+    n, x, xx, y, yy, xy = np.asarray(sums, dtype=np.int64).T
+    count = np.maximum(n, 1)
+    x0, y0 = x // count, y // count
+    dx, dy = x - n * x0, y - n * y0
+    sxx = (xx - 2 * x0 * x + n * x0 * x0) - dx * dx / count
+    syy = (yy - 2 * y0 * y + n * y0 * y0) - dy * dy / count
+    sxy = (xy - x0 * y - y0 * x + n * x0 * y0) - dx * dy / count
+    valid = (n >= 2) & (sxx > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(valid, sxy / sxx, np.nan)
+        intercept = np.where(valid, (y - slope * x) / count, np.nan)
+        r_squared = np.where(valid, np.where(syy > 0, sxy * sxy / (sxx * syy), 1.0), np.nan)
+    return slope, intercept, r_squared
+
+
+def _value(value):
+    """数组元素转为float，nan（无法拟合）转为None"""
+    return None if np.isnan(value) else float(value)
+
+
+def _average(total, count):
+    return float(total) / int(count) if count else None
+
+
+def rolling_origin(today=None, days=STATS_ROLLING_DAYS, window=STATS_ROLLING_WINDOW):
+    """滑动平均需要读取的最早日期（第一天的滑动窗口需要再往前取window-1天）"""
+    return (today or date.today()) - timedelta(days=days - 1 + window - 1)
+
+
+def rolling_trend(rows, today=None, days=STATS_ROLLING_DAYS, window=STATS_ROLLING_WINDOW):
+    """最近days天（含今天）每天的平均时长和window天滑动平均，只列出窗口内有记录的日期
+
+    rows为 ROLLING_SQL 的结果（只需包含 rolling_origin 之后的记录）。
+    """
+    rows = list(rows)
+    today = sql_dialect.date_to_days(today or date.today())
+    first = today - days + 1
+    origin = first - (window - 1)
+    record_days = np.array([_days(row['date']) for row in rows], dtype=np.int64)
+    durations = np.array([row['total_duration'] for row in rows], dtype=np.float64)
+    mask = (record_days >= origin) & (record_days <= today)
+    offsets = record_days[mask] - origin
+    length = today - origin + 1
+    counts = np.bincount(offsets, minlength=length)
+    sums = np.bincount(offsets, weights=durations[mask], minlength=length)
+    count_totals = np.concatenate(([0], np.cumsum(counts)))
+    sum_totals = np.concatenate(([0.0], np.cumsum(sums)))
+    rolling_counts = count_totals[window:] - count_totals[:-window]
+    rolling_sums = sum_totals[window:] - sum_totals[:-window]
+    counts, sums = counts[window - 1:], sums[window - 1:]
+    return {
+        "days": days,
+        "window": window,
+        "series": [
+            {
+                "date": sql_dialect.days_to_date(first + int(i)),
+                "count": int(counts[i]),
+                "avg_duration": _average(sums[i], counts[i]),
+                "rolling_avg": _average(rolling_sums[i], rolling_counts[i]),
+            }
+            for i in np.flatnonzero(rolling_counts)
+        ],
+    }
+
+
+def pivot_table(cells):
+    """星期 × 天气 的记录数和平均时长（行为星期一~星期日，列为天气，没有记录的单元格为None）
+
+    cells为汇总表分组的 (星期序号, 天气, 有总时长的记录数, 总时长之和) 序列，同一单元格
+    可有多个分组（出行方式、通勤类型不同），按单元格编号用bincount累加。
+    """
+    cells = list(cells)
+    weathers, weather_index = np.unique(np.array([cell[1] for cell in cells], dtype=object), return_inverse=True)
+    weekday_index = np.array([cell[0] for cell in cells], dtype=np.int64)
+    shape = (len(sql_dialect.WEEKDAY_NAMES), len(weathers))
+    index = weekday_index * shape[1] + weather_index.reshape(-1)
+    counts = np.bincount(index, weights=np.array([cell[2] for cell in cells], dtype=np.float64),
+                         minlength=shape[0] * shape[1]).reshape(shape)
+    sums = np.bincount(index, weights=np.array([cell[3] for cell in cells], dtype=np.float64),
+                       minlength=shape[0] * shape[1]).reshape(shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        averages = sums / counts
+    return {
+        "weekdays": list(sql_dialect.WEEKDAY_NAMES),
+        "weathers": [str(weather) for weather in weathers],
+        "count": counts.astype(np.int64).tolist(),
+        "avg_duration": [[float(avg) if count else None for avg, count in zip(*row)] for row in zip(averages, counts)],
+    }
+
+
+class TrendStats:
+    """一个用户的回归统计量：各 (出行方式, 通勤类型) 分组两个回归的充分统计量"""
+
+    def __init__(self, rows=()):
+        values = {}
+        for row in rows:
+            fit, name = row['stat_name'].split("_", 1)
+            group = values.setdefault((row['transport_type'], row['commute_type']), {})
+            group[FITS.index(fit), SUM_NAMES.index(name)] = int(row['stat_value'])
+        # 分组及 [分组, 回归, 统计量] 的int64数组
+        self.keys = sorted(values)
+        self.sums = np.zeros((len(self.keys), len(FITS), len(SUM_NAMES)), dtype=np.int64)
+        for i, key in enumerate(self.keys):
+            for position, value in values[key].items():
+                self.sums[(i,) + position] = value
+        # 出行方式 -> (最早日期天数, 最晚日期天数)
+        self.date_bounds = {}
+
+    def _labels(self, column):
+        """有日期回归记录的分组中出现的出行方式（column=0）或通勤类型（column=1）"""
+        return sorted({key[column] for key, n in zip(self.keys, self.sums[:, 0, 0]) if n})
+
+    @property
+    def transports(self):
+        return self._labels(0)
+
+    @property
+    def commute_types(self):
+        return self._labels(1)
+
+    def set_date_bounds(self, transport_type, first, last):
+        self.date_bounds[transport_type] = (_days(first), _days(last))
+
+    def _subset_sums(self, fit, column, labels):
+        """各子集（None为全部分组，否则为column列等于该值的分组）的统计量之和，[子集, 统计量]"""
+        keys = np.array([key[column] for key in self.keys], dtype=object)
+        members = np.array([np.ones(len(keys), dtype=bool) if label is None else keys == label for label in labels],
+                           dtype=np.int64).reshape(len(labels), len(keys))
+        return members @ self.sums[:, FITS.index(fit)]
+
+    def _date_trend(self, transport_type, sums, slope, intercept, r_squared):
+        result = {"count": int(sums[0]), "start_date": None, "end_date": None, "slope_per_day": None,
+                  "slope_per_30_days": None, "fitted_start": None, "fitted_end": None, "r_squared": None}
+        bounds = [self.date_bounds[transport] for transport in self.transports
+                  if transport_type in (None, transport) and transport in self.date_bounds]
+        if not bounds:
+            return result
+        first, last = min(bound[0] for bound in bounds), max(bound[1] for bound in bounds)
+        result["start_date"] = sql_dialect.days_to_date(first)
+        result["end_date"] = sql_dialect.days_to_date(last)
+        if not np.isnan(slope):
+            result.update({
+                "slope_per_day": float(slope),
+                "slope_per_30_days": float(slope * 30),
+                "fitted_start": float(intercept + slope * first),
+                "fitted_end": float(intercept + slope * last),
+                "r_squared": float(r_squared),
+            })
+        return result
+
+    def _departure_effect(self, sums, slope, r_squared):
+        count = int(sums[0])
+        result = {"count": count, "avg_departure": None, "slope_per_10_minutes": None, "r_squared": None}
+        if count:
+            minutes = int(round(int(sums[1]) / count / 60))
+            result["avg_departure"] = f"{minutes // 60:02d}:{minutes % 60:02d}"
+        # 斜率为每秒的时长变化
+        result["slope_per_10_minutes"] = _value(slope * 600)
+        result["r_squared"] = _value(r_squared)
+        return result
+
+    def regression(self):
+        """总时长随日期的线性趋势（总体、按出行方式），以及按通勤类型出发时间每晚10分钟的时长变化"""
+        transports, commute_types = self.transports, self.commute_types
+        date_sums = self._subset_sums("date", 0, [None] + transports)
+        departure_sums = self._subset_sums("departure", 1, commute_types)
+        date_fits = zip(*linear_fits(date_sums))
+        departure_fits = zip(*linear_fits(departure_sums))
+        trend = self._date_trend(None, date_sums[0], *next(date_fits))
+        return {
+            "trend": trend,
+            "by_transport": [
+                {"transport_type": transport_type, **self._date_trend(transport_type, sums, *fit)}
+                for transport_type, sums, fit in zip(transports, date_sums[1:], date_fits)
+            ],
+            "departure": [
+                {"commute_type": commute_type, **self._departure_effect(sums, fit[0], fit[2])}
+                for commute_type, sums, fit in zip(commute_types, departure_sums, departure_fits)
+            ],
+        }
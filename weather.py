@@ -0,0 +1,232 @@
+"""天气查询
+
+按地点缓存天气结果（TTL），后台任务定期刷新已查询过的地点，接口只读缓存，
+请求不会等待外部API。天气来源通过 WeatherProvider 接口接入：默认使用腾讯地图
+天气API（共享的httpx异步客户端，复用连接），本地开发和测试可换成固定结果的
+StubWeatherProvider。
+
+环境变量：
+    WEATHER_PROVIDER          天气来源：tencent（默认）或 stub
+    WEATHER_API_KEY           腾讯地图API Key
+    WEATHER_LOCATION          默认地点，默认深圳
+    WEATHER_TTL               缓存有效期（秒），默认600
+    WEATHER_REFRESH_INTERVAL  后台刷新间隔（秒），默认300
+    WEATHER_TIMEOUT           外部API超时时间（秒），默认5
+"""
+import asyncio
+import os
+import time
+
+import httpx
+
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "tencent")
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "OQBBZ-VHECX-LLI4P-B7PEO-QFHH7-YVFBV")
+WEATHER_LOCATION = os.getenv("WEATHER_LOCATION", "深圳")
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", 600))
+WEATHER_REFRESH_INTERVAL = float(os.getenv("WEATHER_REFRESH_INTERVAL", 300))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 5))
+
+# 后台刷新的地点数上限，超出时淘汰最久未被查询的地点
+MAX_LOCATIONS = 32
+# 获取失败后，在该时间内请求不再直接访问来源（秒），交由后台任务重试
+FAILURE_BACKOFF = 30.0
+
+
+class WeatherError(Exception):
+    """天气来源返回了无效结果"""
+
+
+class WeatherProvider:
+    """天气来源接口"""
+
+    name = "base"
+
+    async def start(self):
+        """创建共享资源（如HTTP客户端）"""
+
+    async def close(self):
+        """释放共享资源"""
+
+    async def fetch(self, location):
+        """返回 {"weather": ..., "temperature": ...}，失败时抛出异常"""
+        raise NotImplementedError
+
+
+class TencentWeatherProvider(WeatherProvider):
+    """腾讯地图天气API"""
+
+    name = "tencent"
+    url = "https://apis.map.qq.com/ws/weather/v1/"
+
+    def __init__(self, api_key, timeout=5.0):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, location):
+        await self.start()
+        params = {"location": location, "key": self.api_key, "output": "json"}
+        response = await self._client.get(self.url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("status") != 0:
+            raise WeatherError(data.get("message") or f"status={data.get('status')}")
+        observe = data.get("data", {}).get("observe", {})
+        if not observe.get("weather"):
+            raise WeatherError("返回结果缺少天气信息")
+        return {"weather": observe["weather"], "temperature": f"{observe.get('temp', '25')}°C"}
+
+
+class StubWeatherProvider(WeatherProvider):
+    """返回固定结果的天气来源，用于本地开发和测试"""
+
+    name = "stub"
+
+    def __init__(self, weather="晴", temperature="25°C"):
+        self.weather = weather
+        self.temperature = temperature
+        self.calls = 0
+
+    async def fetch(self, location):
+        self.calls += 1
+        return {"weather": self.weather, "temperature": self.temperature}
+
+
+def create_provider(name=WEATHER_PROVIDER):
+    if name == "stub":
+        return StubWeatherProvider()
+    if name == "tencent":
+        return TencentWeatherProvider(WEATHER_API_KEY, timeout=WEATHER_TIMEOUT)
+    raise ValueError(f"未知的天气来源: {name}")
+
+
+class WeatherService:
+    """带TTL缓存和后台刷新的天气服务"""
+
+    def __init__(self, provider, ttl=600.0, refresh_interval=300.0, default_location="深圳"):
+        self.provider = provider
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.default_location = default_location
+        # 地点 -> (结果, 获取时间)
+        self._cache = {}
+        # 地点 -> 最近一次查询时间，后台任务只刷新这些地点
+        self._locations = {default_location: time.monotonic()}
+        self._locks = {}
+        # 地点 -> 最近一次获取失败的时间
+        self._failed_at = {}
+        self._task = None
+        self._metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+        self._last_error = None
+
+    async def start(self):
+        """启动后台刷新任务（先预热默认地点）"""
+        await self.provider.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.provider.close()
+
+    async def get(self, location=None):
+        """读取天气：有缓存时直接返回（过期时后台刷新），无缓存时才访问来源"""
+        location = location or self.default_location
+        self._track(location)
+        entry = self._cache.get(location)
+        if entry is not None:
+            reading, fetched_at = entry
+            if time.monotonic() - fetched_at <= self.ttl:
+                self._metrics["hits"] += 1
+                return reading
+            # 已过期：先返回旧结果，由后台任务刷新
+            self._metrics["stale_hits"] += 1
+            self._schedule_refresh(location)
+            return reading
+        self._metrics["misses"] += 1
+        return await self.refresh(location)
+
+    async def refresh(self, location, force=False):
+        """从来源获取天气并写入缓存；同一地点的并发刷新只请求一次"""
+        lock = self._locks.setdefault(location, asyncio.Lock())
+        async with lock:
+            entry = self._cache.get(location)
+            now = time.monotonic()
+            if not force:
+                if entry is not None and now - entry[1] <= self.ttl:
+                    return entry[0]
+                if now - self._failed_at.get(location, -FAILURE_BACKOFF) < FAILURE_BACKOFF:
+                    raise WeatherError(f"天气来源暂不可用: {self._last_error}")
+            try:
+                reading = await self.provider.fetch(location)
+            except Exception as e:
+                self._metrics["refresh_failures"] += 1
+                self._last_error = str(e)
+                self._failed_at[location] = time.monotonic()
+                raise
+            self._failed_at.pop(location, None)
+            self._metrics["refreshes"] += 1
+            self._cache[location] = (reading, time.monotonic())
+            return reading
+
+    def stats(self):
+        data = dict(self._metrics)
+        data.update({
+            "provider": self.provider.name,
+            "cached": len(self._cache),
+            "locations": len(self._locations),
+            "last_error": self._last_error,
+        })
+        return data
+
+    def _track(self, location):
+        self._locations[location] = time.monotonic()
+        if len(self._locations) > MAX_LOCATIONS:
+            oldest = min(
+                (loc for loc in self._locations if loc != self.default_location),
+                key=self._locations.get,
+            )
+            del self._locations[oldest]
+            self._cache.pop(oldest, None)
+            self._locks.pop(oldest, None)
+            self._failed_at.pop(oldest, None)
+
+    def _schedule_refresh(self, location):
+        task = asyncio.create_task(self.refresh(location))
+        # 失败已计入指标，避免未取回异常的警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _refresh_loop(self):
+        while True:
+            for location in list(self._locations):
+                try:
+                    await self.refresh(location, force=True)
+                except Exception as e:
+                    print(f"天气刷新失败({location}): {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+weather_service = WeatherService(
+    create_provider(),
+    ttl=WEATHER_TTL,
+    refresh_interval=WEATHER_REFRESH_INTERVAL,
+    default_location=WEATHER_LOCATION,
+)